@@ -6,20 +6,23 @@ Created on Wed Aug  5 13:24:18 2020
 """
 from collections import defaultdict
 
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
-from scipy import stats
-import seaborn as sns
 
 from sipperplots import (
+    LazyModule,
     get_any_idi,
     get_side_idi,
     get_content_idi,
     get_chronogram_vals,
+    get_group_members,
     preproc_averaging
         )
 
+stats = LazyModule('scipy.stats')
+sns = LazyModule('seaborn')
+
 def format_avg_output(output, averaging):
     if averaging == 'datetime':
         output.index.name = 'Date'
@@ -65,17 +68,18 @@ def drinkcount_binned(sipper, binsize='1H', show_left=True, show_right=True,
                 (df.index <= e)].copy()
     base = df.index[0].hour
     if show_left:
-        binned = df['LeftCount'].diff().resample(binsize, base=base).sum()
+        binned = sipper.get_binned('LeftCount', binsize, base=base, df=df)
         l = pd.DataFrame({'LeftCount' : binned}, index=binned.index)
         output = output.join(l, how='outer')
     if show_right:
-        binned = df['RightCount'].diff().resample(binsize, base=base).sum()
+        binned = sipper.get_binned('RightCount', binsize, base=base, df=df)
         r = pd.DataFrame({'RightCount' : binned}, index=binned.index)
         output = output.join(r, how='outer')
     if show_content:
         for c in show_content:
             count = sipper.get_content_values(c, out='Count', df=df)
-            binned = count.diff().resample(binsize, base=base).sum()
+            binned = sipper.get_binned((c, 'Count'), binsize, base=base, df=df,
+                                       values=count)
             if not count.empty:
                 temp = pd.DataFrame({c+'Count' : binned}, index=binned.index)
                 output = output.join(temp, how='outer')
@@ -113,17 +117,18 @@ def drinkduration_binned(sipper, binsize='1H', show_left=True, show_right=True,
                 (df.index <= e)].copy()
     base = df.index[0].hour
     if show_left:
-        binned = df['LeftDuration'].diff().resample(binsize, base=base).sum()
+        binned = sipper.get_binned('LeftDuration', binsize, base=base, df=df)
         l = pd.DataFrame({'LeftDuration' : binned}, index=binned.index)
         output = output.join(l, how='outer')
     if show_right:
-        binned = df['RightDuration'].diff().resample(binsize, base=base).sum()
+        binned = sipper.get_binned('RightDuration', binsize, base=base, df=df)
         r = pd.DataFrame({'RightDuration' : binned}, index=binned.index)
         output = output.join(r, how='outer')
     if show_content:
         for c in show_content:
             count = sipper.get_content_values(c, out='Count', df=df)
-            binned = count.diff().resample(binsize, base=base).sum()
+            binned = sipper.get_binned((c, 'Count'), binsize, base=base, df=df,
+                                       values=count)
             if not count.empty:
                 temp = pd.DataFrame({c+'Duration' : binned}, index=binned.index)
                 output = output.join(temp, how='outer')
@@ -142,8 +147,7 @@ def idi_onecurve(sippers, kde, logx, **kwargs):
     kde_df = pd.DataFrame()
     combined = []
     for sipper in sippers:
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         df = sipper.data.copy()
         if 'date_filter' in kwargs:
             s, e = kwargs['date_filter']
@@ -156,7 +160,8 @@ def idi_onecurve(sippers, kde, logx, **kwargs):
         else:
             bins = np.linspace(0, 900, 50)
         combined += list(y)
-    plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde)
+    plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde,
+                        ax=ax)
     if kde:
         if plot.get_lines():
             line = plot.get_lines()[0]
@@ -169,15 +174,13 @@ def idi_onecurve(sippers, kde, logx, **kwargs):
     bar_df['Values'] = bar_h
     bar_df.index.name = 'log10(minutes)' if logx else 'minutes'
     kde_df.index.name = 'log10(minutes)' if logx else 'minutes'
-    plt.close()
     return bar_df, kde_df
 
 def idi_multicurve(sippers, kde, logx, **kwargs):
     bar_df = pd.DataFrame()
     kde_df = pd.DataFrame()
     for sipper in sippers:
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         df = sipper.data.copy()
         if 'date_filter' in kwargs:
             s, e = kwargs['date_filter']
@@ -189,7 +192,8 @@ def idi_multicurve(sippers, kde, logx, **kwargs):
             bins = np.round(np.arange(-2, 5, .1), 2)
         else:
             bins = np.linspace(0, 900, 50)
-        plot = sns.distplot(y, bins=bins, norm_hist=False, kde=kde)
+        plot = sns.distplot(y, bins=bins, norm_hist=False, kde=kde,
+                            ax=ax)
         bar_x = [v.get_x() for v in plot.patches]
         bar_h = [v.get_height() for v in plot.patches]
         btemp = pd.DataFrame({sipper.filename : bar_h}, index=bar_x)
@@ -200,7 +204,6 @@ def idi_multicurve(sippers, kde, logx, **kwargs):
                 x, y = line.get_data()
                 ktemp = pd.DataFrame({sipper.filename : y}, index=x)
                 kde_df = kde_df.join(ktemp, how='outer')
-        plt.close()
     bar_df.index.name = 'log10(minutes)' if logx else 'minutes'
     kde_df.index.name = 'log10(minutes)' if logx else 'minutes'
     return bar_df, kde_df
@@ -210,8 +213,7 @@ def interdrink_intervals_byside(sippers, kde=True, logx=True, **kwargs):
     kde_df = pd.DataFrame()
     for side in ['Left', 'Right']:
         combined = []
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         for sipper in sippers:
             df = sipper.data.copy()
             if 'date_filter' in kwargs:
@@ -225,7 +227,8 @@ def interdrink_intervals_byside(sippers, kde=True, logx=True, **kwargs):
             else:
                 bins = np.linspace(0, 900, 50)
             combined += list(y)
-        plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde)
+        plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde,
+                            ax=ax)
         if kde:
             if plot.get_lines():
                 line = plot.get_lines()[0]
@@ -236,7 +239,6 @@ def interdrink_intervals_byside(sippers, kde=True, logx=True, **kwargs):
         bar_h = [v.get_height() for v in plot.patches]
         btemp = pd.DataFrame({side:bar_h}, index=bar_x)
         bar_df = bar_df.join(btemp, how='outer')
-        plt.close()
     bar_df.index.name = 'log10(minutes)' if logx else 'minutes'
     kde_df.index.name = 'log10(minutes)' if logx else 'minutes'
     return bar_df, kde_df
@@ -247,8 +249,7 @@ def interdrink_intervals_bycontent(sippers, idi_content, kde=True, logx=True,
     kde_df = pd.DataFrame()
     for c in idi_content:
         combined = []
-        fig = plt.figure()
-        plt.clf()
+        ax = Figure().add_subplot()
         for sipper in sippers:
             df = sipper.data.copy()
             if 'date_filter' in kwargs:
@@ -262,7 +263,8 @@ def interdrink_intervals_bycontent(sippers, idi_content, kde=True, logx=True,
             else:
                 bins = np.linspace(0, 900, 50)
             combined += list(y)
-        plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde)
+        plot = sns.distplot(combined, bins=bins, norm_hist=False, kde=kde,
+                            ax=ax)
         if kde:
             if plot.get_lines():
                 line = plot.get_lines()[0]
@@ -273,7 +275,6 @@ def interdrink_intervals_bycontent(sippers, idi_content, kde=True, logx=True,
         bar_h = [v.get_height() for v in plot.patches]
         btemp = pd.DataFrame({c:bar_h}, index=bar_x)
         bar_df = bar_df.join(btemp, how='outer')
-        plt.close()
     bar_df.index.name = 'log10(minutes)' if logx else 'minutes'
     kde_df.index.name = 'log10(minutes)' if logx else 'minutes'
     return bar_df, kde_df
@@ -288,21 +289,28 @@ def drinkcount_chronogram(sipper, circ_left=True, circ_right=True,
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     to_plot = []
+    calendars = []
     labels = []
+    calendar = sipper.get_calendar(lights_on, lights_off, df=df)
     if circ_left:
         to_plot.append(df['LeftCount'])
+        calendars.append(calendar)
         labels.append('Left')
     if circ_right:
         to_plot.append(df['RightCount'])
+        calendars.append(calendar)
         labels.append('Right')
     if circ_content:
         for c in circ_content:
             vals = sipper.get_content_values(c, 'Count', df=df)
             if not vals.empty:
+                rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
                 to_plot.append()
+                calendars.append(calendar[rows.values])
                 labels.append(c)
     for i, series in enumerate(to_plot):
-        reindexed = get_chronogram_vals(series, lights_on, lights_off)
+        reindexed = get_chronogram_vals(series, lights_on, lights_off,
+                                        calendar=calendars[i])
         if reindexed.empty:
             continue
         label = labels[i]
@@ -311,44 +319,11 @@ def drinkcount_chronogram(sipper, circ_left=True, circ_right=True,
     output.index.name = 'Hours Into Light Cycle'
     return output
 
-def drinkcount_chronogram_grouped(sippers, groups, circ_left=True, circ_right=True,
-                                  circ_content=None, circ_var='SEM', lights_on=7,
-                                  lights_off=19, **kwargs):
+def chronogram_grouped_output(to_plot, circ_var='SEM', **kwargs):
+    # data of a grouped chronogram, from the chronogram values of each
+    # device by label
     output = pd.DataFrame(index=range(0,24))
     output.index.name = 'Hours Into Light Cycle'
-    to_plot = defaultdict(list)
-    for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if circ_left:
-                    key = group + ' - Left'
-                    vals = get_chronogram_vals(df['LeftCount'],
-                                               lights_on,
-                                               lights_off)
-                    vals.name = sipper.basename
-                    to_plot[key].append(vals)
-                if circ_right:
-                    key = group + ' - Right'
-                    vals = get_chronogram_vals(df['RightCount'],
-                                               lights_on,
-                                               lights_off)
-                    vals.name = sipper.basename
-                    to_plot[key].append(vals)
-                if circ_content:
-                    for c in circ_content:
-                        key = group + ' - ' + c
-                        content_vals = sipper.get_content_values(c, 'Count', df)
-                        if not content_vals.empty:
-                            vals = get_chronogram_vals(content_vals,
-                                                       lights_on,
-                                                       lights_off)
-                            vals.name = sipper.basename
-                            to_plot[key].append(vals)
     for i, (label, data) in enumerate(to_plot.items()):
         y = np.nanmean(data, axis=0)
         for d in data:
@@ -362,6 +337,49 @@ def drinkcount_chronogram_grouped(sippers, groups, circ_left=True, circ_right=Tr
             output[label + ' STD'] = std
     return output
 
+def drinkcount_chronogram_grouped(sippers, groups, circ_left=True, circ_right=True,
+                                  circ_content=None, circ_var='SEM', lights_on=7,
+                                  lights_off=19, **kwargs):
+    to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
+    for group in groups:
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            calendar = sipper.get_calendar(lights_on, lights_off, df=df)
+            if circ_left:
+                key = group + ' - Left'
+                vals = get_chronogram_vals(df['LeftCount'],
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                vals.name = sipper.basename
+                to_plot[key].append(vals)
+            if circ_right:
+                key = group + ' - Right'
+                vals = get_chronogram_vals(df['RightCount'],
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                vals.name = sipper.basename
+                to_plot[key].append(vals)
+            if circ_content:
+                for c in circ_content:
+                    key = group + ' - ' + c
+                    content_vals = sipper.get_content_values(c, 'Count', df)
+                    if not content_vals.empty:
+                        rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
+                        vals = get_chronogram_vals(content_vals,
+                                                   lights_on,
+                                                   lights_off,
+                                                   calendar=calendar[rows.values])
+                        vals.name = sipper.basename
+                        to_plot[key].append(vals)
+    return chronogram_grouped_output(to_plot, circ_var)
+
 def drinkduration_chronogram(sipper, circ_left=True, circ_right=True,
                              circ_content=None, lights_on=7,
                              lights_off=19, **kwargs):
@@ -372,21 +390,28 @@ def drinkduration_chronogram(sipper, circ_left=True, circ_right=True,
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     to_plot = []
+    calendars = []
     labels = []
+    calendar = sipper.get_calendar(lights_on, lights_off, df=df)
     if circ_left:
         to_plot.append(df['LeftDuration'])
+        calendars.append(calendar)
         labels.append('Left')
     if circ_right:
         to_plot.append(df['RightDuration'])
+        calendars.append(calendar)
         labels.append('Right')
     if circ_content:
         for c in circ_content:
             vals = sipper.get_content_values(c, 'Duration', df=df)
             if not vals.empty:
+                rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
                 to_plot.append()
+                calendars.append(calendar[rows.values])
                 labels.append(c)
     for i, series in enumerate(to_plot):
-        reindexed = get_chronogram_vals(series, lights_on, lights_off)
+        reindexed = get_chronogram_vals(series, lights_on, lights_off,
+                                        calendar=calendars[i])
         if reindexed.empty:
             continue
         label = labels[i]
@@ -398,53 +423,45 @@ def drinkduration_chronogram(sipper, circ_left=True, circ_right=True,
 def drinkduration_chronogram_grouped(sippers, groups, circ_left=True, circ_right=True,
                                      circ_content=None, circ_var='SEM', lights_on=7,
                                      lights_off=19, **kwargs):
-    output = pd.DataFrame(index=range(0,24))
-    output.index.name = 'Hours Into Light Cycle'
     to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if circ_left:
-                    key = group + ' - Left'
-                    vals = get_chronogram_vals(df['LeftDuration'],
-                                               lights_on,
-                                               lights_off)
-                    vals.name = sipper.basename
-                    to_plot[key].append(vals)
-                if circ_right:
-                    key = group + ' - Right'
-                    vals = get_chronogram_vals(df['RightDuration'],
-                                               lights_on,
-                                               lights_off)
-                    vals.name = sipper.basename
-                    to_plot[key].append(vals)
-                if circ_content:
-                    for c in circ_content:
-                        key = group + ' - ' + c
-                        content_vals = sipper.get_content_values(c, 'Duration', df)
-                        if not content_vals.empty:
-                            vals = get_chronogram_vals(content_vals,
-                                                       lights_on,
-                                                       lights_off)
-                            vals.name = sipper.basename
-                            to_plot[key].append(vals)
-    for i, (label, data) in enumerate(to_plot.items()):
-        y = np.nanmean(data, axis=0)
-        for d in data:
-            output[label + ' - ' + d.name] = d
-        output[label + ' MEAN'] = y
-        if circ_var == 'SEM':
-            sem = stats.sem(data, axis=0, nan_policy='omit')
-            output[label + ' SEM'] = sem
-        elif circ_var == 'STD':
-            std = np.nanstd(data, axis=0)
-            output[label + ' STD'] = std
-    return output
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            calendar = sipper.get_calendar(lights_on, lights_off, df=df)
+            if circ_left:
+                key = group + ' - Left'
+                vals = get_chronogram_vals(df['LeftDuration'],
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                vals.name = sipper.basename
+                to_plot[key].append(vals)
+            if circ_right:
+                key = group + ' - Right'
+                vals = get_chronogram_vals(df['RightDuration'],
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                vals.name = sipper.basename
+                to_plot[key].append(vals)
+            if circ_content:
+                for c in circ_content:
+                    key = group + ' - ' + c
+                    content_vals = sipper.get_content_values(c, 'Duration', df)
+                    if not content_vals.empty:
+                        rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
+                        vals = get_chronogram_vals(content_vals,
+                                                   lights_on,
+                                                   lights_off,
+                                                   calendar=calendar[rows.values])
+                        vals.name = sipper.basename
+                        to_plot[key].append(vals)
+    return chronogram_grouped_output(to_plot, circ_var)
 
 def side_preference(sipper, pref_side='Left', pref_metric='Count', pref_bins='1H',
                     **kwargs):
@@ -456,8 +473,8 @@ def side_preference(sipper, pref_side='Left', pref_metric='Count', pref_bins='1H
     base = df.index[0].hour
     lcol = 'Left' + pref_metric
     rcol = 'Right' + pref_metric
-    l_data = df[lcol].diff().resample(pref_bins, base=base).sum()
-    r_data = df[rcol].diff().resample(pref_bins, base=base).sum()
+    l_data = sipper.get_binned(lcol, pref_bins, base=base, df=df)
+    r_data = sipper.get_binned(rcol, pref_bins, base=base, df=df)
     total = l_data + r_data
     if pref_side == 'Left':
         preference = l_data/total
@@ -477,48 +494,18 @@ def content_preference(sipper, pref_content=[], pref_metric='Count', pref_bins='
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     base = df.index[0].hour
-    for i, c in enumerate(pref_content):
-        target = sipper.get_content_values(c, out=pref_metric, df=df)
-        if target.empty:
-            continue
-        target = target.diff().resample(pref_bins, base=base).sum()
-        other  = sipper.get_content_values(c, out=pref_metric, df=df,
-                                           opposite=True)
-        other = other.diff().resample(pref_bins, base=base).sum()
-        if not target.empty and not other.empty:
-            preference = target / (target + other) * 100
-            temp = pd.DataFrame({c : preference}, index=preference.index)
-            output = output.join(temp, how='outer')
+    preferences = sipper.get_content_preference(pref_content, pref_metric,
+                                                pref_bins, base=base, df=df)
+    for c, preference in preferences.items():
+        temp = pd.DataFrame({c : preference}, index=preference.index)
+        output = output.join(temp, how='outer')
     return output
 
-def averaged_drinkcount(sippers, groups, averaging='datetime', avg_bins='1H',
-                        avg_var='SEM', show_left=True, show_right=True,
-                        show_content=[], **kwargs):
+def averaged_drinkcount_output(to_plot, averaging='datetime', avg_bins='1H',
+                               avg_var='SEM', **kwargs):
+    # data of an averaged drink count, from the drinks of each device by
+    # label
     output = pd.DataFrame()
-    to_plot = defaultdict(list)
-    for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    vals = df['LeftCount'].diff().rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    vals = df['RightCount'].diff().rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Count',
-                                                         df=df).diff()
-                        if not vals.empty:
-                            to_plot[key].append(vals.rename(sipper.basename))
     for i, (label, data) in enumerate(to_plot.items()):
         temp = pd.DataFrame()
         processed = preproc_averaging(data, averaging=averaging,
@@ -537,35 +524,64 @@ def averaged_drinkcount(sippers, groups, averaging='datetime', avg_bins='1H',
         output = output.join(temp, how='outer')
     return format_avg_output(output, averaging)
 
+def averaged_drinkcount(sippers, groups, averaging='datetime', avg_bins='1H',
+                        avg_var='SEM', show_left=True, show_right=True,
+                        show_content=[], **kwargs):
+    to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
+    for group in groups:
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                vals = df['LeftCount'].diff().rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_right:
+                key = '{} - Right'.format(group)
+                vals = df['RightCount'].diff().rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Count',
+                                                     df=df).diff()
+                    if not vals.empty:
+                        to_plot[key].append(vals.rename(sipper.basename))
+    return averaged_drinkcount_output(to_plot, averaging, avg_bins, avg_var)
+
 def cumulative_averaged_drinkcount(sippers, groups, avg_bins='1H',
                                    avg_var='SEM', show_left=True, show_right=True,
                                    show_content=[], **kwargs):
     averaging = 'elapsed'
     output = pd.DataFrame()
     to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    vals = df['LeftCount'].rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    vals = df['RightCount'].rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Count',
-                                                         df=df)
-                        if not vals.empty:
-                            to_plot[key].append(vals.rename(sipper.basename))
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                vals = df['LeftCount'].rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_right:
+                key = '{} - Right'.format(group)
+                vals = df['RightCount'].rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Count',
+                                                     df=df)
+                    if not vals.empty:
+                        to_plot[key].append(vals.rename(sipper.basename))
     for i, (label, data) in enumerate(to_plot.items()):
         temp = pd.DataFrame()
         processed = preproc_averaging(data, averaging=averaging,
@@ -589,29 +605,29 @@ def averaged_drinkduration(sippers, groups, averaging='datetime', avg_bins='1H',
                            show_content=[], **kwargs):
     output = pd.DataFrame()
     to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    vals = df['LeftDuration'].diff().rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    vals = df['RightDuration'].diff().rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Duration',
-                                                         df=df).diff()
-                        if not vals.empty:
-                            to_plot[key].append(vals.rename(sipper.basename))
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                vals = df['LeftDuration'].diff().rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_right:
+                key = '{} - Right'.format(group)
+                vals = df['RightDuration'].diff().rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Duration',
+                                                     df=df).diff()
+                    if not vals.empty:
+                        to_plot[key].append(vals.rename(sipper.basename))
     for i, (label, data) in enumerate(to_plot.items()):
         temp = pd.DataFrame()
         processed = preproc_averaging(data, averaging=averaging,
@@ -636,29 +652,29 @@ def cumulative_averaged_drinkduration(sippers, groups, avg_bins='1H',
     averaging = 'elapsed'
     output = pd.DataFrame()
     to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    vals = df['LeftDuration'].rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    vals = df['RightDuration'].rename(sipper.basename)
-                    to_plot[key].append(vals)
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Duration',
-                                                         df=df)
-                        if not vals.empty:
-                            to_plot[key].append(vals.rename(sipper.basename))
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                vals = df['LeftDuration'].rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_right:
+                key = '{} - Right'.format(group)
+                vals = df['RightDuration'].rename(sipper.basename)
+                to_plot[key].append(vals)
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Duration',
+                                                     df=df)
+                    if not vals.empty:
+                        to_plot[key].append(vals.rename(sipper.basename))
     for i, (label, data) in enumerate(to_plot.items()):
         temp = pd.DataFrame()
         processed = preproc_averaging(data, averaging=averaging,
@@ -680,23 +696,31 @@ def cumulative_averaged_drinkduration(sippers, groups, avg_bins='1H',
 def averaged_side_preference(sippers, groups, averaging='datetime', avg_bins='1H',
                              avg_var='SEM', pref_side='Left', pref_metric='Count',
                              shade_dark=True, lights_on=7, lights_off=19, **kwargs):
-    output = pd.DataFrame()
-    to_plot = defaultdict(lambda: defaultdict((list)))
+    to_plot = defaultdict(list)
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                to_plot[group]['Left'].append(df['Left' + pref_metric].diff().rename(sipper.basename))
-                to_plot[group]['Right'].append(df['Right' + pref_metric].diff().rename(sipper.basename))
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            to_plot[(group, 'Left')].append(df['Left' + pref_metric].diff().rename(sipper.basename))
+            to_plot[(group, 'Right')].append(df['Right' + pref_metric].diff().rename(sipper.basename))
+    return averaged_side_preference_output(to_plot, averaging, avg_bins,
+                                           avg_var, pref_side)
+
+def averaged_side_preference_output(to_plot, averaging='datetime',
+                                    avg_bins='1H', avg_var='SEM',
+                                    pref_side='Left', **kwargs):
+    # data of an averaged side preference, from the drinks of each device
+    # by (group, side)
+    output = pd.DataFrame()
     xdata = []
-    for i, (label, dic) in enumerate(to_plot.items()):
+    for label in dict.fromkeys(group for group, side in to_plot):
         temp = pd.DataFrame()
-        l = dic['Left']
-        r = dic['Right']
+        l = to_plot[(label, 'Left')]
+        r = to_plot[(label, 'Right')]
         l_processed = preproc_averaging(l, averaging=averaging,
                                         avg_bins=avg_bins, agg='sum')
         r_processed = preproc_averaging(r, averaging=averaging,
@@ -729,22 +753,23 @@ def averaged_content_preference(sippers, groups, averaging='datetime', avg_bins=
                                 shade_dark=True, lights_on=7, lights_off=19, **kwargs):
     output = pd.DataFrame()
     to_plot = defaultdict(lambda: defaultdict((list)))
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                for i, c in enumerate(pref_content):
-                    target = sipper.get_content_values(c, out=pref_metric, df=df)
-                    other  = sipper.get_content_values(c, out=pref_metric, df=df,
-                                                       opposite=True)
-                    if not target.empty and not other.empty:
-                        key = group + ' - ' + c
-                        to_plot[key]['target'].append(target.diff().rename(sipper.basename))
-                        to_plot[key]['other'].append(other.diff().rename(sipper.basename))
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            targets, others = sipper.get_content_matrix(pref_content,
+                                                        pref_metric, df=df)
+            for i, c in enumerate(pref_content):
+                target = targets[c].dropna()
+                other = others[c].dropna()
+                if not target.empty and not other.empty:
+                    key = group + ' - ' + c
+                    to_plot[key]['target'].append(target.diff().rename(sipper.basename))
+                    to_plot[key]['other'].append(other.diff().rename(sipper.basename))
     xdata = []
     for i, (label, dic) in enumerate(to_plot.items()):
         temp = pd.DataFrame()
@@ -772,4 +797,156 @@ def averaged_content_preference(sippers, groups, averaging='datetime', avg_bins=
         elif avg_var == 'STD':
              temp['{} STD'.format(label)] = np.nanstd(preferences, axis=0)
         output = output.join(temp, how='outer')
-    return format_avg_output(output, averaging)
\ No newline at end of file
+    return format_avg_output(output, averaging)
+
+class RunningStats():
+    """
+    Streaming (Welford) mean and variance of traces, used to preview
+    averaged plots while devices are still being processed.  Traces are
+    aligned on their index, and NaN values are skipped (like np.nanmean).
+    """
+    def __init__(self):
+        self.n = pd.Series(dtype=float)
+        self.mean = pd.Series(dtype=float)
+        self.m2 = pd.Series(dtype=float)
+
+    def add(self, trace):
+        if self.mean.empty:
+            index = trace.index
+        else:
+            index = self.mean.index.union(trace.index)
+        n = self.n.reindex(index, fill_value=0)
+        mean = self.mean.reindex(index, fill_value=0)
+        m2 = self.m2.reindex(index, fill_value=0)
+        y = trace.reindex(index)
+        valid = y.notna()
+        n[valid] += 1
+        delta = y[valid] - mean[valid]
+        mean[valid] += delta / n[valid]
+        m2[valid] += delta * (y[valid] - mean[valid])
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def get_mean(self):
+        return self.mean.where(self.n > 0)
+
+    def get_var(self, var='SEM'):
+        """Return the SEM (as scipy.stats.sem) or STD (as np.nanstd)."""
+        if var == 'SEM':
+            n = self.n.where(self.n > 1)
+            return np.sqrt(self.m2 / (n - 1)) / np.sqrt(n)
+        elif var == 'STD':
+            n = self.n.where(self.n > 0)
+            return np.sqrt(self.m2 / n)
+
+def averaged_traces(sippers, groups, averaging='datetime', avg_bins='1H',
+                    series_func=None, **kwargs):
+    # yield (label, trace, series) for each device: the trace is binned as
+    # for averaging but not yet aligned with the other devices, and the
+    # series is what the averaged data are made from;
+    # series_func(sipper, group, df) gives the [(label, series)] of one
+    # device
+    members = get_group_members(sippers, groups)
+    for group in groups:
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            for label, series in series_func(sipper, group, df):
+                series = series.rename(sipper.basename)
+                processed = preproc_averaging([series], averaging=averaging,
+                                              avg_bins=avg_bins, agg='sum')
+                yield label, processed['ys'][0], series
+
+def averaged_drinkcount_traces(sippers, groups, show_left=True,
+                               show_right=True, show_content=[], **kwargs):
+    def series_func(sipper, group, df):
+        output = []
+        if show_left:
+            output.append(('{} - Left'.format(group), df['LeftCount'].diff()))
+        if show_right:
+            output.append(('{} - Right'.format(group), df['RightCount'].diff()))
+        for c in show_content:
+            vals = sipper.get_content_values(c, out='Count', df=df).diff()
+            if not vals.empty:
+                output.append(('{} - {}'.format(group, c), vals))
+        return output
+    for label, trace, series in averaged_traces(sippers, groups,
+                                                series_func=series_func,
+                                                **kwargs):
+        yield label, trace, [(label, series)]
+
+def averaged_side_preference_traces(sippers, groups, averaging='datetime',
+                                    avg_bins='1H', pref_side='Left',
+                                    pref_metric='Count', **kwargs):
+    sides = {}
+    items = []
+    def series_func(sipper, group, df):
+        return [((group, 'Left'), df['Left' + pref_metric].diff()),
+                ((group, 'Right'), df['Right' + pref_metric].diff())]
+    for (group, side), y, series in averaged_traces(sippers, groups,
+                                                    averaging=averaging,
+                                                    avg_bins=avg_bins,
+                                                    series_func=series_func,
+                                                    **kwargs):
+        sides[side] = y
+        items.append(((group, side), series))
+        if side == 'Right':
+            total = sides['Left'] + sides['Right']
+            yield group, sides[pref_side] / total * 100, items
+            items = []
+
+def chronogram_traces(sippers, groups, metric, circ_left=True, circ_right=True,
+                      circ_content=None, lights_on=7, lights_off=19, **kwargs):
+    members = get_group_members(sippers, groups)
+    for group in groups:
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            calendar = sipper.get_calendar(lights_on, lights_off, df=df)
+            series = []
+            if circ_left:
+                series.append((group + ' - Left', df['Left' + metric],
+                               calendar))
+            if circ_right:
+                series.append((group + ' - Right', df['Right' + metric],
+                               calendar))
+            if circ_content:
+                for c in circ_content:
+                    vals = sipper.get_content_values(c, metric, df)
+                    if not vals.empty:
+                        rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
+                        series.append((group + ' - ' + c, vals,
+                                       calendar[rows.values]))
+            for label, vals, days in series:
+                trace = get_chronogram_vals(vals.diff(), lights_on, lights_off,
+                                            calendar=days)
+                trace.index = range(0, 24)
+                # the grouped chronogram data are of the values themselves
+                vals = get_chronogram_vals(vals, lights_on, lights_off,
+                                           calendar=days)
+                vals.name = sipper.basename
+                yield label, trace.rename(sipper.basename), [(label, vals)]
+
+def drinkcount_chronogram_grouped_traces(sippers, groups, **kwargs):
+    return chronogram_traces(sippers, groups, 'Count', **kwargs)
+
+def drinkduration_chronogram_grouped_traces(sippers, groups, **kwargs):
+    return chronogram_traces(sippers, groups, 'Duration', **kwargs)
+
+# plots which can be previewed while their data are computed: each trace
+# function yields (label, trace, items) for a device, and the data are made
+# by the output function from the items, as {key : [item, ...]}
+trace_funcs = {'averaged_drinkcount' : averaged_drinkcount_traces,
+               'averaged_side_preference' : averaged_side_preference_traces,
+               'drinkcount_chronogram_grouped' : drinkcount_chronogram_grouped_traces,
+               'drinkduration_chronogram_grouped' : drinkduration_chronogram_grouped_traces}
+
+output_funcs = {'averaged_drinkcount' : averaged_drinkcount_output,
+                'averaged_side_preference' : averaged_side_preference_output,
+                'drinkcount_chronogram_grouped' : chronogram_grouped_output,
+                'drinkduration_chronogram_grouped' : chronogram_grouped_output}
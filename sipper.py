@@ -1,6 +1,12 @@
 """Class for loading sipper data."""
 
+from collections import Counter, defaultdict, OrderedDict
+import heapq
+import io
 import os
+import shutil
+import tempfile
+import threading
 import warnings
 
 import numpy as np
@@ -119,14 +125,99 @@ def is_concatable(sippers):
             return False
     return True
 
-def sipper_concat(sippers):
+def concat_report(sippers):
     """
-    Concatenate data Sipper objects
+    Find every pair of Sipper files whose dates overlap, and every gap
+    in time between files.  Files are sorted by start date and swept once,
+    keeping a heap of the files still "open" (by end date), so this takes
+    O(n log n) time plus the number of overlaps found.
+
+    Parameters
+    ----------
+    sippers : array
+        an array of Sipper files
+
+    Returns
+    -------
+    overlaps : list
+        (Sipper, Sipper) pairs with overlapping dates, the earlier
+        starting file first
+    gaps : list
+        (Sipper, Sipper, pandas.Timedelta) for each period not covered
+        by any file; the last file to end before the gap, the file
+        which starts after it, and the length of the gap
+
+    """
+    overlaps = []
+    gaps = []
+    sorted_sips = sorted(sippers, key=lambda x: x.start_date)
+    open_files = []
+    last = None
+    for i, file in enumerate(sorted_sips):
+        while open_files and open_files[0][0] < file.start_date:
+            heapq.heappop(open_files)
+        if not open_files and last is not None:
+            gaps.append((last, file, file.start_date - last.end_date))
+        for end, j, other in open_files:
+            overlaps.append((other, file))
+        heapq.heappush(open_files, (file.end_date, i, file))
+        if last is None or file.end_date > last.end_date:
+            last = file
+    return overlaps, gaps
+
+def concat_chains(sippers):
+    """
+    Divide Sipper files into chains which can each be concatenated.  Files
+    are split by device number, then (in order of start date) each file is
+    added to the first chain of that device which ends before it starts,
+    or begins a new chain.  This makes as few chains as possible.
+
+    Parameters
+    ----------
+    sippers : array
+        an array of Sipper files
+
+    Returns
+    -------
+    chains : list
+        lists of Sipper files, each sorted by start date and without
+        overlapping dates
+
+    """
+    devices = defaultdict(list)
+    for s in sorted(sippers, key=lambda x: x.start_date):
+        devices[s.device_no].append(s)
+    chains = []
+    for files in devices.values():
+        device_chains = []
+        chain_ends = []
+        for s in files:
+            if chain_ends and chain_ends[0][0] < s.start_date:
+                end, i = heapq.heappop(chain_ends)
+            else:
+                i = len(device_chains)
+                device_chains.append([])
+            device_chains[i].append(s)
+            heapq.heappush(chain_ends, (s.end_date, i))
+        chains += device_chains
+    return chains
+
+def sipper_concat(sippers, path=None):
+    """
+    Concatenate data Sipper objects.  Files are processed one at a time in
+    order of their start date; the drink counts and durations of each are
+    offset by the totals of the files before it.
 
     Parameters
     ----------
     sippers : collection
         array of Sipper objects
+    path : str, optional
+        CSV file to write the concatenated data to.  Each offset-adjusted
+        file is appended as soon as it is processed, so the file is never
+        written from a second, concatenated copy.  The returned data can
+        be passed to Sipper(path, data=...) to load the file without
+        parsing it again.  The default is None (no file written).
 
     Raises
     ------
@@ -148,9 +239,9 @@ def sipper_concat(sippers):
     offsets = {}
     sorted_sippers = sorted(sippers, key=lambda x: x.start_date)
     for i, s in enumerate(sorted_sippers):
-        df = s.data.copy().loc[:,columns]
+        # selecting a list of columns already returns a copy
+        df = s.data.loc[:,columns]
         if i==0:
-            output.append(df)
             for col in['LeftCount', 'LeftDuration',
                        'RightCount', 'RightDuration']:
                 if col in df.columns:
@@ -159,12 +250,845 @@ def sipper_concat(sippers):
             for name, offset in offsets.items():
                 df[name] += offset
                 offsets[name] = df[name].max()
-            output.append(df)
+        if path is not None:
+            df.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0))
+        output.append(df)
     output = pd.concat(output)
     return output
 
+def sipper_metadata(path, chunksize=2**16):
+    """
+    Get the file information of a Sipper CSV without parsing all of it,
+    from the header, the first data line, and the end of the file.
+
+    The end date is the first row of the final run of rows with
+    unchanged counts, which matches the Sipper end date after unchanged
+    rows are dropped (see compress_unchanged()); the last date is the
+    last row of the file.  The device number is taken from the first and last
+    rows (None if they differ).
+
+    Parameters
+    ----------
+    path : str
+        path to a Sipper CSV
+    chunksize : int, optional
+        Bytes read at a time when reading back from the end of the file.
+        The default is 2**16.
+
+    Raises
+    ------
+    SipperError
+        When file columns don't match Sipper data
+    pd.errors.EmptyDataError
+        File has no data rows
+
+    Returns
+    -------
+    output : dict
+        Dictionary with keys 'version', 'device_no', 'start_date',
+        'end_date', 'last_date', 'rows' (number of data lines in the
+        file), 'totals' (the counts and durations of the last row, by
+        column) and 'first_totals' (the same for the first row)
+
+    """
+    output = {}
+    with open(path, 'rb') as f:
+        header = f.readline()
+        columns = [c.strip() for c in header.decode('utf-8-sig').split(',')]
+        if columns == Sipper.og_columns:
+            output['version'] = 'Raw'
+        elif columns == Sipper.sipviz_columns:
+            output['version'] = 'SipperViz'
+        else:
+            raise SipperError('Column names do not match sipper data')
+        data_start = f.tell()
+        first = f.readline().decode().split(',')
+        if len(first) != len(columns):
+            raise pd.errors.EmptyDataError('No data rows in ' + path)
+        rows = 1
+        last_byte = b'\n'
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            rows += chunk.count(b'\n')
+            last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            rows += 1
+        end = f.tell()
+        counts = [columns.index(c) for c in ['LeftCount', 'LeftDuration',
+                                             'RightCount', 'RightDuration']]
+        pos = end
+        tail = b''
+        last = None
+        while pos > data_start:
+            size = min(chunksize, pos - data_start)
+            pos -= size
+            f.seek(pos)
+            tail = f.read(size) + tail
+            lines = tail.split(b'\n')
+            # the first piece may be a partial line, unless at the start
+            if pos > data_start:
+                tail, lines = lines[0], lines[1:]
+            else:
+                tail = b''
+            for line in reversed(lines):
+                fields = line.decode().split(',')
+                if len(fields) != len(columns):
+                    continue
+                if last is None:
+                    last = fields
+                    run_start = fields
+                elif [fields[i] for i in counts] == [last[i] for i in counts]:
+                    run_start = fields
+                else:
+                    pos = data_start
+                    break
+    if last is None:
+        last = run_start = first
+    output['rows'] = rows
+    output['start_date'] = pd.to_datetime(first[0])
+    output['end_date'] = pd.to_datetime(run_start[0])
+    output['last_date'] = pd.to_datetime(last[0])
+    output['totals'] = {columns[i] : float(pd.to_numeric(last[i], errors='coerce'))
+                        for i in counts}
+    output['first_totals'] = {columns[i] : float(pd.to_numeric(first[i], errors='coerce'))
+                              for i in counts}
+    device = columns.index('Device')
+    if first[device].strip() == last[device].strip():
+        output['device_no'] = int(first[device])
+    else:
+        output['device_no'] = None
+    return output
+
+def csv_row_index(path, every=1000, chunksize=2**20):
+    """
+    Build a sparse index of the rows of a Sipper CSV: the byte offset and
+    date of every `every`th data line.  Only newlines are searched for
+    (nothing is parsed except the dates of the indexed lines), so it is
+    much cheaper than loading the file; it is then used by
+    read_csv_window() to read only part of the file.
+
+    Parameters
+    ----------
+    path : str
+        path to a Sipper CSV
+    every : int, optional
+        Number of lines between indexed lines.  The default is 1000.
+    chunksize : int, optional
+        Bytes read at a time.  The default is 2**20.
+
+    Returns
+    -------
+    pandas.Series
+        Byte offsets of the indexed lines, indexed by their dates (lines
+        whose dates can't be read are left out)
+
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        pos = f.tell()
+        offsets = [pos]
+        lines = 0
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+            numbers = lines + 1 + np.arange(len(ends))
+            starts = ends[numbers % every == 0] + pos + 1
+            offsets.extend(starts.tolist())
+            lines += len(ends)
+            pos += len(chunk)
+        offsets = [o for o in offsets if o < pos]
+        dates = []
+        for offset in offsets:
+            f.seek(offset)
+            dates.append(f.read(64).split(b',')[0].decode(errors='ignore'))
+    index = pd.Series(offsets, index=pd.to_datetime(dates, errors='coerce'),
+                      dtype='int64')
+    return index[index.index.notna()]
+
+def read_csv_window(path, start, end, index):
+    """
+    Read the lines of a Sipper CSV around a date window, using an index
+    from csv_row_index().  The lines returned start before the window and
+    end after it (by at least one line, where the file has them), so rows
+    can still be compared with the rows before and after them.
+
+    Parameters
+    ----------
+    path : str
+        path to a Sipper CSV
+    start, end : datetime-like
+        Date window; either can be None to read from the start or to the
+        end of the file.
+    index : pandas.Series
+        Output of csv_row_index() for the file
+
+    Returns
+    -------
+    bytes or None
+        The header line and the lines read.  None when the dates of the
+        index are not in order (e.g. the clock of the device was changed),
+        in which case the whole file needs to be read.
+
+    """
+    dates = index.index
+    if not dates.is_monotonic_increasing:
+        return None
+    first = 0
+    if start is not None:
+        first = max(dates.searchsorted(pd.Timestamp(start), 'left') - 1, 0)
+    stop = len(index)
+    if end is not None:
+        stop = dates.searchsorted(pd.Timestamp(end), 'right') + 1
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if len(index):
+            f.seek(index.iloc[first])
+        if stop < len(index):
+            block = f.read(index.iloc[stop] - f.tell())
+        else:
+            block = f.read()
+    return header + block
+
+def frame_arrays(df, prefix=''):
+    """
+    Split a DataFrame into numpy arrays which numpy.savez() stores without
+    pickling, so they can be read back with allow_pickle=False (see
+    arrays_frame()).  Object columns must hold strings or nulls.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        frame to store
+    prefix : str, optional
+        Added to the names of the arrays, to store several frames in one
+        file.  The default is ''.
+
+    Returns
+    -------
+    arrays : dict
+        {name : numpy.ndarray}
+
+    """
+    objects = [i for i, dtype in enumerate(df.dtypes) if dtype == object]
+    arrays = {prefix + 'index' : df.index.values,
+              prefix + 'index_name' : np.array([] if df.index.name is None
+                                               else [df.index.name]),
+              prefix + 'columns' : np.array(df.columns, dtype=str),
+              prefix + 'objects' : np.array(objects, dtype=int)}
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i]
+        if i in objects:
+            arrays[prefix + 'nulls' + str(i)] = values.isna().values
+            values = np.array(values.where(values.notna(), '').tolist(),
+                              dtype=str)
+        arrays[prefix + str(i)] = np.asarray(values)
+    return arrays
+
+def arrays_frame(arrays, prefix=''):
+    """
+    Rebuild a DataFrame split by frame_arrays().
+
+    Parameters
+    ----------
+    arrays : dict or numpy.lib.npyio.NpzFile
+        the arrays of frame_arrays()
+    prefix : str, optional
+        The prefix the arrays were saved with.  The default is ''.
+
+    Returns
+    -------
+    pandas.DataFrame
+
+    """
+    columns = arrays[prefix + 'columns'].tolist()
+    objects = arrays[prefix + 'objects'].tolist()
+    data = {}
+    for i, column in enumerate(columns):
+        values = arrays[prefix + str(i)]
+        if i in objects:
+            values = values.astype(object)
+            values[arrays[prefix + 'nulls' + str(i)]] = np.nan
+        data[column] = values
+    name = arrays[prefix + 'index_name'].tolist()
+    index = pd.Index(arrays[prefix + 'index'], name=name[0] if name else None)
+    return pd.DataFrame(data, index=index, columns=columns)
+
+def sidecar_folder(path):
+    """Get the folder of the day files of a Sipper (see write_day_sidecar())."""
+    return path + '.days'
+
+def write_day_sidecar(path, data, battery, counter_fixes, version,
+                      keep_idle_ends=False):
+    """
+    Save the loaded data of a Sipper CSV next to it, as one numpy .npz file
+    per day, so windows of it can be read back without parsing the CSV
+    (see read_day_sidecar()).  The files only hold plain arrays (see
+    frame_arrays()), so reading them can't run code even when the folder
+    is shared.  The day files are kept in a folder named after the CSV
+    (see sidecar_folder()), which is replaced if it exists.
+
+    Parameters
+    ----------
+    path : str
+        path of the Sipper CSV
+    data : pandas.DataFrame
+        Sipper data, loaded from the whole file
+    battery : pandas.Series
+        battery voltage of every line of the file, indexed by date
+    counter_fixes : pandas.DataFrame
+        Sipper.counter_fixes of the data
+    version : str
+        Sipper.version of the file
+    keep_idle_ends : bool, optional
+        Option the data were loaded with.  The default is False.
+
+    Returns
+    -------
+    None.
+
+    """
+    folder = sidecar_folder(path)
+    stat = os.stat(path)
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    rows = np.arange(len(data))
+    lines = np.arange(len(battery))
+    data_days = data.index.normalize()
+    battery_days = battery.index.normalize()
+    days = data_days.append(battery_days).dropna().unique().sort_values()
+    for day in days:
+        during = data_days == day
+        battery_during = battery_days == day
+        np.savez(os.path.join(folder, day.strftime('%Y-%m-%d') + '.npz'),
+                 rows=rows[during], lines=lines[battery_during],
+                 **frame_arrays(data[during], 'data_'),
+                 **frame_arrays(battery[battery_during].to_frame(),
+                                'battery_'))
+    # written last, so the folder is only used once it is complete
+    np.savez(os.path.join(folder, 'index.npz'), size=stat.st_size,
+             mtime_ns=stat.st_mtime_ns, version=version,
+             keep_idle_ends=keep_idle_ends, days=days.values,
+             **frame_arrays(counter_fixes, 'fixes_'))
+
+def read_day_sidecar(path, start, end, keep_idle_ends=False):
+    """
+    Read a date window of a Sipper CSV from its day files (see
+    write_day_sidecar()).  Only the days in the window are read.
+
+    Parameters
+    ----------
+    path : str
+        path of the Sipper CSV
+    start, end : datetime-like
+        Date window; either can be None for no limit.  Whole days are
+        returned, in the order of the file.
+    keep_idle_ends : bool, optional
+        Option the data are loaded with; day files saved with the other
+        option are not used.  The default is False.
+
+    Returns
+    -------
+    dict or None
+        Dictionary with keys 'data', 'battery' (indexed by date),
+        'counter_fixes' and 'version'.  None when there are no day files,
+        or the CSV has changed since they were saved.
+
+    """
+    folder = sidecar_folder(path)
+    try:
+        with np.load(os.path.join(folder, 'index.npz'),
+                     allow_pickle=False) as info:
+            saved = (info['size'].item(), info['mtime_ns'].item(),
+                     info['keep_idle_ends'].item())
+            version = info['version'].item()
+            all_days = pd.DatetimeIndex(info['days'])
+            counter_fixes = arrays_frame(info, 'fixes_')
+        stat = os.stat(path)
+    except (OSError, EOFError, KeyError, ValueError):
+        return None
+    if saved != (stat.st_size, stat.st_mtime_ns, keep_idle_ends):
+        return None
+    days = all_days
+    if start is not None:
+        days = days[days >= pd.Timestamp(start).normalize()]
+    if end is not None:
+        days = days[days <= pd.Timestamp(end).normalize()]
+    if days.empty:
+        # nothing in the window, read one day for the columns
+        days = all_days[:1]
+    stored = []
+    try:
+        for day in days:
+            with np.load(os.path.join(folder, day.strftime('%Y-%m-%d') + '.npz'),
+                         allow_pickle=False) as arrays:
+                stored.append({'data' : arrays_frame(arrays, 'data_'),
+                               'rows' : arrays['rows'],
+                               'battery' : arrays_frame(arrays, 'battery_').iloc[:, 0],
+                               'lines' : arrays['lines']})
+    except (OSError, EOFError, KeyError, ValueError):
+        return None
+    # rows are put back in file order (days can be out of order when the
+    # clock of the device was changed)
+    data = pd.concat([s['data'] for s in stored])
+    data = data.take(np.argsort(np.concatenate([s['rows'] for s in stored]),
+                                kind='stable'))
+    battery = pd.concat([s['battery'] for s in stored])
+    battery = battery.take(np.argsort(np.concatenate([s['lines'] for s in stored]),
+                                      kind='stable'))
+    return {'data' : data, 'battery' : battery,
+            'counter_fixes' : counter_fixes, 'version' : version}
+
+def changed_rows(df, columns):
+    """
+    Find rows which differ from the row before them in any of some
+    columns (the first row counts as changed).  Only adjacent rows are
+    compared, one column at a time, so this takes linear time.  Missing
+    values are equal to each other, as in DataFrame.drop_duplicates().
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        data to check
+    columns : list
+        columns to compare
+
+    Returns
+    -------
+    changed : numpy.ndarray
+        bool for each row
+
+    """
+    changed = np.ones(len(df), dtype=bool)
+    if len(df) < 2:
+        return changed
+    changed[1:] = False
+    for column in columns:
+        values = df[column].to_numpy()
+        current, previous = values[1:], values[:-1]
+        if values.dtype.kind == 'f':
+            changed[1:] |= ((current != previous) &
+                            ~(np.isnan(current) & np.isnan(previous)))
+        else:
+            changed[1:] |= current != previous
+    return changed
+
+def compress_unchanged(df, columns, keep_idle_ends=False):
+    """
+    Find the rows to keep when dropping rows which repeat the row before
+    them.  As Sipper counts and durations are cumulative, this gives the
+    same rows as DataFrame.drop_duplicates() on them (unless the counters
+    were reset), without hashing.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        data to compress
+    columns : list
+        columns to compare
+    keep_idle_ends : bool, optional
+        Also keep the last row of each run of repeated rows (and the last
+        row of df), so the time each idle period ended and its battery
+        voltage are kept.  The default is False.
+
+    Returns
+    -------
+    keep : numpy.ndarray
+        bool for each row
+
+    """
+    keep = changed_rows(df, columns)
+    if keep_idle_ends and len(keep):
+        keep[:-1] |= keep[1:].copy()
+        keep[-1] = True
+    return keep
+
+def stitch_counters(df, columns, elapsed=None, previous=None):
+    """
+    Undo resets of cumulative columns, which go back to zero when a Sipper
+    restarts.  A column is reset where it decreases, and all columns are
+    reset where the elapsed time goes back (the Sipper restarted).  The
+    value before each reset is added to that row and all later rows, so
+    the columns keep increasing.  All resets are handled in one pass.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        data indexed by date
+    columns : list
+        cumulative columns to stitch
+    elapsed : str, optional
+        Column of elapsed times (timedeltas) to find restarts from.  The
+        default is None, in which case only decreasing values are resets.
+    previous : dict, optional
+        State of the row before df (see Sipper.set_stitch()), with keys
+        'values' and 'offsets' (dictionaries by column) and 'elapsed', for
+        data which are processed in chunks.  The default is None.
+
+    Returns
+    -------
+    stitched : pandas.DataFrame
+        df with the offsets added (df itself when nothing changed)
+    offsets : dict
+        offsets added to each row, as an array per column
+    fixes : pandas.DataFrame
+        one row per column and reset which changed the data, indexed by
+        date, with the 'Column', the values 'Before' and 'After' the reset,
+        and the total 'Offset' added from then on
+
+    """
+    n = len(df)
+    restart = np.zeros(n, dtype=bool)
+    if elapsed is not None and pd.api.types.is_timedelta64_dtype(df[elapsed]):
+        times = df[elapsed].to_numpy()
+        if n:
+            before = np.empty_like(times)
+            before[1:] = times[:-1]
+            before[0] = times[0] if previous is None else previous['elapsed']
+            restart = times < before
+    stitched = df
+    offsets = {}
+    rows, order, fixes = [], [], []
+    for i, column in enumerate(columns):
+        values = df[column].to_numpy()
+        before = np.empty_like(values)
+        before[1:] = values[:-1]
+        start = 0
+        if n:
+            before[0] = values[0]
+            if previous is not None:
+                before[0] = previous['values'][column]
+                start = previous['offsets'][column]
+        reset = ((values < before) | restart) & ~pd.isna(before)
+        steps = np.where(reset, before, 0)
+        offsets[column] = start + np.cumsum(steps)
+        fixed = np.flatnonzero(steps)
+        if fixed.size:
+            rows.append(fixed)
+            order.append(np.full(fixed.size, i))
+            fixes.append(pd.DataFrame({'Column' : column,
+                                       'Before' : before[fixed],
+                                       'After' : values[fixed],
+                                       'Offset' : offsets[column][fixed]},
+                                      index=df.index[fixed]))
+        if fixed.size or start:
+            if stitched is df:
+                stitched = df.copy()
+            stitched[column] = values + offsets[column]
+    if fixes:
+        # in order of the rows, then of the columns
+        sort = np.lexsort((np.concatenate(order), np.concatenate(rows)))
+        fixes = pd.concat(fixes).iloc[sort]
+    else:
+        fixes = pd.DataFrame(columns=['Column', 'Before', 'After', 'Offset'],
+                             index=df.index[:0])
+    return stitched, offsets, fixes
+
+def repair_times(index, elapsed, tolerance='1min'):
+    """
+    Rebuild timestamps from the elapsed time counter, which keeps running
+    when the clock of a Sipper jumps or drifts.  The data are split into
+    segments where the elapsed time goes back (restarts, or the files of
+    concatenated data), and the times of each segment are set to an
+    anchor time plus the elapsed time.  Three anchors are tried for each
+    segment, from its first row, its median row, and its last row (the
+    time minus the elapsed time), and the one which moves the fewest rows
+    by more than the tolerance is used.  All segments are handled at once.
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+        timestamps to repair
+    elapsed : pandas.Series or pandas.TimedeltaIndex
+        elapsed time of each row; rows where it is missing keep their time
+    tolerance : str or pandas.Timedelta, optional
+        Changes of the clock against the elapsed time smaller than this
+        are not counted as clock jumps or moved rows.  The default is
+        '1min'.
+
+    Returns
+    -------
+    repaired : pandas.DatetimeIndex
+        new timestamps
+    report : pandas.DataFrame
+        one row per segment, with its 'Start' and 'End' (new times),
+        'Rows', the 'Anchor' used ('first', 'median' or 'last'), the
+        number of 'Clock Jumps' found, the rows 'Moved' by more than the
+        tolerance, and the largest 'Shift' of a row
+
+    """
+    tolerance = pd.Timedelta(tolerance).value
+    times = index.asi8
+    elapsed = pd.TimedeltaIndex(elapsed)
+    valid = ~elapsed.isna()
+    if not valid.any():
+        columns = ['Start', 'End', 'Rows', 'Anchor', 'Clock Jumps', 'Moved',
+                   'Shift']
+        return index, pd.DataFrame(columns=columns)
+    counter = elapsed.asi8[valid]
+    offsets = times[valid] - counter
+    # a new segment starts wherever the elapsed time goes back
+    segment = np.zeros(len(counter), dtype=np.int64)
+    segment[1:] = np.cumsum(counter[1:] < counter[:-1])
+    grouped = pd.Series(offsets).groupby(segment)
+    anchors = {'first' : grouped.first().to_numpy(),
+               'median' : grouped.median().round().to_numpy().astype(np.int64),
+               'last' : grouped.last().to_numpy()}
+    names = list(anchors)
+    moved = np.array([np.bincount(segment,
+                                  np.abs(offsets - anchors[n][segment]) > tolerance)
+                      for n in names])
+    best = np.argmin(moved, axis=0)
+    anchor = np.choose(best, [anchors[n] for n in names])
+    new = anchor[segment] + counter
+    shift = np.abs(new - times[valid])
+    jumps = np.zeros(len(offsets), dtype=bool)
+    jumps[1:] = ((np.abs(np.diff(offsets)) > tolerance) &
+                 (segment[1:] == segment[:-1]))
+    repaired = times.copy()
+    repaired[valid] = new
+    starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+    ends = np.r_[starts[1:], len(segment)] - 1
+    report = pd.DataFrame({'Start' : pd.to_datetime(new[starts]),
+                           'End' : pd.to_datetime(new[ends]),
+                           'Rows' : np.bincount(segment),
+                           'Anchor' : [names[i] for i in best],
+                           'Clock Jumps' : np.bincount(segment, jumps).astype(np.int64),
+                           'Moved' : moved[best, np.arange(len(best))].astype(np.int64),
+                           'Shift' : pd.to_timedelta(np.maximum.reduceat(shift, starts))})
+    return pd.DatetimeIndex(repaired, name=index.name), report
+
+def is_light_phase(hours, lights_on=7, lights_off=19):
+    """
+    Check which hours of the day are in the light phase of a light cycle
+    (when lights_on equals lights_off, every hour is).
+
+    Parameters
+    ----------
+    hours : array-like
+        integer hours of the day (0-23)
+    lights_on : int, optional
+        Hour of the day (0-23) when lights turn on. The default is 7.
+    lights_off : int, optional
+         Hour of the day (0-23) when lights turn off. The default is 19.
+
+    Returns
+    -------
+    numpy.ndarray
+        bool for each hour
+
+    """
+    hours = np.asarray(hours)
+    if lights_off > lights_on:
+        return (hours >= lights_on) & (hours < lights_off)
+    elif lights_off < lights_on:
+        return (hours >= lights_on) | (hours < lights_off)
+    return np.ones(hours.shape, dtype=bool)
+
+def bin_resample(values, binsize, anchor=None, how='sum'):
+    """
+    Aggregate a Series (or the columns of a DataFrame) in time bins, like
+    values.resample(binsize).sum(),
+    but computed with integers: the index is converted to nanoseconds,
+    bins are numbered by floor division from the anchor, the rows of each
+    bin are found by searching for the bin edges, and the values are
+    aggregated with numpy.ufunc.reduceat().  Bins can be any fixed width
+    (e.g. "1T", "7T", "90T", "1H", "1D").
+
+    Parameters
+    ----------
+    values : pandas.Series or pandas.DataFrame
+        numeric values with a DatetimeIndex or TimedeltaIndex (which
+        need not be sorted)
+    binsize : str
+        pandas frequency string of fixed width
+    anchor : pandas.Timestamp or pandas.Timedelta, optional
+        Any bin edge, e.g. the hour of the first row or the time lights
+        turn on.  The default is None: midnight of the first row (as
+        pandas does), or the first value of a TimedeltaIndex.
+    how : str, optional
+        "sum", "max" or "last".  Missing values are skipped; empty bins
+        are 0 for "sum" and NaN otherwise.  The default is 'sum'.
+
+    Raises
+    ------
+    SipperError
+        When "how" is not recognized
+
+    Returns
+    -------
+    pandas.Series or pandas.DataFrame
+        indexed by the start of each bin, from the bin of the earliest
+        value to the bin of the latest
+
+    """
+    if how not in ['sum', 'max', 'last']:
+        raise SipperError('how must be "sum", "max", or "last"')
+    index = values.index
+    timedelta = isinstance(index, pd.TimedeltaIndex)
+    if values.empty:
+        return getattr(values.resample(binsize), how)()
+    if anchor is None:
+        anchor = index.min() if timedelta else index.min().normalize()
+    width = pd.tseries.frequencies.to_offset(binsize).nanos
+    times = index.asi8
+    x = values.values
+    if x.dtype == bool:
+        x = x.astype(np.int64)
+    if not index.is_monotonic_increasing:
+        order = np.argsort(times, kind='stable')
+        times, x = times[order], x[order]
+    # rows are sorted, so each bin is a run of rows found by searching
+    # for the bin edges (rather than computing a bin for every row)
+    first_bin = (times[0] - anchor.value) // width
+    count = (times[-1] - anchor.value) // width - first_bin + 1
+    edges = anchor.value + (first_bin + np.arange(1, count)) * width
+    starts = np.append(0, np.searchsorted(times, edges))
+    filled = np.diff(np.append(starts, len(x))) > 0
+    heads = np.minimum(starts, len(x) - 1)
+    shape = (-1,) + (1,) * (x.ndim - 1)
+    # ^ for broadcasting bins against the columns of a DataFrame
+    filled_x = filled.reshape(shape)
+    floats = x.dtype.kind == 'f'
+    if how == 'sum':
+        out = np.add.reduceat(x, heads)
+        if floats:
+            # missing values are usually in few bins (e.g. the first
+            # difference), so only those bins are summed again
+            missing = np.flatnonzero(np.isnan(out).reshape(count, -1).any(1))
+            if len(missing) > 10:
+                out = np.add.reduceat(np.where(np.isnan(x), 0, x), heads)
+            else:
+                ends = np.append(starts[1:], len(x))
+                for i in missing:
+                    out[i] = np.nansum(x[starts[i]:ends[i]], axis=0)
+        out = np.where(filled_x, out, 0)
+    elif how == 'max':
+        out = np.fmax.reduceat(x, heads)
+        if not filled.all():
+            out = np.where(filled_x, out, np.nan)
+    else:
+        last = (np.append(starts[1:], len(x)) - 1).reshape(shape)
+        if floats and np.isnan(x[last.ravel()[filled]]).any():
+            rows = np.where(np.isnan(x), -1, np.arange(len(x)).reshape(shape))
+            last = np.maximum.reduceat(rows, heads)
+        last = np.where(filled_x, last, -1)
+        last = np.broadcast_to(last, (count,) + x.shape[1:])
+        out = np.take_along_axis(x, last, axis=0)
+        if (last < 0).any():
+            out = np.where(last < 0, np.nan, out)
+    start = anchor.value + first_bin * width
+    if timedelta:
+        new_index = pd.timedelta_range(pd.Timedelta(start), periods=count,
+                                       freq=binsize, name=index.name)
+    else:
+        new_index = pd.date_range(pd.Timestamp(start), periods=count,
+                                  freq=binsize, name=index.name)
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame(out, index=new_index, columns=values.columns)
+    return pd.Series(out, index=new_index, name=values.name)
+
+class BinPyramid():
+    """
+    Binned changes of a cumulative Sipper value (e.g. LeftCount), which
+    can be read at any bin size which is a whole number of minutes.  The
+    value at the end of every minute is stored once (the finest level);
+    coarser bins are derived from it by integer indexing, so binning
+    costs time proportional to the number of bins rather than the number
+    of rows.  Derived levels are kept for reuse.
+
+    Gives the same result as values.diff().resample(binsize, ...).sum()
+    for bins anchored on whole minutes.
+
+    Parameters
+    ----------
+    values : pandas.Series
+        cumulative values, with an increasing DatetimeIndex and no
+        missing values
+
+    """
+    step = pd.Timedelta(minutes=1)
+
+    def __init__(self, values):
+        self.name = values.name
+        self.index_name = values.index.name
+        self.first_time = values.index[0]
+        self.last_time = values.index[-1]
+        self.first_value = values.iloc[0]
+        self.origin = self.first_time.floor('T')
+        minutes = (values.index - self.origin) // self.step
+        minutes = np.asarray(minutes, dtype=np.int64)
+        # the value of the last row in each minute, carried forward
+        # through minutes without rows
+        last_row = np.append(minutes[1:] != minutes[:-1], True)
+        filled = np.zeros(minutes[-1] + 1, dtype=np.int64)
+        filled[minutes[last_row]] = np.flatnonzero(last_row)
+        has_row = np.zeros(len(filled), dtype=bool)
+        has_row[minutes] = True
+        filled = np.where(has_row, filled, 0)
+        np.maximum.accumulate(filled, out=filled)
+        self.minute_values = values.values.astype(float)[filled]
+        self.levels = {}
+
+    def binned(self, binsize, anchor):
+        """
+        Sum of the changes of the values within each bin.
+
+        Parameters
+        ----------
+        binsize : str
+            pandas frequency string, a whole number of minutes
+        anchor : pandas.Timestamp
+            any bin edge, on a whole minute
+
+        Returns
+        -------
+        pandas.Series
+            indexed by the start of each bin, from the bin of the first
+            value to the bin of the last
+
+        """
+        width = pd.Timedelta(binsize)
+        start = anchor + ((self.first_time - anchor) // width) * width
+        key = (binsize, start)
+        if key not in self.levels:
+            m = width // self.step
+            count = (self.last_time - start) // width + 1
+            lead = (start - self.origin) // self.step
+            ends = lead + m * np.arange(1, count + 1) - 1
+            ends = np.minimum(ends, len(self.minute_values) - 1)
+            sums = np.diff(self.minute_values[ends], prepend=self.first_value)
+            index = pd.date_range(start, periods=count, freq=binsize,
+                                  name=self.index_name)
+            self.levels[key] = pd.Series(sums, index=index, name=self.name)
+        return self.levels[key].copy()
+
 class Sipper():
-    def __init__(self, path):
+    og_columns = ['MM:DD:YYYY hh:mm:ss', 'Elapsed Time', 'Device',
+                  'LeftCount', 'LeftDuration', 'RightCount',
+                  'RightDuration', 'BatteryVoltage']
+    sipviz_columns = og_columns + ['LeftContents', 'RightContents']
+    # attributes which need the full data, for Sippers created with lazy=True
+    data_attrs = ('data', 'battery', 'duplicate_index', 'last_reading',
+                  'counter_fixes')
+    # columns used to drop unchanged rows
+    count_columns = ['LeftCount','LeftDuration','RightCount','RightDuration']
+    keep_idle_ends = False
+    # ^ default for Sippers from sessions saved before this option
+    window = None
+    day_sidecar = False
+    # ^ defaults for Sippers from sessions saved before these options
+    row_indexes = {}
+    # ^ sparse row indexes of CSVs read with a window, by path (see
+    # csv_row_index()); kept with the size and modification time of the
+    # file, and rebuilt when it changes
+
+    def __init__(self, path, data=None, lazy=False, keep_idle_ends=False,
+                 window=None, day_sidecar=False):
         """
         Load sipper data
 
@@ -172,6 +1096,33 @@ class Sipper():
         ----------
         path : str
             path to sipper data, either as CSV or XLS
+        data : pandas.DataFrame, optional
+            Data already in memory to use instead of reading path, indexed
+            by date (e.g. the output of sipper_concat()).  path should
+            still point to a saved copy of it.  The default is None.
+        lazy : bool, optional
+            Only read the file information of a raw Sipper CSV (see
+            sipper_metadata()), and parse the file the first time its data
+            are used.  Other files are loaded straight away.  The default
+            is False.
+        keep_idle_ends : bool, optional
+            When dropping rows where the counts and durations did not
+            change, keep the last row before each change (see
+            compress_unchanged()).  The default is False.
+        window : tuple, optional
+            (start, end) dates to only keep the data between (inclusive;
+            either can be None for no limit).  For CSVs, only the lines
+            around the window are read, using a sparse index of the file
+            (see csv_row_index()) built the first time it is read, unless
+            the dates of the file are out of order.  Counters which were
+            reset before the window are then not stitched (see
+            stitch_counters()).  Sippers with a window are not lazy or
+            followed by refresh().  The default is None.
+        day_sidecar : bool, optional
+            With a window, read CSVs from day files saved next to them
+            (see read_day_sidecar()) instead of the CSV.  When there are
+            none yet (or the file has changed), the whole file is loaded
+            and its day files are saved.  The default is False.
 
         Raises
         ------
@@ -188,24 +1139,150 @@ class Sipper():
 
         """
         self.path = path
+        self.basename = os.path.basename(path)
+        self.filename, self.extension = os.path.splitext(self.basename)
+        self.extension = self.extension.lower()
+        self.left_name = 'Left'
+        self.right_name = 'Right'
+        self.groups = []
+        self.sipperviz_assigned = False
+        # ^ extra steps for plot code must be added if True
+        self.unduplicated = False
+        # ^ flag to show whether removal of duplicates has been done
+        self.lazy = False
+        self.keep_idle_ends = keep_idle_ends
+        self.window = window
+        self.day_sidecar = day_sidecar
+        self.tail_offset = None
+        # ^ byte offset of unparsed data, for following live recordings
+        self.listeners = []
+        if lazy and data is None and window is None and self.extension == '.csv':
+            info = sipper_metadata(path)
+            if info['version'] == 'Raw':
+                self.lazy = True
+                self.version = info['version']
+                self.device_no = info['device_no']
+                self.start_date = info['start_date']
+                self.end_date = info['last_date' if keep_idle_ends else
+                                     'end_date']
+                self.duration = self.end_date - self.start_date
+                # raw files have no contents assigned
+                self.contents_dict = {}
+                self.contents = []
+                return
+        self.load(data)
+
+    def __getattr__(self, name):
+        # only called for missing attributes; loads lazy Sippers, or
+        # Sippers spilled to disk by SipperResidency, on demand
+        if name in Sipper.data_attrs:
+            with self.data_lock():
+                if self.__dict__.get('spill_path'):
+                    self.restore()
+            if name in self.__dict__:
+                # restored here, or by another thread meanwhile
+                return self.__dict__[name]
+            if self.__dict__.get('lazy'):
+                self.load()
+                return getattr(self, name)
+        raise AttributeError(name)
+
+    def data_lock(self):
+        # the lock of the SipperResidency managing this Sipper, if any
+        residency = self.__dict__.get('residency')
+        return residency.lock if residency is not None else threading.RLock()
+
+    def __getstate__(self):
+        # pickle spilled data with the Sipper, but not the residency manager
+        # or the live mode listeners
+        state = self.__dict__.copy()
+        state.pop('residency', None)
+        state['listeners'] = []
+        spill_path = state.pop('spill_path', None)
+        if spill_path:
+            state.update(pd.read_pickle(spill_path))
+        return state
+
+    def restore(self):
+        """
+        Read data spilled to disk by a SipperResidency back into memory.
+
+        Returns
+        -------
+        None.
+
+        """
+        residency = self.__dict__.get('residency')
+        with self.data_lock():
+            spill_path = self.__dict__.get('spill_path')
+            if not spill_path:
+                return
+            spilled = pd.read_pickle(spill_path)
+            self.data = spilled['data']
+            self.battery = spilled['battery']
+            self.spill_path = None
+            os.remove(spill_path)
+        if residency is not None:
+            residency.touch(self)
+
+    def load(self, data=None):
+        """
+        Read and process the Sipper data, setting the attributes which
+        depend on it.  Called when the Sipper is created, or on first use
+        of the data when it was created with lazy=True.
+
+        Parameters
+        ----------
+        data : pandas.DataFrame, optional
+            See Sipper.__init__().  The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        path = self.path
         print('Loading {}...'.format(path))
+        self.lazy = False
+        window = self.window
+        from_csv = data is None and self.extension == '.csv'
+        if window is not None and self.day_sidecar and from_csv:
+            stored = read_day_sidecar(path, *window, self.keep_idle_ends)
+            if stored is not None:
+                self.version = stored['version']
+                self.tail_offset = None
+                self.data = stored['data']
+                self.counter_fixes = stored['counter_fixes']
+                self.set_window(stored['battery'])
+                self.set_info()
+                return
         try:
-            self.basename = os.path.basename(path)
-            self.filename, self.extension = os.path.splitext(self.basename)
             if self.extension == '.xlsx':
                 warnings.warn('Excel files can take siginficantly longer to load than .csv')
-            self.extension = self.extension.lower()
-            read_opts = {'.csv':pd.read_csv, '.xlsx':pd.read_excel}
-            func = read_opts[self.extension]
-            self.data = func(path)
+            if from_csv:
+                raw = None
+                if window is not None and not self.day_sidecar:
+                    raw = read_csv_window(path, *window, self.row_index())
+                if raw is None:
+                    # read the bytes once, so the offset used by refresh()
+                    # matches what was parsed even if the file is growing
+                    with open(path, 'rb') as f:
+                        raw = f.read()
+                # leave a last line which is still being written for
+                # refresh(), unless it has all the columns already
+                stop = raw.rfind(b'\n') + 1
+                partial = raw[stop:].strip()
+                if stop and partial.count(b',') < len(self.og_columns) - 1:
+                    raw = raw[:stop]
+                self.data = pd.read_csv(io.BytesIO(raw))
+            elif data is None:
+                self.data = pd.read_excel(path)
+            else:
+                self.data = data.reset_index()
             self.data.columns = self.data.columns.str.strip()
-            og_columns = ['MM:DD:YYYY hh:mm:ss', 'Elapsed Time', 'Device',
-                          'LeftCount', 'LeftDuration', 'RightCount',
-                          'RightDuration', 'BatteryVoltage']
-            sipviz_columns = og_columns + ['LeftContents', 'RightContents']
-            if list(self.data.columns) == og_columns:
+            if list(self.data.columns) == self.og_columns:
                 self.version = 'Raw'
-            elif list(self.data.columns) == sipviz_columns:
+            elif list(self.data.columns) == self.sipviz_columns:
                 self.version = 'SipperViz'
             else:
                 raise SipperError('Column names do not match sipper data')
@@ -214,46 +1291,381 @@ class Sipper():
         except pd.errors.EmptyDataError as error:
             raise error
 
+        #rows where the counts and durations did not change are dropped
+        keep = compress_unchanged(self.data, self.count_columns,
+                                  self.keep_idle_ends)
+
+        #live mode offsets, for raw CSVs only
+        self.tail_offset = None
+        if from_csv and window is None and self.version == 'Raw':
+            self.tail_offset = raw.rfind(b'\n') + 1
+            # a last line without a newline may still change
+            self.tail_partial = self.tail_offset < len(raw.rstrip())
+            complete = len(self.data) - self.tail_partial
+            self.set_tail(self.data.iloc[max(complete - 2, 0):complete],
+                          complete > 0 and keep[complete - 1],
+                          self.tail_partial and keep[-1])
+
         #data editing and attributes
-        # keep battery before dropping duplicates
+        # keep battery before dropping unchanged rows
         self.battery = self.data['BatteryVoltage']
-        self.data.drop_duplicates(subset=['LeftCount','LeftDuration',
-                                          'RightCount','RightDuration'],
-                                  inplace=True)
+        if window is not None:
+            # dated, to be cut to the window with the data
+            dates = pd.to_datetime(self.data['MM:DD:YYYY hh:mm:ss'],
+                                   infer_datetime_format=True)
+            self.battery = pd.Series(self.battery.values, index=dates.values,
+                                     name='BatteryVoltage')
+        last_reading = self.data['MM:DD:YYYY hh:mm:ss'].iloc[-1]
+        self.data = self.data.take(np.flatnonzero(keep))
         self.data['MM:DD:YYYY hh:mm:ss'] = pd.to_datetime(self.data['MM:DD:YYYY hh:mm:ss'])
+        self.last_reading = pd.to_datetime(last_reading)
+        # ^ time of the last row, including unchanged rows
         try:
             self.data['Elapsed Time'] = pd.to_timedelta(self.data['Elapsed Time'])
         except:
             pass
         self.data = self.data.set_index('MM:DD:YYYY hh:mm:ss')
+        # counters which were reset (e.g. by a restart) are made cumulative
+        # again; restarts are only taken from Elapsed Time for raw files, as
+        # it also goes back between concatenated files
+        read = self.data
+        elapsed = 'Elapsed Time' if self.version == 'Raw' else None
+        self.data, offsets, self.counter_fixes = stitch_counters(
+            read, self.count_columns, elapsed)
+        if self.tail_offset is not None:
+            self.stitch_state = None
+            self.set_stitch(read, offsets, len(read) - 1 - self.tail_provisional)
+        if len(self.counter_fixes):
+            warnings.warn('Counters of {} were reset {} time(s) and have been '
+                          'stitched (see Sipper.counter_fixes)'.format(
+                              self.filename,
+                              self.counter_fixes.index.nunique()),
+                          SipperWarning)
         if 'LeftContents' not in self.data.columns:
             self.data['LeftContents'] = np.nan
         if 'RightContents' not in self.data.columns:
             self.data['RightContents'] = np.nan
+        if window is not None:
+            if self.day_sidecar and from_csv:
+                write_day_sidecar(path, self.data, self.battery,
+                                  self.counter_fixes, self.version,
+                                  self.keep_idle_ends)
+            self.set_window(self.battery)
+        self.set_info()
 
-        #informational attributes
-        self.basename = os.path.basename(path)
+    def set_info(self):
+        """Set the informational attributes which depend on the data."""
         if len(set(self.data['Device'])) == 1:
             self.device_no = self.data['Device'][0]
         else:
             self.device_no = None
-        self.left_name = 'Left'
-        self.right_name = 'Right'
         self.start_date = self.data.index[0]
         self.end_date = self.data.index[-1]
         self.duration = self.end_date - self.start_date
         self.contents_dict = self.get_contents_dict()
         self.contents = self.set_of_contents()
-        self.groups = []
-        self.sipperviz_assigned = False
-        # ^ extra steps for plot code must be added if True
         self.duplicate_index = any(self.data.index.duplicated())
-        self.unduplicated = False
-        # ^ flag to show whether removal of duplicates has been done
+        self.bin_pyramids = {}
+        self.content_matrices = {}
+        self.calendar = {}
+        residency = self.__dict__.get('residency')
+        if residency is not None:
+            residency.touch(self)
+
+    def row_index(self):
+        """
+        Get the sparse row index of the file (see csv_row_index()), built
+        the first time it is needed, and again when the file changes.
+
+        Returns
+        -------
+        pandas.Series
+            Output of csv_row_index()
+
+        """
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = Sipper.row_indexes.get(self.path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, csv_row_index(self.path))
+            Sipper.row_indexes[self.path] = cached
+        return cached[1]
+
+    def set_window(self, battery):
+        """
+        Cut the data to the window of the Sipper.
+
+        Parameters
+        ----------
+        battery : pandas.Series
+            battery voltage of each line read, indexed by date
+
+        Raises
+        ------
+        SipperError
+            When there are no data in the window
+
+        Returns
+        -------
+        None.
+
+        """
+        start, end = self.window
+        def inside(index):
+            during = np.ones(len(index), dtype=bool)
+            if start is not None:
+                during &= index >= pd.Timestamp(start)
+            if end is not None:
+                during &= index <= pd.Timestamp(end)
+            return np.flatnonzero(during)
+        self.data = self.data.take(inside(self.data.index))
+        battery = battery.take(inside(battery.index))
+        self.counter_fixes = self.counter_fixes.take(
+            inside(self.counter_fixes.index))
+        if self.data.empty:
+            raise SipperError('No data of {} in the window'.format(self.basename))
+        self.last_reading = battery.index[-1]
+        self.battery = battery.reset_index(drop=True)
+
+    def set_tail(self, rows, last_kept, partial_kept=False):
+        """
+        Keep the last complete raw rows for refresh(), which compares new
+        rows with them, and count the rows at the end of the data which
+        refresh() has to parse again: a partial last line which was kept,
+        and (with keep_idle_ends) a last row which was only kept because
+        nothing came after it yet.
+
+        Parameters
+        ----------
+        rows : pandas.DataFrame
+            up to two last complete rows, as read from the file
+        last_kept : bool
+            whether the last of rows was kept in the data
+        partial_kept : bool, optional
+            whether a partial line after rows was kept.  The default is
+            False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.tail_raw = rows.copy()
+        self.tail_provisional = int(partial_kept)
+        if self.keep_idle_ends and last_kept:
+            if not changed_rows(rows, self.count_columns)[-1]:
+                self.tail_provisional += 1
+
+    def set_stitch(self, read, offsets, row):
+        """
+        Keep the state of stitch_counters() after a row, for stitching the
+        rows added by refresh().  Rows after it (which refresh() parses
+        again, see set_tail()) are not included, nor are their fixes.
+
+        Parameters
+        ----------
+        read : pandas.DataFrame
+            rows given to stitch_counters()
+        offsets : dict
+            offsets returned by stitch_counters()
+        row : int
+            position of the row in read (the state is unchanged if
+            negative)
+
+        Returns
+        -------
+        None.
+
+        """
+        if row < 0:
+            return
+        later = sum(np.count_nonzero(np.diff(offsets[c][row:]))
+                    for c in self.count_columns)
+        elapsed = read['Elapsed Time'].to_numpy()[row]
+        if not isinstance(elapsed, np.timedelta64):
+            elapsed = None
+        self.stitch_state = {
+            'values' : {c : read[c].to_numpy()[row] for c in self.count_columns},
+            'offsets' : {c : offsets[c][row] for c in self.count_columns},
+            'elapsed' : elapsed,
+            'fixes' : len(self.counter_fixes) - later}
+
+    def add_listener(self, func):
+        """
+        Call a function whenever refresh() adds new rows.
+
+        Parameters
+        ----------
+        func : callable
+            Called as func(sipper, new_rows), where new_rows is a DataFrame
+            of the rows added to sipper.data (possibly empty).
+
+        Returns
+        -------
+        None.
+
+        """
+        if 'listeners' not in self.__dict__:
+            # Sippers from sessions saved before live mode
+            self.listeners = []
+        if func not in self.listeners:
+            self.listeners.append(func)
+
+    def remove_listener(self, func):
+        """Stop calling a function added with add_listener()."""
+        if func in self.__dict__.get('listeners', []):
+            self.listeners.remove(func)
+
+    def refresh(self):
+        """
+        Parse rows appended to a raw Sipper CSV since it was loaded or last
+        refreshed, for following recordings which are still running.  Only
+        the new bytes of the file are read.  New rows are compared with
+        the last rows already read to drop unchanged rows as when loading,
+        are tagged with any contents assigned to their times, and
+        listeners (see add_listener()) are called with them (also when all
+        the appended rows were unchanged, as last_reading still changes).
+        With keep_idle_ends, a last row which was unchanged is replaced
+        by the new rows, as whether it is kept depends on them.
+
+        Raises
+        ------
+        SipperError
+            Sipper was not loaded from a raw CSV (e.g. concatenated or
+            SipperViz files), or the file is now shorter than what was read.
+
+        Returns
+        -------
+        new : pandas.DataFrame
+            The rows added to self.data (empty if there are none).
+
+        """
+        if self.lazy:
+            self.load()
+        offset = self.__dict__.get('tail_offset')
+        if offset is None:
+            raise SipperError('Only Sippers loaded from raw CSV files can be '
+                              'refreshed')
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < offset:
+                raise SipperError(self.basename + ' is shorter than when '
+                                  'it was loaded')
+            f.seek(offset)
+            chunk = f.read()
+        stop = chunk.rfind(b'\n') + 1
+        if not stop:
+            return self.data.iloc[:0]
+        new = pd.read_csv(io.BytesIO(chunk[:stop]), header=None,
+                          names=self.og_columns)
+        if len(new):
+            self.last_reading = pd.to_datetime(new['MM:DD:YYYY hh:mm:ss'].iloc[-1])
+        data = self.data
+        battery = self.battery
+        if 'tail_raw' not in self.__dict__:
+            # Sippers from sessions saved before rows were compressed
+            partial = self.tail_partial and self.__dict__.get('tail_partial_kept')
+            complete = len(data) - bool(partial)
+            self.tail_raw = data[self.count_columns].iloc[max(complete - 2, 0):complete]
+            self.tail_provisional = int(bool(partial))
+        if self.tail_partial:
+            # the last line was parsed before it was complete; replace it
+            battery = battery.iloc[:-1]
+            self.tail_partial = False
+        if self.tail_provisional:
+            # rows which depended on what came after them are redone
+            data = data.iloc[:-self.tail_provisional]
+        self.tail_offset = offset + stop
+
+        #same steps as load(), for the new rows only, compared with the
+        # last rows before them
+        battery = pd.concat([battery, new['BatteryVoltage']], ignore_index=True)
+        context = len(self.tail_raw)
+        rows = pd.concat([self.tail_raw, new], ignore_index=True)
+        keep = compress_unchanged(rows, self.count_columns,
+                                  self.keep_idle_ends)
+        # the last old row is only added again if it was an unchanged row
+        # (which is kept or not depending on the rows after it)
+        redo = bool(context and self.keep_idle_ends and
+                    not changed_rows(self.tail_raw, self.count_columns)[-1])
+        keep[:context - redo] = False
+        self.set_tail(rows.iloc[-2:], len(rows) > 0)
+        new = rows.take(np.flatnonzero(keep))
+        new['MM:DD:YYYY hh:mm:ss'] = pd.to_datetime(new['MM:DD:YYYY hh:mm:ss'])
+        try:
+            new['Elapsed Time'] = pd.to_timedelta(new['Elapsed Time'])
+        except:
+            pass
+        new = new.set_index('MM:DD:YYYY hh:mm:ss')
+        state = self.__dict__.get('stitch_state')
+        fixes = self.__dict__.get('counter_fixes')
+        if state is not None:
+            fixes = fixes.iloc[:state['fixes']]
+        read = new
+        new, offsets, new_fixes = stitch_counters(read, self.count_columns,
+                                                  'Elapsed Time', state)
+        self.counter_fixes = (new_fixes if fixes is None else
+                              pd.concat([fixes, new_fixes]))
+        self.set_stitch(read, offsets, len(read) - 1 - self.tail_provisional)
+        new['LeftContents'] = np.nan
+        new['RightContents'] = np.nan
+        for (start, end), (left, right) in self.contents_dict.items():
+            during = (new.index >= start) & (new.index < end)
+            new.loc[during, 'LeftContents'] = left
+            new.loc[during, 'RightContents'] = right
+        # match the loaded dtypes, but never truncate new decimal values
+        # (e.g. durations which were all whole numbers so far)
+        dtypes = {c : t for c, t in data.dtypes.items()
+                  if not (t.kind in 'iu' and new[c].dtype.kind == 'f')}
+        new = new.astype(dtypes, errors='ignore')
+
+        #update data and informational attributes
+        if not new.empty:
+            overlap = data.index[data.index >= new.index.min()]
+            if self.unduplicated:
+                data = data[~data.index.isin(new.index)]
+                new = new[~new.index.duplicated(keep='last')]
+            else:
+                self.duplicate_index = (self.duplicate_index or
+                                        any(new.index.duplicated()) or
+                                        any(overlap.isin(new.index)))
+            data = pd.concat([data, new])
+            if self.device_no is not None:
+                if set(new['Device']) != {self.device_no}:
+                    self.device_no = None
+        self.data = data
+        self.battery = battery
+        self.start_date = self.data.index[0]
+        self.end_date = self.data.index[-1]
+        self.duration = self.end_date - self.start_date
+        self.bin_pyramids = {}
+        self.content_matrices = {}
+        self.calendar = {}
+        for func in list(self.__dict__.get('listeners', [])):
+            func(self, new)
+        residency = self.__dict__.get('residency')
+        if residency is not None:
+            residency.touch(self, measure=True)
+        return new
 
     def __repr__(self):
-        """Shows the directory used to make the file."""
-        return 'Sipper("' + self.path + '")'
+        """Shows the directory used to make the file, and the loading
+        options which are not the default."""
+        args = ['"' + self.path + '"'] + self.option_reprs()
+        return 'Sipper(' + ', '.join(args) + ')'
+
+    def option_reprs(self):
+        """Loading options which are not the default, as keyword arguments
+        (for __repr__)."""
+        args = []
+        if self.window is not None:
+            args.append('window={}'.format(tuple(None if d is None else str(d)
+                                                 for d in self.window)))
+        if self.keep_idle_ends:
+            args.append('keep_idle_ends=True')
+        if self.day_sidecar:
+            args.append('day_sidecar=True')
+        return args
 
     def assign_contents(self, d):
         """
@@ -272,6 +1684,9 @@ class Sipper():
 
         """
         self.contents = []
+        self.bin_pyramids = {}
+        self.content_matrices = {}
+        self.calendar = {}
         for (start, end), (left, right) in d.items():
             if not date_filter_okay(self.data, start, end):
                 continue
@@ -350,6 +1765,282 @@ class Sipper():
         return groupby_convertcontent(gr, content=content, out=out,
                                       opposite=opposite).rename(name)
 
+    def get_calendar(self, lights_on=7, lights_off=19, df=pd.DataFrame()):
+        """
+        Get calendar features of each row: the hour of the day, the day
+        number (days since midnight of the first row of the data), and
+        whether the row was in the light phase of the light cycle.  The
+        features of all the data are computed on first use and kept; the
+        hour and day until the data change, and the light phase until
+        the light cycle changes.
+
+        Parameters
+        ----------
+        lights_on : int, optional
+            Hour of the day (0-23) when lights turn on. The default is 7.
+        lights_off : int, optional
+             Hour of the day (0-23) when lights turn off. The default is 19.
+        df : pandas.DataFrame, optional
+            DataFrame to get features for. By default, this will be self.data.
+            Rows of df which are a date range of the data reuse the kept
+            features.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Indexed like df, with integer columns "hour", "day" and "light"
+
+        """
+        if df.empty and df.columns.empty:
+            # the default; data with all rows filtered out get no features
+            df = self.data
+        index = self.data.index
+        start = index.min().normalize().value
+        hour = pd.Timedelta(hours=1).value
+        day = pd.Timedelta(days=1).value
+        cycle = (lights_on, lights_off)
+        calendar = self.__dict__.setdefault('calendar', {})
+        if 'hour' not in calendar or len(calendar['hour']) != len(index):
+            # first use, or rows were added or dropped since
+            calendar['hour'] = index.asi8 // hour % 24
+            calendar['day'] = (index.asi8 - start) // day
+            calendar.pop('cycle', None)
+        if calendar.get('cycle') != cycle:
+            calendar['cycle'] = cycle
+            calendar['light'] = is_light_phase(calendar['hour'], *cycle)
+        rows = slice(None)
+        if df is not self.data:
+            first = index.searchsorted(df.index[0]) if len(df) else 0
+            rows = slice(first, first + len(df))
+            if len(df) and not (index.is_monotonic_increasing and
+                    rows.stop <= len(index) and
+                    index[first] == df.index[0] and
+                    index[rows.stop - 1] == df.index[-1]):
+                # not a date range of the data
+                times = df.index.asi8
+                hours = times // hour % 24
+                return pd.DataFrame({'hour' : hours,
+                                     'day' : (times - start) // day,
+                                     'light' : is_light_phase(hours, *cycle)},
+                                    index=df.index).astype(np.int64)
+        return pd.DataFrame({'hour' : calendar['hour'][rows],
+                             'day' : calendar['day'][rows],
+                             'light' : calendar['light'][rows]},
+                            index=df.index).astype(np.int64)
+
+    def get_content_matrix(self, contents, out, df=pd.DataFrame()):
+        """
+        Get the drink count or duration of several contents at once, and
+        of whatever was opposite each.  Gives the same values as
+        get_content_values() (with opposite False and True) for each
+        content, but the contents of each row are only compared once and
+        the values are stitched together with numpy.  When df is all of
+        the data, the result is kept until the data change.
+
+        Parameters
+        ----------
+        contents : collection
+            content names
+        out : str ("Count" or "Duration")
+            Specify drink count or drink duration.
+        df : pandas.DataFrame, optional
+            DataFrame to compute content for. By default, this will be self.data.
+
+        Raises
+        ------
+        SipperError
+            "out" not "Count" or "Duration"
+
+        Returns
+        -------
+        target, other : pandas.DataFrame
+            Indexed like df, with a column for each content; values are
+            missing for rows where the content was not in the Sipper.
+
+        """
+        if df.empty:
+            df = self.data
+        if out not in ['Count','Duration']:
+            raise SipperError('method get_content_matrix() can only ' +
+                              'use out = "Count" or out = "Duration"')
+        full = df is self.data
+        key = (out, tuple(contents))
+        matrices = self.__dict__.setdefault('content_matrices', {})
+        if full and key in matrices:
+            target, other = matrices[key]
+            return target.copy(), other.copy()
+        left = df['LeftContents'].values
+        right = df['RightContents'].values
+        left_values = df['Left' + out].values.astype(float)
+        right_values = df['Right' + out].values.astype(float)
+        target = np.full((len(df), len(contents)), np.nan)
+        other = np.full((len(df), len(contents)), np.nan)
+        for i, content in enumerate(contents):
+            if content not in self.contents:
+                warnings.warn('Content "' + content + '" not found in ' +
+                              self.filename, SipperWarning)
+                continue
+            on_left = left == content
+            rows = np.flatnonzero(on_left | (right == content))
+            if not len(rows):
+                continue
+            # segments where the left content stays the same, as in
+            # get_content_values()
+            subset = pd.Series(left[rows])
+            changes = subset.ne(subset.shift().bfill()).values
+            changes[0] = True
+            starts = np.flatnonzero(changes)
+            sizes = np.diff(np.append(starts, len(rows)))
+            side = on_left[rows]
+            for matrix, values in [(target, np.where(side, left_values[rows],
+                                                     right_values[rows])),
+                                   (other, np.where(side, right_values[rows],
+                                                    left_values[rows]))]:
+                # each segment continues from the highest value of the
+                # segment before it
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    lows = np.fmin.reduceat(values, starts)
+                    highs = np.fmax.reduceat(values, starts)
+                offsets = np.zeros(len(starts))
+                for j in range(1, len(starts)):
+                    offsets[j] = (highs[j-1] + offsets[j-1]) - lows[j]
+                stitched = values + np.repeat(offsets, sizes)
+                matrix[rows, i] = stitched - np.nanmin(stitched)
+        target = pd.DataFrame(target, index=df.index, columns=list(contents))
+        other = pd.DataFrame(other, index=df.index, columns=list(contents))
+        if full:
+            matrices[key] = (target, other)
+            return target.copy(), other.copy()
+        return target, other
+
+    def get_content_preference(self, contents, out, binsize, base=0,
+                               df=pd.DataFrame()):
+        """
+        Get the binned preference for each of several contents (over
+        whatever was opposite it), as a percent of drinks.  The changes of
+        every content and its opposite are binned together (see
+        get_content_matrix() and bin_resample()), and the preferences come
+        from one division.  Gives the same bins as get_binned() with
+        content keys.
+
+        Parameters
+        ----------
+        contents : collection
+            content names
+        out : str ("Count" or "Duration")
+            Specify drink count or drink duration.
+        binsize : str
+            pandas frequency string for the bins
+        base : int, optional
+            base for pandas resampling (the plots use the hour of the
+            first row). The default is 0.
+        df : pandas.DataFrame, optional
+            DataFrame to compute content for. By default, this will be self.data.
+
+        Returns
+        -------
+        output : dict
+            {content : pandas.Series of preference}, for each content
+            found in df
+
+        """
+        if df.empty:
+            df = self.data
+        target, other = self.get_content_matrix(contents, out, df=df)
+        present = target.notna()
+        found = [c for c in target.columns if present[c].any()]
+        if not found:
+            return {}
+        # changes since the previous row with the same content
+        changes = pd.concat([target[found] - target[found].ffill().shift(),
+                             other[found] - other[found].ffill().shift()],
+                            axis=1, keys=['target', 'other'])
+        freq = pd.tseries.frequencies.to_offset(binsize)
+        offset = pd.Timedelta(base * freq.nanos // freq.n)
+        width = pd.Timedelta(freq)
+        firsts = {c : df.index[present[c].values].min() for c in found}
+        lasts = {c : df.index[present[c].values].max() for c in found}
+        # bins start from midnight of the first row of each content, so
+        # contents are binned together when their bin edges line up
+        anchors = {c : firsts[c].normalize() + offset for c in found}
+        aligned = defaultdict(list)
+        for c in found:
+            aligned[(anchors[c] - anchors[found[0]]) % width].append(c)
+        output = {}
+        for cs in aligned.values():
+            columns = [(k, c) for k in ['target', 'other'] for c in cs]
+            binned = bin_resample(changes[columns], binsize, anchors[cs[0]])
+            preference = (binned['target'] / (binned['target'] +
+                                              binned['other']) * 100)
+            for c in cs:
+                start = anchors[c] + ((firsts[c] - anchors[c]) // width) * width
+                end = anchors[c] + ((lasts[c] - anchors[c]) // width) * width
+                output[c] = preference.loc[start:end, c]
+        return {c : output[c] for c in found}
+
+    def get_binned(self, key, binsize, base=0, df=pd.DataFrame(), values=None):
+        """
+        Get the changes of a cumulative column or content in time bins,
+        i.e. values.diff().resample(binsize, base=base).sum().  When df
+        is all of the data, the result comes from a BinPyramid, which is
+        built on first use and kept until the data change; otherwise it
+        is computed with bin_resample().
+
+        Parameters
+        ----------
+        key : str or tuple
+            A column of the data (e.g. "LeftCount"), or a tuple of
+            arguments for get_content_values(): (content, out) or
+            (content, out, opposite).
+        binsize : str
+            pandas frequency string for the bins
+        base : int, optional
+            base for pandas resampling (the plots use the hour of the
+            first row). The default is 0.
+        df : pandas.DataFrame, optional
+            DataFrame to bin. By default, this will be self.data.
+        values : pandas.Series, optional
+            The values of key for df, if already computed.  They are used
+            when the BinPyramid cannot be.  The default is None.
+
+        Returns
+        -------
+        pandas.Series
+
+        """
+        if df.empty:
+            df = self.data
+        if isinstance(key, tuple):
+            def get_values(df):
+                return self.get_content_values(*key[:2], df=df,
+                                               opposite=key[2:] == (True,))
+        else:
+            def get_values(df):
+                return df[key]
+        full = (len(df) == len(self.data) and
+                df.index[0] == self.data.index[0] and
+                df.index[-1] == self.data.index[-1])
+        freq = pd.tseries.frequencies.to_offset(binsize)
+        offset = pd.Timedelta(base * freq.nanos // freq.n)
+        step = BinPyramid.step
+        if (full and pd.Timedelta(freq) % step == pd.Timedelta(0) and
+            offset % step == pd.Timedelta(0)):
+            pyramids = self.__dict__.setdefault('bin_pyramids', {})
+            if key not in pyramids:
+                values = get_values(self.data)
+                pyramids[key] = None
+                if (not values.empty and values.index.is_monotonic_increasing
+                    and not values.isna().any()):
+                    pyramids[key] = BinPyramid(values)
+            if pyramids[key] is not None:
+                anchor = pyramids[key].first_time.normalize() + offset
+                return pyramids[key].binned(binsize, anchor)
+        if values is None:
+            values = get_values(df)
+        anchor = values.index.min().normalize() + offset
+        return bin_resample(values.diff(), binsize, anchor)
+
     def get_contents_dict(self, df=pd.DataFrame()):
         """
         Return a dictionary of assigned contents for Sipper data.
@@ -399,6 +2090,8 @@ class Sipper():
         df['RightContents'] = np.nan
         self.contents = []
         self.contents_dict = {}
+        self.bin_pyramids = {}
+        self.content_matrices = {}
 
     def unduplicate_index(self, method='keeplast'):
         """
@@ -409,12 +2102,14 @@ class Sipper():
         method : str ('keeplast' or 'fromelapsed'), optional
             Method for fixing index. The default is 'keeplast'.
             - 'keeplast' : delete all duplicate indices except the most recent
-            - 'fromelapsed' : use the "Elapsed Time" column to reassign times
+            - 'fromelapsed' : use the "Elapsed Time" column to reassign
+              times (see repair_times()); the report of the repair is kept
+              in self.time_repairs
 
         Raises
         ------
         SipperError
-            When Elapsed Time can't be used, happens for concatenated data.
+            When Elapsed Time can't be used (it could not be read as times).
 
         Returns
         -------
@@ -423,10 +2118,441 @@ class Sipper():
         """
         if method=='keeplast':
             self.data = self.data[~self.data.index.duplicated(keep='last')]
+            self.duplicate_index = False
         elif method=='fromelapsed':
-            if any(self.data['Elapsed Time'].diff() < pd.Timedelta(0)):
-                raise SipperError('Elapsed Times are not always increasing')
-            t0 = self.data.index[0] - pd.Timedelta(seconds=10)
-            self.data.index = self.data['Elapsed Time'] + t0
+            if not pd.api.types.is_timedelta64_dtype(self.data['Elapsed Time']):
+                raise SipperError('Elapsed Time of ' + self.filename +
+                                  ' cannot be read as times')
+            self.data.index, self.time_repairs = repair_times(
+                self.data.index, self.data['Elapsed Time'])
+            self.duplicate_index = any(self.data.index.duplicated())
         self.unduplicated = True
-        self.duplicate_index = False
\ No newline at end of file
+        self.unduplicate_method = method
+        self.bin_pyramids = {}
+        self.content_matrices = {}
+        self.calendar = {}
+
+class VirtualSipper(Sipper):
+    """
+    Several Sipper files of a recording, presented as one Sipper without
+    concatenating them into a new file (see sipper_concat()).  Only the
+    file information of each file is read when created (see
+    sipper_metadata()); the files are parsed the first time the data are
+    used, and only the files with data in the window are read.  As with
+    sipper_concat(), the drink counts and durations of each file are
+    offset by the totals of the files before it; the offsets are added to
+    each file's data as it is read, and rows which did not change from
+    the end of the file before are dropped (as for concatenated data
+    loaded with Sipper(path, data=...)).
+
+    The data are read from the files, so contents assigned to Sippers
+    already loaded from them are not carried over.  A VirtualSipper can be
+    used in place of a Sipper, but can't be refreshed.
+
+    Parameters
+    ----------
+    paths : list
+        paths to Sipper CSVs whose dates don't overlap, in any order
+    name : str, optional
+        File name shown for the combined files.  The default is None,
+        in which case the name of the first file is used with "_VIRTUAL"
+        added.
+    window : tuple, optional
+        (start, end) dates to only read the data between (see
+        Sipper.__init__()).  The totals of the files before the window
+        are then taken from the last row of each file, which skips any
+        counter resets within them.  The default is None.
+    keep_idle_ends : bool, optional
+        See Sipper.__init__().  The default is False.
+    day_sidecar : bool, optional
+        See Sipper.__init__() (only used with a window).  The default is
+        False.
+
+    Raises
+    ------
+    SipperError
+        When file columns don't match Sipper data, or the dates of the
+        files overlap.
+
+    """
+    def __init__(self, paths, name=None, window=None, keep_idle_ends=False,
+                 day_sidecar=False):
+        infos = sorted([(sipper_metadata(path), path) for path in paths],
+                       key=lambda x: x[0]['start_date'])
+        end = 'last_date' if keep_idle_ends else 'end_date'
+        for (before, _), (info, path) in zip(infos, infos[1:]):
+            if info['start_date'] <= before[end]:
+                raise SipperError('File dates overlap; cannot combine ' +
+                                  os.path.basename(path))
+        self.paths = [path for info, path in infos]
+        self.segments = [{'path' : path, 'start_date' : info['start_date'],
+                          'end_date' : info[end], 'totals' : info['totals'],
+                          'first_totals' : info['first_totals']}
+                         for info, path in infos]
+        first = self.paths[0]
+        if name is None:
+            name = os.path.splitext(os.path.basename(first))[0] + '_VIRTUAL'
+        self.path = os.path.join(os.path.dirname(first), name + '.csv')
+        self.basename = os.path.basename(self.path)
+        self.filename, self.extension = name, '.csv'
+        self.left_name = 'Left'
+        self.right_name = 'Right'
+        self.groups = []
+        self.sipperviz_assigned = False
+        self.unduplicated = False
+        self.keep_idle_ends = keep_idle_ends
+        self.window = window
+        self.day_sidecar = day_sidecar
+        self.tail_offset = None
+        self.listeners = []
+        self.lazy = True
+        self.version = 'Raw' if all(i['version'] == 'Raw' for i, _ in infos) else 'SipperViz'
+        devices = set(info['device_no'] for info, path in infos)
+        self.device_no = devices.pop() if len(devices) == 1 else None
+        self.start_date = self.segments[0]['start_date']
+        self.end_date = self.segments[-1]['end_date']
+        self.duration = self.end_date - self.start_date
+        self.contents_dict = {}
+        self.contents = []
+
+    def __repr__(self):
+        """Shows the files and the options used to make the Sipper."""
+        args = ['[' + ', '.join('"' + path + '"' for path in self.paths) + ']']
+        args.append('name="{}"'.format(self.filename))
+        args += self.option_reprs()
+        return 'VirtualSipper(' + ', '.join(args) + ')'
+
+    def in_window(self, segment):
+        """Whether a file of the Sipper has dates in its window."""
+        if self.window is None:
+            return True
+        start, end = self.window
+        return ((start is None or segment['end_date'] >= pd.Timestamp(start)) and
+                (end is None or segment['start_date'] <= pd.Timestamp(end)))
+
+    def load(self, data=None):
+        """
+        Read the files with data in the window, and combine them.
+
+        Parameters
+        ----------
+        data : None
+            Only for the signature of Sipper.load(); the data are always
+            read from the files.
+
+        Raises
+        ------
+        SipperError
+            When there are no data in the window
+
+        Returns
+        -------
+        None.
+
+        """
+        self.lazy = False
+        offsets = dict.fromkeys(self.count_columns, 0)
+        frames, batteries, fixes = [], [], []
+        last_reading = None
+        before = after = None
+        # ^ counts of the rows next to the files read, from files which
+        # are skipped, as rows are compared with them when dropping
+        # unchanged rows
+        start, end = (None, None) if self.window is None else self.window
+        for i, segment in enumerate(self.segments):
+            totals = segment['totals']
+            if self.in_window(segment):
+                try:
+                    s = Sipper(segment['path'], keep_idle_ends=self.keep_idle_ends,
+                               window=self.window, day_sidecar=self.day_sidecar)
+                except SipperError:
+                    # only unchanged rows in the window
+                    s = None
+            else:
+                s = None
+            if s is not None:
+                if not frames and i and (start is None or
+                                         pd.Timestamp(start) <= segment['start_date']):
+                    before = dict(offsets)
+                df = s.data
+                for column, offset in offsets.items():
+                    if df[column].dtype.kind in 'iu' and float(offset).is_integer():
+                        offset = int(offset)
+                    df[column] += offset
+                if self.window is None:
+                    totals = {c : s.data[c].max() - offsets[c] for c in offsets}
+                frames.append(df)
+                batteries.append(s.battery)
+                fixes.append(s.counter_fixes)
+                last_reading = s.last_reading
+                after = None
+            for column in offsets:
+                offsets[column] += totals[column]
+            if (s is not None and i + 1 < len(self.segments) and
+                (end is None or pd.Timestamp(end) >= segment['end_date'])):
+                first = self.segments[i + 1]['first_totals']
+                after = {c : offsets[c] + first[c] for c in offsets}
+        if not frames:
+            raise SipperError('No data of {} in the window'.format(self.filename))
+        # rows at the start of a file which did not change from the end of
+        # the file before are dropped, as when loading concatenated data
+        data = pd.concat(frames)
+        rows = data[self.count_columns]
+        if before is not None:
+            rows = pd.concat([pd.DataFrame([before]), rows], ignore_index=True)
+        if after is not None:
+            rows = pd.concat([rows, pd.DataFrame([after])], ignore_index=True)
+        keep = compress_unchanged(rows, self.count_columns, self.keep_idle_ends)
+        first = int(before is not None)
+        self.data = data.take(np.flatnonzero(keep[first:first + len(data)]))
+        self.battery = pd.concat(batteries, ignore_index=True)
+        self.counter_fixes = pd.concat(fixes)
+        self.last_reading = last_reading
+        self.set_info()
+
+class SipperResidency():
+    """
+    Keep the data of only the most recently used Sippers in memory.  When
+    there are more than max_sippers Sippers with data loaded, or their
+    data take more than max_mb megabytes, the least recently used are
+    spilled to pickle files in folder.  A spilled Sipper reads its data
+    back the next time they are used (see Sipper.restore()).  Pinned
+    Sippers (e.g. those being plotted) are never spilled, so the limits
+    can be exceeded while they are pinned.
+
+    Parameters
+    ----------
+    max_sippers : int or None, optional
+        Most Sippers to keep in memory.  The default is None (no limit).
+    max_mb : float or None, optional
+        Memory ceiling for the data of kept Sippers, in megabytes.  The
+        most recently used Sipper is always kept.  The default is None
+        (no limit).
+    folder : str, optional
+        Where to write spilled data.  The default is None, in which case
+        a temporary folder is created when first needed.
+
+    """
+    def __init__(self, max_sippers=None, max_mb=None, folder=None):
+        self.max_sippers = max_sippers
+        self.max_mb = max_mb
+        self.folder = folder
+        self.resident = OrderedDict()
+        self.pinned = Counter()
+        self.lock = threading.RLock()
+
+    def track(self, sipper):
+        """Manage the memory of a Sipper (e.g. once it is loaded)."""
+        sipper.residency = self
+        self.touch(sipper)
+
+    def forget(self, sipper, restore=False):
+        """Stop managing a Sipper (e.g. when it is closed).  Its spilled
+        data are deleted, unless restore is True (e.g. when a plot still
+        uses the Sipper), in which case they are read back into memory."""
+        with self.lock:
+            self.resident.pop(sipper, None)
+            if restore:
+                sipper.restore()
+            elif sipper.__dict__.get('spill_path'):
+                os.remove(sipper.spill_path)
+                sipper.spill_path = None
+            sipper.residency = None
+
+    def touch(self, sipper, measure=False):
+        """Mark a Sipper as just used, spilling others if over the limits.
+        Sippers without data in memory are ignored.  Use measure=True
+        when the data of the Sipper have changed size.  Sizes are only
+        measured when there is a max_mb."""
+        if 'data' not in sipper.__dict__:
+            return
+        with self.lock:
+            if sipper in self.resident and not measure:
+                self.resident.move_to_end(sipper)
+            else:
+                size = None
+                if self.max_mb is not None:
+                    size = self.data_size(sipper)
+                self.resident.pop(sipper, None)
+                self.resident[sipper] = size
+            self.enforce()
+
+    def data_size(self, sipper):
+        """Bytes taken by the data of a Sipper in memory."""
+        size = sipper.data.memory_usage(deep=True).sum()
+        return size + sipper.battery.memory_usage(deep=True)
+
+    def pin(self, sippers):
+        """Keep Sippers in memory until they are unpinned.  Pins are
+        counted, so each pin() needs its own unpin()."""
+        with self.lock:
+            self.pinned.update(sippers)
+
+    def unpin(self, sippers):
+        """Undo pin(), spilling others if over the limits."""
+        with self.lock:
+            self.pinned.subtract(sippers)
+            self.pinned = +self.pinned
+            self.enforce()
+
+    def over_limits(self):
+        if self.max_sippers is not None:
+            if len(self.resident) > self.max_sippers:
+                return True
+        if self.max_mb is not None:
+            if sum(self.resident.values()) > self.max_mb * 1e6:
+                return True
+        return False
+
+    def enforce(self):
+        """Spill the least recently used Sippers until within the limits."""
+        with self.lock:
+            if self.max_mb is not None:
+                # sizes aren't measured while there is no max_mb
+                for sipper, size in list(self.resident.items()):
+                    if size is None:
+                        self.resident[sipper] = self.data_size(sipper)
+            spillable = [s for s in list(self.resident)[:-1]
+                         if s not in self.pinned]
+            for sipper in spillable:
+                if not self.over_limits():
+                    break
+                self.spill(sipper)
+
+    def spill(self, sipper):
+        """Write the data of a Sipper to disk and drop them from memory."""
+        with self.lock:
+            if self.folder is None:
+                self.folder = tempfile.mkdtemp(prefix='sipperviz_')
+            path = os.path.join(self.folder,
+                                '{}_{}.pkl'.format(sipper.filename, id(sipper)))
+            pd.to_pickle({'data' : sipper.data, 'battery' : sipper.battery},
+                         path)
+            # set before the data are dropped, so a reader missing them
+            # restores (after waiting for the lock) instead of failing
+            sipper.spill_path = path
+            del sipper.data
+            del sipper.battery
+            sipper.content_matrices = {}
+            sipper.calendar = {}
+            self.resident.pop(sipper, None)
+
+    def close(self):
+        """Delete the spilled data (e.g. when exiting)."""
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+
+#---benchmark
+
+def benchmark_binning(rows=100000, binsizes=('1T', '5T', '1H', '7H', '1D'),
+                      repeats=5, seed=0):
+    """
+    Time bin_resample() against pandas resampling, for a simulated
+    cumulative drink count with a row every 10 seconds.  Pandas bins are
+    aligned with base= (as the pinned pandas 1.0 has no origin=), which
+    can't start daily bins at the anchor hour, so those bins differ.
+
+    Parameters
+    ----------
+    rows : int, optional
+        Number of rows.  The default is 100000 (about 12 days).
+    binsizes : tuple, optional
+        Bin sizes to time.  The default is ('1T', '5T', '1H', '7H', '1D').
+    repeats : int, optional
+        Times to repeat each binning (the best time is kept).  The
+        default is 5.
+    seed : int, optional
+        Seed for the simulated data.  The default is 0.
+
+    Returns
+    -------
+    dict
+        {(binsize, how) : (pandas seconds, bin_resample seconds)}
+
+    """
+    import time
+
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2020-01-01 07:23:10', periods=rows, freq='10S',
+                          name='Date')
+    counts = pd.Series(rng.poisson(0.05, rows).cumsum(), index=index,
+                       name='LeftCount').diff()
+    anchor = index[0].floor('H')
+
+    def best(func):
+        times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    results = {}
+    for binsize in binsizes:
+        # base is counted in the unit of the bin size, from midnight
+        unit = pd.tseries.frequencies.to_offset(binsize).base.delta
+        base = (anchor - anchor.normalize()) // unit
+        for how in ['sum', 'max', 'last']:
+            resampler = lambda: getattr(counts.resample(binsize, base=base),
+                                        how)()
+            kernel = lambda: bin_resample(counts, binsize, anchor, how)
+            with warnings.catch_warnings():
+                # base= is deprecated in newer pandas
+                warnings.simplefilter('ignore', FutureWarning)
+                results[(binsize, how)] = (best(resampler), best(kernel))
+    return results
+
+def benchmark_unchanged(folder='sipper_example_data', repeats=5):
+    """
+    Time compress_unchanged() against DataFrame.drop_duplicates() on the
+    count columns of the Sipper CSVs of a folder, and check that both
+    keep the same rows.
+
+    Parameters
+    ----------
+    folder : str, optional
+        Folder of Sipper CSVs.  The default is 'sipper_example_data'.
+    repeats : int, optional
+        Times to repeat each method (the best time is kept).  The default
+        is 5.
+
+    Returns
+    -------
+    dict
+        {file name : (drop_duplicates seconds, compress_unchanged seconds,
+        whether the same rows were kept)}
+
+    """
+    import time
+
+    def best(func):
+        times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    columns = Sipper.count_columns
+    results = {}
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith('.csv'):
+            continue
+        df = pd.read_csv(os.path.join(folder, name))
+        df.columns = df.columns.str.strip()
+        if not set(columns).issubset(df.columns):
+            continue
+        dropped = df.drop_duplicates(subset=columns)
+        compressed = df.take(np.flatnonzero(compress_unchanged(df, columns)))
+        results[name] = (best(lambda: df.drop_duplicates(subset=columns)),
+                         best(lambda: compress_unchanged(df, columns)),
+                         dropped.equals(compressed))
+    return results
+
+if __name__ == '__main__':
+    for (binsize, how), (pandas_s, kernel_s) in benchmark_binning().items():
+        print('{:>4} {:>4}: pandas {:.5f}s, bin_resample {:.5f}s'.format(
+            binsize, how, pandas_s, kernel_s))
+    for name, (pandas_s, kernel_s, same) in benchmark_unchanged().items():
+        print('{}: drop_duplicates {:.5f}s, compress_unchanged {:.5f}s, '
+              'same rows {}'.format(name, pandas_s, kernel_s, same))
@@ -0,0 +1,400 @@
+"""Rules for raising device health alerts from live Sipper data."""
+
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+class SipperAlert():
+    """
+    An alert raised by an AlertRule.
+
+    Parameters
+    ----------
+    time : pandas.Timestamp
+        time of the Sipper data which raised the alert
+    filename : str
+        basename of the Sipper file
+    rule : str
+        name of the rule
+    message : str
+        description of the problem
+
+    """
+    def __init__(self, time, filename, rule, message):
+        self.time = time
+        self.filename = filename
+        self.rule = rule
+        self.message = message
+
+    def __repr__(self):
+        return 'SipperAlert({}, {}, {}: {})'.format(self.time, self.filename,
+                                                     self.rule, self.message)
+
+#---rules
+
+class AlertRule():
+    """
+    Base class for alert rules.  Rules are checked with each chunk of rows
+    added to a Sipper, and only look at those rows and the state they kept
+    from earlier chunks, so checking costs time proportional to the new
+    rows.  The state dictionary is kept per Sipper by AlertEngine.
+    """
+    name = 'Rule'
+
+    def check(self, sipper, new, state):
+        """
+        Check rows added to a Sipper.
+
+        Parameters
+        ----------
+        sipper : Sipper
+            the Sipper which got new rows
+        new : pandas.DataFrame
+            rows added to sipper.data (possibly empty)
+        state : dict
+            state of the rule for this Sipper, from earlier checks
+
+        Returns
+        -------
+        list of (time, message) tuples, one per alert
+
+        """
+        raise NotImplementedError
+
+class NoDrinksRule(AlertRule):
+    """
+    Alert when neither side has had a drink for some hours, e.g. because
+    a tube is blocked or the Sipper stopped recording drinks.
+
+    Parameters
+    ----------
+    hours : float, optional
+        Hours without drinks to alert after.  The default is 12.
+
+    """
+    name = 'No drinks'
+
+    def __init__(self, hours=12):
+        self.hours = hours
+
+    def check(self, sipper, new, state):
+        if not new.empty:
+            state['last_drink'] = new.index.max()
+            state['active'] = False
+        if 'last_drink' not in state:
+            return []
+        reading = getattr(sipper, 'last_reading', sipper.end_date)
+        since = reading - state['last_drink']
+        if since >= pd.Timedelta(hours=self.hours) and not state.get('active'):
+            state['active'] = True
+            message = 'No drinks for {} (since {})'.format(since,
+                                                           state['last_drink'])
+            return [(reading, message)]
+        return []
+
+class DrinkRateRule(AlertRule):
+    """
+    Alert when there are implausibly many drinks in a short time, which
+    usually means a leaking tube.
+
+    Parameters
+    ----------
+    max_drinks : int, optional
+        Most drinks (both sides combined) expected within the window.
+        The default is 200.
+    minutes : float, optional
+        Length of the rolling window.  The default is 10.
+
+    """
+    name = 'Drink rate'
+
+    def __init__(self, max_drinks=200, minutes=10):
+        self.max_drinks = max_drinks
+        self.minutes = minutes
+
+    def check(self, sipper, new, state):
+        if new.empty:
+            return []
+        window = pd.Timedelta(minutes=self.minutes)
+        counts = new['LeftCount'] + new['RightCount']
+        # rows from the window before this chunk are kept in the state
+        combined = pd.concat([state.get('tail', counts.iloc[:0]), counts])
+        state['tail'] = combined[combined.index > combined.index[-1] - window]
+        if not combined.index.is_monotonic_increasing:
+            return []
+        starts = combined.index.searchsorted(combined.index - window)
+        drinks = combined.values - combined.values[starts]
+        drinks = drinks[-len(counts):]
+        peak = np.argmax(drinks)
+        if drinks[peak] > self.max_drinks:
+            if not state.get('active'):
+                state['active'] = True
+                when = counts.index[peak]
+                message = '{} drinks within {} minutes'.format(drinks[peak],
+                                                               self.minutes)
+                return [(when, message)]
+        else:
+            state['active'] = False
+        return []
+
+class BatteryRule(AlertRule):
+    """
+    Alert when the battery voltage drops below a threshold.
+
+    Parameters
+    ----------
+    min_voltage : float, optional
+        Lowest acceptable voltage.  The default is 3.5.
+
+    """
+    name = 'Low battery'
+
+    def __init__(self, min_voltage=3.5):
+        self.min_voltage = min_voltage
+
+    def check(self, sipper, new, state):
+        # the battery keeps every row, including unchanged ones
+        seen = state.get('seen', 0)
+        battery = sipper.battery.iloc[seen:]
+        state['seen'] = len(sipper.battery)
+        if battery.empty:
+            return []
+        voltage = battery.iloc[-1]
+        if voltage < self.min_voltage:
+            if not state.get('active'):
+                state['active'] = True
+                reading = getattr(sipper, 'last_reading', sipper.end_date)
+                return [(reading, 'Battery at {}V'.format(voltage))]
+        else:
+            state['active'] = False
+        return []
+
+class ClockJumpRule(AlertRule):
+    """
+    Alert when the time of the Sipper jumps, judged against the Elapsed
+    Time column (a jump can also mean the device restarted).  When Elapsed
+    Time is not available, only jumps back in time are detected.
+
+    Parameters
+    ----------
+    minutes : float, optional
+        Smallest jump to alert for.  The default is 5.
+
+    """
+    name = 'Clock jump'
+
+    def __init__(self, minutes=5):
+        self.minutes = minutes
+
+    def check(self, sipper, new, state):
+        if new.empty:
+            return []
+        offsets = new.index.to_series()
+        use_elapsed = pd.api.types.is_timedelta64_dtype(new['Elapsed Time'])
+        if use_elapsed:
+            offsets = offsets - new['Elapsed Time']
+        previous = state.get('last')
+        state['last'] = offsets.iloc[-1]
+        if previous is not None:
+            offsets = pd.concat([pd.Series([previous]), offsets])
+        jumps = offsets.diff().iloc[1:]
+        tolerance = pd.Timedelta(minutes=self.minutes)
+        if use_elapsed:
+            jumps = jumps[jumps.abs() >= tolerance]
+        else:
+            jumps = jumps[jumps < pd.Timedelta(0)]
+        return [(when, 'Time jumped by {}'.format(jump))
+                for when, jump in jumps.items()]
+
+def default_rules():
+    """Get one of each alert rule, with default settings."""
+    return [NoDrinksRule(), DrinkRateRule(), BatteryRule(), ClockJumpRule()]
+
+#---engine
+
+class AlertEngine():
+    """
+    Check alert rules whenever watched Sippers are refreshed (see
+    Sipper.refresh()), keeping the state of each rule per Sipper.
+
+    Parameters
+    ----------
+    rules : list of AlertRule, optional
+        Rules to check.  The default is None, for default_rules().
+    log_path : str, optional
+        CSV file to append alerts to.  The default is None (no log).
+
+    """
+    def __init__(self, rules=None, log_path=None):
+        self.rules = default_rules() if rules is None else rules
+        self.log_path = log_path
+        self.states = {}
+        self.alerts = []
+        self.listeners = []
+        self.check_seconds = 0
+        # ^ total time spent checking rules
+
+    def watch(self, sipper, check=True):
+        """
+        Start checking a Sipper.
+
+        Parameters
+        ----------
+        sipper : Sipper
+            Sipper loaded from a raw CSV
+        check : bool, optional
+            Check the data already loaded.  The default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.states[sipper] = [{} for rule in self.rules]
+        sipper.add_listener(self.check)
+        if check:
+            self.check(sipper, sipper.data)
+
+    def unwatch(self, sipper):
+        """Stop checking a Sipper."""
+        self.states.pop(sipper, None)
+        sipper.remove_listener(self.check)
+
+    def add_listener(self, func):
+        """Call func(alert) with each new SipperAlert."""
+        self.listeners.append(func)
+
+    def check(self, sipper, new):
+        """
+        Check the rules for rows added to a Sipper; this is a listener for
+        Sipper.refresh().
+
+        Returns
+        -------
+        alerts : list
+            new SipperAlerts
+
+        """
+        start = time.perf_counter()
+        alerts = []
+        for rule, state in zip(self.rules, self.states[sipper]):
+            for when, message in rule.check(sipper, new, state):
+                alerts.append(SipperAlert(when, sipper.basename, rule.name,
+                                          message))
+        self.check_seconds += time.perf_counter() - start
+        self.alerts += alerts
+        if alerts and self.log_path:
+            with open(self.log_path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                for alert in alerts:
+                    writer.writerow([alert.time, alert.filename, alert.rule,
+                                     alert.message])
+        for alert in alerts:
+            for func in self.listeners:
+                func(alert)
+        return alerts
+
+#---benchmark
+
+def simulated_rows(device, start, elapsed, counts, rows, rng):
+    """Make raw Sipper CSV text for a simulated device, with a row every
+    10 seconds, occasional drinks and a slowly draining battery.  counts
+    (left count, right count, left duration, right duration) is updated
+    in place."""
+    seconds = elapsed + 10 * np.arange(1, rows + 1)
+    drinks = rng.poisson(0.05, (rows, 2))
+    durations = drinks * rng.uniform(0, 2, (rows, 2))
+    left = counts[0] + drinks[:, 0].cumsum()
+    right = counts[1] + drinks[:, 1].cumsum()
+    left_duration = counts[2] + durations[:, 0].cumsum()
+    right_duration = counts[3] + durations[:, 1].cumsum()
+    counts[:] = [left[-1], right[-1], left_duration[-1], right_duration[-1]]
+    h, rem = np.divmod(seconds, 3600)
+    m, sec = np.divmod(rem, 60)
+    df = pd.DataFrame({
+        'time' : (start + pd.to_timedelta(seconds, unit='s')).strftime('%m/%d/%Y %H:%M:%S'),
+        'elapsed' : ['{}:{:02d}:{:02d}'.format(*t) for t in zip(h, m, sec)],
+        'device' : device,
+        'left' : left,
+        'left_duration' : left_duration.round(1),
+        'right' : right,
+        'right_duration' : right_duration.round(1),
+        'battery' : (4.2 - seconds / 1e6).round(2)})
+    return df.to_csv(header=False, index=False), seconds[-1]
+
+def benchmark(devices=300, chunks=10, rows=60, seed=0):
+    """
+    Time the alert rules over simulated live Sippers.  Each device starts
+    with a day of data, then gets chunks of appended rows which are
+    refreshed and checked.
+
+    Parameters
+    ----------
+    devices : int, optional
+        Number of simulated devices.  The default is 300.
+    chunks : int, optional
+        Number of refreshes of each device.  The default is 10.
+    rows : int, optional
+        Rows appended to each device per refresh.  The default is 60.
+    seed : int, optional
+        Seed for the simulated data.  The default is 0.
+
+    Returns
+    -------
+    dict
+        'load' (seconds checking the initial data), 'check' (seconds
+        checking appended chunks), 'per_chunk' (mean seconds per chunk
+        and device), 'refresh' (seconds in Sipper.refresh() including
+        the checks), and 'alerts' (number of alerts raised)
+
+    """
+    from sipper import Sipper
+
+    rng = np.random.default_rng(seed)
+    folder = tempfile.mkdtemp(prefix='sipperalerts_')
+    start = pd.Timestamp('2020-01-01 12:00:00')
+    header = ','.join(Sipper.og_columns) + '\n'
+    engine = AlertEngine()
+    sippers = []
+    progress = []
+    for device in range(devices):
+        path = os.path.join(folder, 'SIM{:03d}.CSV'.format(device))
+        counts = [0, 0, 0., 0.]
+        text, elapsed = simulated_rows(device, start, 0, counts, 8640, rng)
+        with open(path, 'w') as f:
+            f.write(header + text)
+        s = Sipper(path)
+        engine.watch(s)
+        sippers.append(s)
+        progress.append((elapsed, counts))
+    load_seconds = engine.check_seconds
+    engine.check_seconds = 0
+    refresh_seconds = 0
+    for chunk in range(chunks):
+        for device, s in enumerate(sippers):
+            elapsed, counts = progress[device]
+            text, elapsed = simulated_rows(device, start, elapsed, counts,
+                                           rows, rng)
+            progress[device] = (elapsed, counts)
+            with open(s.path, 'a') as f:
+                f.write(text)
+            t0 = time.perf_counter()
+            s.refresh()
+            refresh_seconds += time.perf_counter() - t0
+    for s in sippers:
+        os.remove(s.path)
+    os.rmdir(folder)
+    return {'load' : load_seconds,
+            'check' : engine.check_seconds,
+            'per_chunk' : engine.check_seconds / (devices * chunks),
+            'refresh' : refresh_seconds,
+            'alerts' : len(engine.alerts)}
+
+if __name__ == '__main__':
+    results = benchmark()
+    for key, value in results.items():
+        print('{:>10}: {}'.format(key, value))
@@ -0,0 +1,320 @@
+"""A catalog of the Sipper files in a folder tree, kept in a SQLite database
+so files can be found by device, date or group before loading them."""
+
+import hashlib
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+
+from sipper import SipperError, sipper_metadata
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    hash TEXT,
+    version TEXT,
+    device_no INTEGER,
+    start_date TEXT,
+    end_date TEXT,
+    rows INTEGER,
+    left_count REAL,
+    left_duration REAL,
+    right_count REAL,
+    right_duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_device ON files (device_no);
+CREATE INDEX IF NOT EXISTS files_dates ON files (start_date, end_date);
+CREATE TABLE IF NOT EXISTS groups (
+    path TEXT,
+    name TEXT,
+    PRIMARY KEY (path, name)
+);
+"""
+
+def file_hash(path, chunksize=2**20):
+    """Get the SHA-1 hex digest of the contents of a file."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def date_text(date):
+    """Format a date as stored in the catalog (sorts like the dates)."""
+    return None if date is None else str(pd.Timestamp(date))
+
+class SipperCatalog():
+    """
+    Index of the Sipper CSVs under one or more folders, stored in a SQLite
+    database.  Scanning only reads the file information of each file (see
+    sipper.sipper_metadata()), and skips files whose size and modification
+    time have not changed since they were last scanned, so rescanning a
+    large tree only costs the new and changed files.  Files which are not
+    Sipper data are kept with their error, so they are skipped too.  Files
+    can be tagged with group names, which follow a file when it is moved
+    (matched by the hash of its contents).
+
+    Parameters
+    ----------
+    path : str, optional
+        SQLite database file, created if needed.  The default is
+        ':memory:' (not saved).
+
+    """
+    columns = ['path', 'size', 'mtime_ns', 'hash', 'version', 'device_no',
+               'start_date', 'end_date', 'rows', 'left_count',
+               'left_duration', 'right_count', 'right_duration', 'error']
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(schema)
+
+    def __repr__(self):
+        return 'SipperCatalog("' + self.path + '")'
+
+    def read_file(self, path, stat):
+        """Get the catalog record of one file, as a tuple of columns."""
+        record = dict.fromkeys(self.columns)
+        record.update(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        try:
+            info = sipper_metadata(path)
+            record['hash'] = file_hash(path)
+        except (SipperError, pd.errors.EmptyDataError, OSError,
+                UnicodeDecodeError, ValueError) as error:
+            record['error'] = str(error) or type(error).__name__
+            return tuple(record.values())
+        totals = info['totals']
+        record.update(version=info['version'],
+                      device_no=info['device_no'],
+                      start_date=date_text(info['start_date']),
+                      end_date=date_text(info['end_date']),
+                      rows=info['rows'],
+                      left_count=totals['LeftCount'],
+                      left_duration=totals['LeftDuration'],
+                      right_count=totals['RightCount'],
+                      right_duration=totals['RightDuration'])
+        return tuple(record.values())
+
+    def scan(self, folder, progress=None):
+        """
+        Add the CSVs in a folder (and its subfolders) to the catalog, and
+        remove files of the folder which no longer exist.
+
+        Parameters
+        ----------
+        folder : str
+            folder to scan
+        progress : callable, optional
+            Called as progress(path) before each new or changed file is
+            read.  The default is None.
+
+        Returns
+        -------
+        counts : dict
+            Number of files 'added', 'updated', 'unchanged', 'removed' and
+            'failed' (not Sipper data)
+
+        """
+        folder = os.path.abspath(folder)
+        prefix = os.path.join(folder, '')
+        cursor = self.connection.execute(
+            'SELECT path, size, mtime_ns, hash FROM files '
+            'WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+        known = {path : (size, mtime, digest)
+                 for path, size, mtime, digest in cursor}
+        counts = dict(added=0, updated=0, unchanged=0, removed=0, failed=0)
+        records = []
+        seen = set()
+        for root, dirs, names in os.walk(folder):
+            dirs.sort()
+            for name in sorted(names):
+                if not name.lower().endswith('.csv'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                old = known.get(path)
+                if old is not None and old[:2] == (stat.st_size, stat.st_mtime_ns):
+                    counts['unchanged'] += 1
+                    continue
+                if progress is not None:
+                    progress(path)
+                record = self.read_file(path, stat)
+                records.append(record)
+                counts['updated' if old is not None else 'added'] += 1
+                if record[-1] is not None:
+                    counts['failed'] += 1
+        removed = [path for path in known if path not in seen]
+        counts['removed'] = len(removed)
+        # groups follow files which were moved or renamed
+        hashes = {record[3] : record[0] for record in records
+                  if record[3] is not None and record[0] not in known}
+        moved = [(hashes[known[path][2]], path) for path in removed
+                 if known[path][2] in hashes]
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO files VALUES ({})'.format(
+                    ', '.join('?' * len(self.columns))), records)
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO groups SELECT ?, name FROM groups '
+                'WHERE path = ?', moved)
+            self.connection.executemany('DELETE FROM files WHERE path = ?',
+                                        [(path,) for path in removed])
+            self.connection.executemany('DELETE FROM groups WHERE path = ?',
+                                        [(path,) for path in removed])
+        return counts
+
+    def query(self, device=None, start=None, end=None, group=None,
+              folder=None):
+        """
+        Find Sipper files in the catalog.  All the given criteria must
+        match.
+
+        Parameters
+        ----------
+        device : int or list, optional
+            Device number(s).  The default is None.
+        start : datetime-like, optional
+            Only files with data after this date.  The default is None.
+        end : datetime-like, optional
+            Only files with data before this date.  The default is None.
+        group : str, optional
+            Only files tagged with this group.  The default is None.
+        folder : str, optional
+            Only files in this folder (or its subfolders).  The default is
+            None.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per file (ordered by device and start date), with the
+            catalog columns, and the dates as datetimes
+
+        """
+        where = ['error IS NULL']
+        params = []
+        if device is not None:
+            devices = [device] if pd.api.types.is_scalar(device) else list(device)
+            where.append('device_no IN ({})'.format(', '.join('?' * len(devices))))
+            params += [int(d) for d in devices]
+        if start is not None:
+            where.append('end_date >= ?')
+            params.append(date_text(start))
+        if end is not None:
+            where.append('start_date <= ?')
+            params.append(date_text(end))
+        if group is not None:
+            where.append('path IN (SELECT path FROM groups WHERE name = ?)')
+            params.append(group)
+        if folder is not None:
+            prefix = os.path.join(os.path.abspath(folder), '')
+            where.append('substr(path, 1, ?) = ?')
+            params += [len(prefix), prefix]
+        sql = ('SELECT * FROM files WHERE ' + ' AND '.join(where) +
+               ' ORDER BY device_no, start_date, path')
+        output = pd.read_sql_query(sql, self.connection, params=params)
+        for column in ['start_date', 'end_date']:
+            output[column] = pd.to_datetime(output[column])
+        return output
+
+    def devices(self):
+        """Get the device numbers in the catalog."""
+        cursor = self.connection.execute(
+            'SELECT DISTINCT device_no FROM files WHERE device_no IS NOT NULL '
+            'ORDER BY device_no')
+        return [row[0] for row in cursor]
+
+    def group_names(self):
+        """Get the group names used in the catalog."""
+        cursor = self.connection.execute(
+            'SELECT DISTINCT name FROM groups ORDER BY name')
+        return [row[0] for row in cursor]
+
+    def get_groups(self, path):
+        """Get the groups of a file."""
+        cursor = self.connection.execute(
+            'SELECT name FROM groups WHERE path = ? ORDER BY name',
+            (os.path.abspath(path),))
+        return [row[0] for row in cursor]
+
+    def add_to_group(self, paths, group):
+        """Tag files with a group name."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO groups VALUES (?, ?)',
+                [(os.path.abspath(path), group) for path in paths])
+
+    def remove_from_group(self, paths, group):
+        """Remove a group name from files."""
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM groups WHERE path = ? AND name = ?',
+                [(os.path.abspath(path), group) for path in paths])
+
+    def close(self):
+        self.connection.close()
+
+#---command line
+
+def main(argv=None):
+    """
+    Command line interface: scan folders into a catalog, query it, or tag
+    files with groups.  Run with --help for the options.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Catalog of Sipper files')
+    parser.add_argument('database', help='SQLite catalog file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan = commands.add_parser('scan', help='add folders to the catalog')
+    scan.add_argument('folders', nargs='+')
+    query = commands.add_parser('query', help='list matching files')
+    query.add_argument('--device', type=int, nargs='+')
+    query.add_argument('--start', help='only files with data after this date')
+    query.add_argument('--end', help='only files with data before this date')
+    query.add_argument('--group')
+    query.add_argument('--folder')
+    query.add_argument('--paths', action='store_true',
+                       help='only print the file paths')
+    group = commands.add_parser('group', help='tag files with a group')
+    group.add_argument('name')
+    group.add_argument('paths', nargs='+')
+    group.add_argument('--remove', action='store_true',
+                       help='remove the group from the files instead')
+    args = parser.parse_args(argv)
+
+    catalog = SipperCatalog(args.database)
+    if args.command == 'scan':
+        for folder in args.folders:
+            counts = catalog.scan(folder)
+            print('{}: {}'.format(folder, ', '.join('{} {}'.format(v, k)
+                                                    for k, v in counts.items())))
+    elif args.command == 'query':
+        found = catalog.query(device=args.device, start=args.start,
+                              end=args.end, group=args.group,
+                              folder=args.folder)
+        if args.paths:
+            for path in found['path']:
+                print(path)
+        else:
+            columns = ['path', 'device_no', 'start_date', 'end_date', 'rows']
+            print(found[columns].to_string(index=False))
+    elif args.command == 'group':
+        if args.remove:
+            catalog.remove_from_group(args.paths, args.name)
+        else:
+            catalog.add_to_group(args.paths, args.name)
+    catalog.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
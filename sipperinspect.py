@@ -3,29 +3,93 @@
 Tools for SipperViz for inspecting plot code.
 """
 
-import importlib.util
+import ast
+import functools
 import inspect
 import os
 
+import sipper
+import sipperplots
+
 #see here:
     #https://stackoverflow.com/questions/61379330/problem-with-inspect-using-pyinstaller-can-get-source-of-class-but-not-function
+# in the frozen app, inspect can't find the source of functions, so the
+# .py files are bundled as data (see the pyinstaller commands) and read here
 homedir = os.path.dirname(os.path.realpath(__file__))
 
-location = os.path.join(homedir, 'sipperplots.py')
-spec = importlib.util.spec_from_file_location('sipperplots', location)
-sipperplots = importlib.util.module_from_spec(spec) #my plots module
-spec.loader.exec_module(sipperplots)
+class SourceProvider():
+    """
+    Look up the source code of the top-level functions and classes of an
+    already-imported module, without executing the module again.  The
+    source is read from the module's .py file (bundled next to this one in
+    the frozen app); if that file can't be found, inspect is used on the
+    imported objects instead.
+
+    Parameters
+    ----------
+    module : module
+        imported module to get source from
+
+    """
+    def __init__(self, module):
+        self.module = module
+        self.path = os.path.join(homedir, module.__name__ + '.py')
+        self.sources = None
+
+    def read_sources(self):
+        """Parse the module file and store the source of each top-level
+        definition, keyed by name."""
+        self.sources = {}
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            text = f.read()
+        lines = text.splitlines(keepends=True)
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n' # as done by linecache for inspect
+        for node in ast.parse(text).body:
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                first = min([node.lineno] +
+                            [d.lineno for d in node.decorator_list]) - 1
+                block = inspect.getblock(lines[first:])
+                self.sources[node.name] = ''.join(block)
+
+    def getsource(self, name):
+        """
+        Get the source code of a function or class.
+
+        Parameters
+        ----------
+        name : str
+            name of the function or class in the module
 
-location = os.path.join(homedir, 'sipper.py')
-spec = importlib.util.spec_from_file_location("sipper", location)
-sipper = importlib.util.module_from_spec(spec) #my plots module
-spec.loader.exec_module(sipper)
+        Returns
+        -------
+        str
+            source code
+
+        """
+        if self.sources is None:
+            self.read_sources()
+        if name not in self.sources:
+            self.sources[name] = inspect.getsource(getattr(self.module, name))
+        return self.sources[name]
+
+source_providers = {'sipper' : SourceProvider(sipper),
+                    'sipperplots' : SourceProvider(sipperplots)}
+
+def getsource(obj):
+    """Get the source of a function or class from sipper or sipperplots."""
+    return source_providers[obj.__module__].getsource(obj.__name__)
 
 imports = """# importing libraries (may be redundant):
 
 from collections import defaultdict
 import datetime
+import io
 import os
+import shutil
+import threading
 import warnings
 
 import matplotlib.dates as mdates
@@ -43,26 +107,40 @@ register_matplotlib_converters()
 plt.style.use('seaborn-whitegrid')
 """
 
-# relate each function name to its function from sipperplots
-func_dict = {name:func for name, func in inspect.getmembers(sipperplots)}
-
 #create a list of arguments that need to be formatted as a string
 string_args = ['binsize', 'circ_var', 'pref_bins', 'pref_side', 'pref_metric',
                'averaging', 'avg_bins', 'avg_var']
 
-# create strings of the helper function code
+# helpers from sipper needed to load Sipper files
+sipper_help = ['date_filter_okay', 'SipperError', 'SipperWarning',
+               'is_concatable', 'groupby_getcontentdict',
+               'groupby_convertcontent', 'changed_rows',
+               'compress_unchanged', 'stitch_counters',
+               'is_light_phase', 'bin_resample', 'BinPyramid']
+
+# helpers from sipper only needed for some loading options
+window_help = ['csv_row_index', 'read_csv_window']
+sidecar_help = ['frame_arrays', 'arrays_frame', 'sidecar_folder',
+                'write_day_sidecar', 'read_day_sidecar']
+repair_help = ['repair_times']
+virtual_help = ['sipper_metadata']
+
+# (comment, helper names); the 'virtual' block also adds VirtualSipper
+sipper_blocks = {'window' : ('# reading date windows of files', window_help),
+                 'sidecar' : ('# day files', sidecar_help),
+                 'repair' : ('# rebuilding dates from elapsed time',
+                             repair_help),
+                 'virtual' : ('# combining files', virtual_help)}
+
+# names of the helper functions needed by each group of plots
 shade_funcs = ['drinkcount_cumulative', 'drinkduration_cumulative',
                'drinkcount_binned', 'drinkduration_binned',
                'side_preference', 'averaged_drinkcount',
                'averaged_drinkdruation', 'averaged_side_preference',
                'averaged_content_preference', 'cumulative_averaged_drinkcount',
                'cumulative_averaged_drinkcount']
-shade_help = '# shading dark periods\n\n'
-shade_help += inspect.getsource(sipperplots.convert_dt64_to_dt) + '\n'
-shade_help += inspect.getsource(sipperplots.hours_between) + '\n'
-shade_help += inspect.getsource(sipperplots.is_day_or_night) + '\n'
-shade_help += inspect.getsource(sipperplots.night_intervals) + '\n'
-shade_help += inspect.getsource(sipperplots.shade_darkness) + '\n'
+shade_help = ['convert_dt64_to_dt', 'hours_between', 'is_day_or_night',
+              'night_intervals', 'shade_darkness']
 
 date_format_funcs = ['drinkcount_cumulative', 'drinkduration_cumulative',
                      'drinkcount_binned', 'drinkduration_binned',
@@ -71,28 +149,130 @@ date_format_funcs = ['drinkcount_cumulative', 'drinkduration_cumulative',
                      'averaged_content_preference',
                      'cumulative_averaged_drinkcount',
                      'cumulative_averaged_drinkcount']
-date_format_help = '# formatting date x-axis\n\n'
-date_format_help += inspect.getsource(sipperplots.date_format_x) + '\n'
+date_format_help = ['date_format_x']
 
 idi_funcs = ['interdrink_intervals', 'interdrink_intervals_byside',
              'interdrink_intervals_bycontent']
-idi_help = '# interdrink intervals\n\n'
-idi_help += inspect.getsource(sipperplots.get_any_idi) + '\n'
-idi_help += inspect.getsource(sipperplots.get_side_idi) + '\n'
-idi_help += inspect.getsource(sipperplots.get_content_idi) + '\n'
-idi_help += inspect.getsource(sipperplots.setup_idi_axes) + '\n'
+idi_help = ['get_any_idi', 'get_side_idi', 'get_content_idi', 'setup_idi_axes']
 
 chrono_funcs = ['drinkcount_chronogram', 'drinkcount_chronogram_grouped',
                 'drinkduration_chronogram', 'drinkduration_chronogram_grouped']
-chrono_help = '# chronograms\n\n'
-chrono_help += inspect.getsource(sipperplots.get_chronogram_vals) + '\n'
+chrono_help = ['get_chronogram_vals']
+
+group_funcs = ['drinkcount_chronogram_grouped',
+               'drinkduration_chronogram_grouped', 'averaged_drinkcount',
+               'averaged_drinkduration', 'averaged_side_preference',
+               'averaged_content_preference', 'cumulative_averaged_drinkcount',
+               'cumulative_averaged_drinkduration']
+group_help = ['get_group_members']
 
 avg_funcs = ['averaged_drinkcount', 'averaged_drinkdruation',
              'averaged_side_preference', 'averaged_content_preference',
              'cumulative_averaged_drinkcount', 'cumulative_averaged_drinkcount']
-avg_help = '# averaging\n\n'
-avg_help += inspect.getsource(sipperplots.preproc_averaging) + '\n'
-avg_help += inspect.getsource(sipperplots.format_averaging_axes) + '\n'
+avg_help = ['preproc_averaging', 'format_averaging_axes']
+
+# (comment, plots needing the helpers, helper function names)
+helper_blocks = {'shade' : ('# shading dark periods', shade_funcs, shade_help),
+                 'date_format' : ('# formatting date x-axis', date_format_funcs,
+                                  date_format_help),
+                 'idi' : ('# interdrink intervals', idi_funcs, idi_help),
+                 'chrono' : ('# chronograms', chrono_funcs, chrono_help),
+                 'group' : ('# group membership', group_funcs, group_help),
+                 'avg' : ('# averaging', avg_funcs, avg_help)}
+
+@functools.lru_cache(maxsize=None)
+def get_helper_code(block):
+    """
+    Get the source code for one block of helper functions.  The source is
+    only looked up the first time a block is needed, and then reused.
+
+    Parameters
+    ----------
+    block : str
+        key of helper_blocks
+
+    Returns
+    -------
+    output : str
+        commented source code of the helper functions
+
+    """
+    comment, plots, helpers = helper_blocks[block]
+    output = comment + '\n\n'
+    for name in helpers:
+        output += source_providers['sipperplots'].getsource(name) + '\n'
+    return output
+
+def get_sipper_blocks(sippers):
+    """
+    Get which of the optional sipper helpers (sipper_blocks) are needed to
+    load some Sippers again, from the options they were loaded with.
+
+    Parameters
+    ----------
+    sippers : list
+        Sipper objects used by a plot
+
+    Returns
+    -------
+    tuple
+        keys of sipper_blocks, in order
+
+    """
+    needed = set()
+    for s in sippers:
+        if s.window is not None:
+            needed.add('window')
+            if s.day_sidecar:
+                needed.add('sidecar')
+        if s.unduplicated and s.__dict__.get('unduplicate_method') == 'fromelapsed':
+            needed.add('repair')
+        if isinstance(s, sipper.VirtualSipper):
+            needed.add('virtual')
+    return tuple(block for block in sipper_blocks if block in needed)
+
+@functools.lru_cache(maxsize=None)
+def get_sipper_code(blocks=()):
+    """
+    Get the imports and source code needed to load Sipper files, which
+    starts every generated script.  Built once for each set of blocks,
+    then reused.
+
+    Parameters
+    ----------
+    blocks : tuple, optional
+        Keys of sipper_blocks to include (see get_sipper_blocks()).  The
+        default is ().
+
+    Returns
+    -------
+    output : str
+        imports, sipper helper functions, and the Sipper class (and
+        VirtualSipper, if needed)
+
+    """
+    provider = source_providers['sipper']
+    output = imports + '\n'
+    output += '# sipper loading helper functions\n'
+    for helper in sipper_help:
+        output += provider.getsource(helper) + '\n'
+    for block in blocks:
+        comment, helpers = sipper_blocks[block]
+        output += comment + '\n'
+        for helper in helpers:
+            output += provider.getsource(helper) + '\n'
+    output += '# loading sipper files\n'
+    output += provider.getsource('Sipper') + '\n'
+    if 'virtual' in blocks:
+        output += provider.getsource('VirtualSipper') + '\n'
+    return output
+
+def unduplicate_call(s):
+    """Get the call to repeat the unduplicate_index() of a Sipper."""
+    method = s.__dict__.get('unduplicate_method', 'keeplast')
+    if method == 'keeplast':
+        return '.unduplicate_index()\n'
+    return '.unduplicate_index(method={})\n'.format(add_quotes(method))
 
 def add_quotes(string):
     output = '"' + string + '"'
@@ -103,37 +283,17 @@ def generate_code(sipper_plot):
     funcname = func.__name__
     output = ''
 
-    # imports
-    output += imports + '\n'
-
-    # helper functions for loading sippers
-    output += '# sipper loading helper functions\n'
-    output += inspect.getsource(sipper.date_filter_okay) + '\n'
-    output += inspect.getsource(sipper.SipperError) + '\n'
-    output += inspect.getsource(sipper.SipperWarning) + '\n'
-    output += inspect.getsource(sipper.is_concatable) + '\n'
-    output += inspect.getsource(sipper.groupby_getcontentdict) + '\n'
-    output += inspect.getsource(sipper.groupby_convertcontent) + '\n'
-
-    # code to load sippers
-    output += '# loading sipper files\n'
-    output += inspect.getsource(sipper.Sipper) + '\n'
+    # imports and code to load sippers
+    output += get_sipper_code(get_sipper_blocks(sipper_plot.content_dicts))
 
     # helper functions
-    if funcname in shade_funcs:
-        output += shade_help
-    if funcname in date_format_funcs:
-        output += date_format_help
-    if funcname in idi_funcs:
-        output += idi_help
-    if funcname in chrono_funcs:
-        output += chrono_help
-    if funcname in avg_funcs:
-        output += avg_help
+    for block, (comment, plots, helpers) in helper_blocks.items():
+        if funcname in plots:
+            output += get_helper_code(block)
 
     # plotting function
     output += '# plotting function\n'
-    output += inspect.getsource(func) + '\n'
+    output += getsource(func) + '\n'
 
     # arguments
     output += '# arguments\n'
@@ -157,7 +317,7 @@ def generate_code(sipper_plot):
                 d = sipper_plot.content_dicts[s]
                 output += arg + '.assign_contents({})\n'.format(d)
             if s.unduplicated:
-                output += arg + '.unduplicate_index()\n'
+                output += arg + unduplicate_call(s)
         elif arg == 'sippers':
             sipper_list = []
             for i, s in enumerate(used_args[arg]):
@@ -169,7 +329,7 @@ def generate_code(sipper_plot):
                     d = sipper_plot.content_dicts[s]
                     output += variable + '.assign_contents({})\n'.format(d)
                 if s.unduplicated:
-                    output += variable + '.unduplicate_index()\n'
+                    output += variable + unduplicate_call(s)
             var_list = '\nsippers = ' + '[%s]' % ', '.join(map(str, sipper_list)) + '\n'
             output += var_list
         elif arg == 'groups':
@@ -195,4 +355,119 @@ def generate_code(sipper_plot):
         else:
             call += arg + ')'
     output += call
-    return output
\ No newline at end of file
+    return output
+#---benchmark
+
+def has_display():
+    """Whether a window can be opened (always assumed on Windows & macOS)."""
+    import platform
+    if platform.system() in ('Windows', 'Darwin'):
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+def benchmark_imports(modules=None, repeats=3, deferred=('scipy', 'seaborn'),
+                      budget=2.0, timeout=60):
+    """
+    Time importing the SipperViz modules, each in a fresh interpreter
+    run with python -X importtime.  Importing sipperviz also builds the
+    first window, so its time is the time to first window; the other
+    modules are what is imported before it.
+
+    Parameters
+    ----------
+    modules : tuple, optional
+        Modules to import.  The default is None: 'sipper', 'plotdata',
+        'sipperplots' and 'sipperinspect', and 'sipperviz' when there is
+        a display (see has_display()).
+    repeats : int, optional
+        Times to import each module (the best time is kept).  The default
+        is 3.
+    deferred : tuple, optional
+        Packages which should only be imported when first used (see
+        sipperplots.LazyModule), flagged when they are imported anyway.
+        The default is ('scipy', 'seaborn').
+    budget : float, optional
+        Seconds each module may take to import; modules which take longer
+        are flagged.  The default is 2.0.
+    timeout : float, optional
+        Seconds to wait for each import before it is counted as failed.
+        The default is 60.
+
+    Returns
+    -------
+    dict
+        {module : dict} with keys "total" and "own" (seconds), "slowest"
+        (the slowest imports, as [(package, seconds)]), "deferred"
+        (deferred packages which were imported), "over_budget" (bool),
+        and "error" (why the import failed, or None; the other values are
+        then None).
+
+    """
+    import subprocess
+    import sys
+
+    if modules is None:
+        modules = ('sipper', 'plotdata', 'sipperplots', 'sipperinspect')
+        if has_display():
+            modules += ('sipperviz',)
+    results = {}
+    for module in modules:
+        runs = []
+        error = None
+        for i in range(repeats):
+            try:
+                done = subprocess.run([sys.executable, '-X', 'importtime',
+                                       '-c', 'import ' + module],
+                                      cwd=homedir, capture_output=True,
+                                      text=True, check=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                error = 'timed out after {}s'.format(timeout)
+                break
+            except subprocess.CalledProcessError as e:
+                lines = e.stderr.strip().splitlines()
+                error = lines[-1] if lines else 'exit code {}'.format(e.returncode)
+                break
+            times = {}
+            for line in done.stderr.splitlines():
+                if not line.startswith('import time:'):
+                    continue
+                own, total, name = line[len('import time:'):].split('|')
+                if not own.strip().isdigit():
+                    continue # the header
+                times[name.strip()] = (int(own) / 1e6, int(total) / 1e6)
+            runs.append(times)
+        if error is not None:
+            results[module] = {'total' : None, 'own' : None, 'slowest' : None,
+                               'deferred' : None, 'over_budget' : None,
+                               'error' : error}
+            continue
+        times = min(runs, key=lambda t: t[module][1])
+        total, own = times[module][1], times[module][0]
+        slowest = sorted(((name, t[1]) for name, t in times.items()
+                          if name != module), key=lambda x: -x[1])[:5]
+        results[module] = {'total' : total, 'own' : own, 'slowest' : slowest,
+                           'deferred' : [p for p in deferred if p in times],
+                           'over_budget' : total > budget, 'error' : None}
+    return results
+
+if __name__ == '__main__':
+    budget = 2.0
+    results = benchmark_imports(budget=budget)
+    for module, r in results.items():
+        if r['error'] is not None:
+            print('{}: FAILED ({})'.format(module, r['error']))
+            continue
+        flags = []
+        if r['over_budget']:
+            flags.append('OVER BUDGET ({:.1f}s)'.format(budget))
+        if r['deferred']:
+            flags.append('DEFERRED IMPORTED ({})'.format(', '.join(r['deferred'])))
+        print('{}: {:.3f}s ({:.3f}s own), slowest {}{}'.format(
+            module, r['total'], r['own'],
+            ', '.join('{} {:.3f}s'.format(*s) for s in r['slowest']),
+            ''.join(' ' + f for f in flags)))
+    if 'sipperviz' not in results:
+        print('sipperviz: skipped (no display)')
+    if any(r['error'] is not None or r['over_budget'] or r['deferred']
+           for r in results.values()):
+        raise SystemExit(1)
@@ -0,0 +1,277 @@
+"""Classes for monitoring folders of Sipper files which are still recording."""
+
+from collections import deque
+import os
+import time
+import traceback
+
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+
+from sipper import Sipper, SipperError, bin_resample
+from sipperplots import date_format_x
+
+class LiveSipperPlot():
+    """
+    Cumulative and binned drink count plots of a Sipper, which are kept up
+    to date as the Sipper is refreshed.  New rows are appended to the data
+    of the existing lines (and only the last bin is recomputed) rather
+    than redrawing the axes.
+
+    Parameters
+    ----------
+    sipper : Sipper
+        Sipper loaded from a raw CSV which is still recording
+    binsize : str, optional
+        pandas frequency string for the binned plot.  The default is '1H'.
+
+    """
+    sides = ['LeftCount', 'RightCount']
+    colors = {'LeftCount':'red', 'RightCount':'blue'}
+
+    def __init__(self, sipper, binsize='1H'):
+        self.sipper = sipper
+        self.binsize = binsize
+        self.figure = Figure()
+        self.ax_cumulative, self.ax_binned = self.figure.subplots(2, 1)
+        self.cumulative_lines = {}
+        self.binned_lines = {}
+        self.binned = {}
+        self.stale = True
+        # ^ whether the figure has changed since it was last drawn
+        self.draw()
+        self.sipper.add_listener(self.extend)
+
+    def draw(self):
+        """Create the plots from all the current data."""
+        df = self.sipper.data
+        labels = {'LeftCount':self.sipper.left_name,
+                  'RightCount':self.sipper.right_name}
+        for ax in [self.ax_cumulative, self.ax_binned]:
+            ax.clear()
+        for side in self.sides:
+            line, = self.ax_cumulative.plot(df.index, df[side], drawstyle='steps',
+                                            color=self.colors[side],
+                                            label=labels[side])
+            self.cumulative_lines[side] = line
+            self.binned[side] = self.bin_counts(df[side])
+            binned = self.binned[side]
+            line, = self.ax_binned.plot(binned.index, binned,
+                                        color=self.colors[side],
+                                        label=labels[side])
+            self.binned_lines[side] = line
+        self.ax_cumulative.set_title('Drink Count for ' + self.sipper.filename)
+        self.ax_cumulative.set_ylabel('Total Drinks')
+        self.ax_binned.set_ylabel('Drinks')
+        self.ax_binned.set_xlabel('Date')
+        self.ax_cumulative.legend(loc='upper left')
+        self.format_axes()
+
+    def bin_counts(self, counts, origin=None):
+        if origin is None:
+            origin = counts.index[0].floor('H')
+        return bin_resample(counts.diff(), self.binsize, origin)
+
+    def set_binsize(self, binsize):
+        """Change the binned plot bin size (recomputes all bins)."""
+        if binsize != self.binsize:
+            self.binsize = binsize
+            self.draw()
+
+    def extend(self, sipper, new):
+        """
+        Add new rows to the plots; this is a listener for Sipper.refresh().
+
+        Parameters
+        ----------
+        sipper : Sipper
+            the refreshed Sipper
+        new : pandas.DataFrame
+            rows added to sipper.data
+
+        Returns
+        -------
+        None.
+
+        """
+        if new.empty:
+            return
+        df = sipper.data
+        edge = self.binned[self.sides[0]].index[-1]
+        if new.index.min() < edge:
+            # rows before the last bin (e.g. a clock change), start again
+            self.draw()
+            self.stale = True
+            return
+        # the last bin and the rows after it are recomputed, with the row
+        # before the last bin for the first difference
+        after = df.index >= edge
+        start = max(np.argmax(after) - 1, 0)
+        for side in self.sides:
+            line = self.cumulative_lines[side]
+            x = np.concatenate([line.get_xdata(orig=True), new.index.values])
+            y = np.concatenate([line.get_ydata(orig=True), new[side].values])
+            line.set_data(x, y)
+            recent = df[side].iloc[start:].diff()
+            recent = recent[recent.index >= edge]
+            last_bins = bin_resample(recent, self.binsize, edge)
+            binned = self.binned[side]
+            binned = pd.concat([binned[binned.index < edge], last_bins])
+            self.binned[side] = binned
+            self.binned_lines[side].set_data(binned.index.values, binned.values)
+        self.format_axes()
+        self.stale = True
+
+    def format_axes(self):
+        start, end = self.sipper.start_date, self.sipper.end_date
+        for ax in [self.ax_cumulative, self.ax_binned]:
+            ax.relim()
+            ax.autoscale_view()
+            date_format_x(ax, start, end)
+
+    def close(self):
+        """Stop following the Sipper."""
+        self.sipper.remove_listener(self.extend)
+
+class SipperMonitor():
+    """
+    Follow the raw Sipper CSVs of a folder while they are recording.  The
+    folder is polled for new or changed files (by size and modification
+    time), and changed files are refreshed with Sipper.refresh(), which
+    only parses appended rows.  Each poll works through the changed files
+    until its time budget is used up; files not reached wait for the next
+    poll, so many devices can be followed without stalling the interface.
+
+    Parameters
+    ----------
+    folder : str
+        folder to watch
+    interval : float, optional
+        Seconds between polls.  The default is 5.
+    budget : float, optional
+        Percent of the interval each poll can spend refreshing files.
+        At least one changed file is refreshed per poll.  The default is 10.
+    binsize : str, optional
+        Bin size for the binned plots (see LiveSipperPlot).  The default
+        is '1H'.
+    alerts : sipperalerts.AlertEngine, optional
+        Engine to check the followed Sippers for device problems.  The
+        default is None.
+
+    """
+    def __init__(self, folder, interval=5, budget=10, binsize='1H',
+                 alerts=None):
+        self.folder = folder
+        self.interval = interval
+        self.budget = budget
+        self.binsize = binsize
+        self.alerts = alerts
+        self.sippers = {}
+        self.plots = {}
+        self.status = {}
+        self.signatures = {}
+        self.pending = deque()
+
+    def scan(self):
+        """Queue the CSVs of the folder which are new or have changed."""
+        present = set()
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not (entry.is_file() and entry.name.lower().endswith('.csv')):
+                continue
+            path = entry.path
+            present.add(path)
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.signatures.get(path) != signature:
+                self.signatures[path] = signature
+                if path not in self.pending:
+                    self.pending.append(path)
+        for path in list(self.signatures):
+            if path not in present:
+                del self.signatures[path]
+                if path in self.status:
+                    self.status[path] = 'Missing'
+
+    def poll(self):
+        """
+        Scan the folder and refresh changed files within the time budget.
+
+        Returns
+        -------
+        updated : list
+            paths of the files which were loaded or got new rows
+
+        """
+        self.scan()
+        budget = self.interval * self.budget / 100
+        start = time.perf_counter()
+        updated = []
+        while self.pending:
+            path = self.pending.popleft()
+            if self.process(path):
+                updated.append(path)
+            if time.perf_counter() - start > budget:
+                break
+        return updated
+
+    def process(self, path):
+        """Load or refresh one file, returning whether its data changed."""
+        s = self.sippers.get(path)
+        try:
+            if s is None:
+                return self.load(path)
+            try:
+                new = s.refresh()
+            except SipperError:
+                # file was replaced (e.g. shorter than before)
+                self.forget(path)
+                return self.load(path)
+            self.status[path] = 'Live'
+            return not new.empty
+        except Exception as error:
+            status = 'Error: {}'.format(str(error) or type(error).__name__)
+            if self.status.get(path) != status:
+                # logged once, not again on every poll
+                print(traceback.format_exc())
+            self.status[path] = status
+            return False
+
+    def load(self, path):
+        try:
+            s = Sipper(path)
+        except (SipperError, pd.errors.EmptyDataError):
+            self.status[path] = 'Not a raw Sipper file'
+            return False
+        if s.tail_offset is None:
+            self.status[path] = 'Not a raw Sipper file'
+            return False
+        self.sippers[path] = s
+        self.plots[path] = LiveSipperPlot(s, binsize=self.binsize)
+        if self.alerts is not None:
+            self.alerts.watch(s)
+        self.status[path] = 'Live'
+        return True
+
+    def forget(self, path):
+        plot = self.plots.pop(path, None)
+        if plot is not None:
+            plot.close()
+        s = self.sippers.pop(path, None)
+        if s is not None and self.alerts is not None:
+            self.alerts.unwatch(s)
+
+    def set_binsize(self, binsize):
+        self.binsize = binsize
+        for plot in self.plots.values():
+            plot.set_binsize(binsize)
+
+    def close(self):
+        """Stop following all files."""
+        for path in list(self.plots):
+            self.forget(path)
+        self.pending.clear()
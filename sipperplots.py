@@ -2,16 +2,42 @@
 
 from collections import defaultdict
 import datetime
+import importlib
 
 import matplotlib as mpl
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy import stats
-import seaborn as sns
 
-from sipper import SipperError
+from sipper import SipperError, bin_resample, is_light_phase
+
+#---lazy imports
+
+class LazyModule():
+    """
+    Stand-in for a module which is only imported on first attribute access.
+    scipy and seaborn are slow to import and only needed by some plots
+    (interdrink intervals and averaged plots), so they are deferred until
+    one of those plots is made.
+
+    Parameters
+    ----------
+    name : str
+        full name of the module to import, e.g. "scipy.stats"
+
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+stats = LazyModule('scipy.stats')
+sns = LazyModule('seaborn')
 
 #---dates and shading
 
@@ -73,16 +99,8 @@ def is_day_or_night(time, period, lights_on=7, lights_off=19):
     -------
     Bool
     """
-    lights_on = datetime.time(hour=lights_on)
-    lights_off = datetime.time(hour=lights_off)
-    val = False
-    #defaults to checking if at night
-    if lights_off > lights_on:
-        val = time.time() >= lights_off or time.time() < lights_on
-    elif lights_off < lights_on:
-        val = time.time() >= lights_off and time.time() < lights_on
-    #reverses if period='day'
-    return val if period=='night' else not val
+    day = bool(is_light_phase(time.hour, lights_on, lights_off))
+    return day if period=='day' else not day
 
 def get_daynight_count(start_time, end_time, lights_on=7, lights_off=9):
     """
@@ -155,30 +173,21 @@ def night_intervals(array, lights_on, lights_off, instead_days=False):
         List of tuples with structure (start of nighttime, end of nighttime).
     """
     night_intervals = []
-    on_time = datetime.time(hour=lights_on)
-    off_time = datetime.time(hour=lights_off)
-    if on_time == off_time:
+    if lights_on == lights_off or len(array) == 0:
         return night_intervals
-    else:
-        at_night = [is_day_or_night(i, 'night',
-                                    lights_on=lights_on,
-                                    lights_off=lights_off) for i in array]
+    at_night = ~is_light_phase(pd.DatetimeIndex(array).hour, lights_on,
+                               lights_off)
     if instead_days:
-        at_night = [not i for i in at_night]
-    if len(at_night) == 0:
-        return night_intervals
-    night_starts = []
-    night_ends = []
-    if at_night[0] == True:
-        night_starts.append(array[0])
-    for i, _ in enumerate(at_night[1:],start=1):
-        if at_night[i] == True and at_night[i-1] == False:
-            night_starts.append(array[i])
-        elif at_night[i] == False and at_night[i-1] == True:
-            night_ends.append(array[i])
-    if at_night[-1] == True:
-        night_ends.append(array[-1])
-    night_intervals = list(zip(night_starts, night_ends))
+        at_night = ~at_night
+    changes = np.diff(at_night.astype(int))
+    night_starts = list(np.flatnonzero(changes == 1) + 1)
+    night_ends = list(np.flatnonzero(changes == -1) + 1)
+    if at_night[0]:
+        night_starts.insert(0, 0)
+    if at_night[-1]:
+        night_ends.append(len(at_night) - 1)
+    night_intervals = [(array[i], array[j])
+                       for i, j in zip(night_starts, night_ends)]
     return night_intervals
 
 def shade_darkness(ax, min_date, max_date, lights_on, lights_off,
@@ -392,8 +401,35 @@ def setup_idi_axes(ax, logx):
         ax.set_xticks([0,300,600,900])
         ax.set_xlim(-100,1000)
 
+#---group helpers
+def get_group_members(sippers, groups):
+    """
+    Find which Sippers belong to each group, in one pass over the
+    Sippers (rather than checking every Sipper for every group).
+
+    Parameters
+    ----------
+    sippers : collection of sipper.Sipper objects
+        Sippers to look through
+    groups : collection of str
+        Group names to find members for
+
+    Returns
+    -------
+    members : dict
+        Group names mapped to lists of member Sippers, in the order
+        they appear in sippers
+
+    """
+    members = {group : [] for group in groups}
+    for sipper in sippers:
+        for group in set(sipper.groups):
+            if group in members:
+                members[group].append(sipper)
+    return members
+
 #---circadian helpers
-def get_chronogram_vals(series, lights_on, lights_off):
+def get_chronogram_vals(series, lights_on, lights_off, calendar=None):
     """
     Convert a time series to chronongram values (i.e. averaged
     by hour for the light cycle)
@@ -406,6 +442,10 @@ def get_chronogram_vals(series, lights_on, lights_off):
         Integer from 0-23 denoting start of light cycle
     lights_off : int
         Integer from 0-23 denoting end of light cycle
+    calendar : pandas.DataFrame, optional
+        Calendar features of each value of series (see
+        Sipper.get_calendar()), to avoid recomputing the hour and day
+        from the index. The default is None.
 
     Returns
     -------
@@ -413,12 +453,23 @@ def get_chronogram_vals(series, lights_on, lights_off):
         Series of chronogram values, with 0 being start of the light cycle
 
     """
-    byhour = series.groupby([series.index.hour]).sum()
-    byhourday = series.groupby([series.index.hour, series.index.date])
-    num_days_by_hour = byhourday.sum().index.get_level_values(0).value_counts()
-    byhour = byhour.divide(num_days_by_hour, axis=0)
+    if calendar is None:
+        times = series.index.asi8
+        hours = times // pd.Timedelta(hours=1).value % 24
+        days = times // pd.Timedelta(days=1).value
+    else:
+        hours = calendar['hour'].values
+        days = calendar['day'].values
+    values = series.values.astype(float)
+    totals = np.bincount(hours, weights=np.where(np.isnan(values), 0, values),
+                         minlength=24)
+    # number of days with data in each hour
+    num_days_by_hour = np.bincount(np.unique(days * 24 + hours) % 24,
+                                   minlength=24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        byhour = totals / num_days_by_hour
     new_index = list(range(lights_on, 24)) + list(range(0,lights_on))
-    reindexed = byhour.reindex(new_index)
+    reindexed = pd.Series(byhour[new_index], index=new_index)
     reindexed.index.name = 'hour'
     reindexed = reindexed.fillna(0)
     return reindexed
@@ -442,9 +493,8 @@ def preproc_averaging(data, averaging='datetime', avg_bins='1H',
     avg_bins : str, optional
         Bin size to use for downsampling. The default is '1H'.
     agg : str, optional
-        Function to aggregate data after downsampling; this is a
-        string name of a function used by pandas for resampling.
-        The default is 'sum'.
+        Function to aggregate data after downsampling; "sum", "max" or
+        "last" (see sipper.bin_resample()). The default is 'sum'.
 
     Raises
     ------
@@ -473,7 +523,7 @@ def preproc_averaging(data, averaging='datetime', avg_bins='1H',
         for d in data:
             if latest_start not in d.index:
                 d.loc[latest_start] = np.nan
-            r = d.resample(avg_bins).apply(agg)
+            r = bin_resample(d, avg_bins, how=agg)
             r = r[(r.index >= latest_start) &
                   (r.index <= earliest_end)].copy()
             output['ys'].append(r)
@@ -483,7 +533,7 @@ def preproc_averaging(data, averaging='datetime', avg_bins='1H',
         latest_end = pd.Timestamp(1970,1,1,0,0,0)
         shifted = []
         for d in data:
-            r = d.resample(avg_bins).apply(agg)
+            r = bin_resample(d, avg_bins, how=agg)
             first = r.index[0]
             aligned = pd.Timestamp(year=1970, month=1, day=1, hour=first.hour)
             shift = first - aligned
@@ -505,7 +555,7 @@ def preproc_averaging(data, averaging='datetime', avg_bins='1H',
             origin = d.index[0]
             elapsed = [i - origin for i in d.index]
             d.index = elapsed
-            r = d.resample(avg_bins).apply(agg)
+            r = bin_resample(d, avg_bins, how=agg)
             if r.index.max() > maxx:
                 longest_index = r.index
             elapsed_data.append(r)
@@ -670,7 +720,7 @@ def drinkcount_cumulative(sipper, show_left=True, show_right=True,
     if shade_dark:
         shade_darkness(ax, dformat_min, dformat_max, lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def drinkcount_binned(sipper, binsize='1H', show_left=True, show_right=True,
@@ -719,11 +769,11 @@ def drinkcount_binned(sipper, binsize='1H', show_left=True, show_right=True,
                 (df.index <= e)].copy()
     base = df.index[0].hour
     if show_left:
-        l = df['LeftCount'].diff().resample(binsize, base=base).sum()
+        l = sipper.get_binned('LeftCount', binsize, base=base, df=df)
         ax.plot(l.index, l, color='red',
                 label=sipper.left_name)
     if show_right:
-        r = df['RightCount'].diff().resample(binsize, base=base).sum()
+        r = sipper.get_binned('RightCount', binsize, base=base, df=df)
         ax.plot(r.index, r, color='blue',
                 label=sipper.right_name)
     content_max = df.index.min()
@@ -731,7 +781,8 @@ def drinkcount_binned(sipper, binsize='1H', show_left=True, show_right=True,
     if show_content:
         for c in show_content:
             count = sipper.get_content_values(c, out='Count', df=df)
-            binned = count.diff().resample(binsize, base=base).sum()
+            binned = sipper.get_binned((c, 'Count'), binsize, base=base, df=df,
+                                       values=count)
             if not count.empty:
                 ax.plot(binned.index, binned, label=c)
                 if count.index.max() > content_max:
@@ -751,7 +802,7 @@ def drinkcount_binned(sipper, binsize='1H', show_left=True, show_right=True,
     if shade_dark:
         shade_darkness(ax, dformat_min, dformat_max, lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def drinkduration_cumulative(sipper, show_left=True, show_right=True,
@@ -826,7 +877,7 @@ def drinkduration_cumulative(sipper, show_left=True, show_right=True,
     if shade_dark:
         shade_darkness(ax, dformat_min, dformat_max, lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def drinkduration_binned(sipper, binsize='1H', show_left=True, show_right=True,
@@ -875,11 +926,11 @@ def drinkduration_binned(sipper, binsize='1H', show_left=True, show_right=True,
                 (df.index <= e)].copy()
     base = df.index[0].hour
     if show_left:
-        l = df['LeftDuration'].diff().resample(binsize, base=base).sum()
+        l = sipper.get_binned('LeftDuration', binsize, base=base, df=df)
         ax.plot(l.index, l, color='red',
                 label=sipper.left_name)
     if show_right:
-        r = df['RightDuration'].diff().resample(binsize, base=base).sum()
+        r = sipper.get_binned('RightDuration', binsize, base=base, df=df)
         ax.plot(r.index, r, color='blue',
                 label=sipper.right_name)
     content_max = df.index.min()
@@ -887,7 +938,8 @@ def drinkduration_binned(sipper, binsize='1H', show_left=True, show_right=True,
     if show_content:
         for c in show_content:
             count = sipper.get_content_values(c, out='Duration', df=df)
-            binned = count.diff().resample(binsize, base=base).sum()
+            binned = sipper.get_binned((c, 'Duration'), binsize, base=base, df=df,
+                                       values=count)
             if not count.empty:
                 ax.plot(binned.index, binned, label=c)
                 if count.index.max() > content_max:
@@ -907,7 +959,7 @@ def drinkduration_binned(sipper, binsize='1H', show_left=True, show_right=True,
     if shade_dark:
         shade_darkness(ax, dformat_min, dformat_max, lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 #---interdrink intervals
@@ -968,7 +1020,7 @@ def interdrink_intervals(sippers, kde=True, logx=True,
         ax.legend(fontsize=8)
     ylabel = 'Density Estimation' if kde else 'Count'
     ax.set_ylabel(ylabel)
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def interdrink_intervals_byside(sippers, kde=True, logx=True, **kwargs):
@@ -1022,7 +1074,7 @@ def interdrink_intervals_byside(sippers, kde=True, logx=True, **kwargs):
     ax.legend(fontsize=8)
     ylabel = 'Density Estimation' if kde else 'Count'
     ax.set_ylabel(ylabel)
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def interdrink_intervals_bycontent(sippers, idi_content, kde=True, logx=True, **kwargs):
@@ -1076,7 +1128,7 @@ def interdrink_intervals_bycontent(sippers, idi_content, kde=True, logx=True, **
     ax.legend(fontsize=8)
     ylabel = 'Density Estimation' if kde else 'Count'
     ax.set_ylabel(ylabel)
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 #---chronograms
@@ -1125,24 +1177,31 @@ def drinkcount_chronogram(sipper, circ_left=True, circ_right=True,
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     to_plot = []
+    calendars = []
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
     labels = []
+    calendar = sipper.get_calendar(lights_on, lights_off, df=df)
     if circ_left:
         to_plot.append(df['LeftCount'].diff())
+        calendars.append(calendar)
         colors.insert(0, 'red')
         labels.append('Left')
     if circ_right:
         to_plot.append(df['RightCount'].diff())
+        calendars.append(calendar)
         colors.insert(0, 'blue')
         labels.append('Right')
     if circ_content:
         for c in circ_content:
             vals = sipper.get_content_values(c, 'Count', df=df).diff()
             if not vals.empty:
+                rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
                 to_plot.append(vals)
+                calendars.append(calendar[rows.values])
                 labels.append(c)
     for i, series in enumerate(to_plot):
-        reindexed = get_chronogram_vals(series, lights_on, lights_off)
+        reindexed = get_chronogram_vals(series, lights_on, lights_off,
+                                        calendar=calendars[i])
         label = labels[i]
         ax.plot(range(0,24), reindexed, color=colors[i], label=label)
     ax.set_xlabel('Hours Into Light Cycle')
@@ -1154,7 +1213,7 @@ def drinkcount_chronogram(sipper, circ_left=True, circ_right=True,
         off = new_index.index(lights_off)
         ax.axvspan(off,24,color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1207,35 +1266,40 @@ def drinkcount_chronogram_grouped(sippers, groups, circ_left=True, circ_right=Tr
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if circ_left:
-                    key = group + ' - Left'
-                    vals = get_chronogram_vals(df['LeftCount'].diff(),
-                                               lights_on,
-                                               lights_off)
-                    to_plot[key].append(vals)
-                if circ_right:
-                    key = group + ' - Right'
-                    vals = get_chronogram_vals(df['RightCount'].diff(),
-                                               lights_on,
-                                               lights_off)
-                    to_plot[key].append(vals)
-                if circ_content:
-                    for c in circ_content:
-                        key = group + ' - ' + c
-                        content_vals = sipper.get_content_values(c, 'Count', df).diff()
-                        if not content_vals.empty:
-                            vals = get_chronogram_vals(content_vals,
-                                                       lights_on,
-                                                       lights_off)
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            calendar = sipper.get_calendar(lights_on, lights_off, df=df)
+            if circ_left:
+                key = group + ' - Left'
+                vals = get_chronogram_vals(df['LeftCount'].diff(),
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                to_plot[key].append(vals)
+            if circ_right:
+                key = group + ' - Right'
+                vals = get_chronogram_vals(df['RightCount'].diff(),
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                to_plot[key].append(vals)
+            if circ_content:
+                for c in circ_content:
+                    key = group + ' - ' + c
+                    content_vals = sipper.get_content_values(c, 'Count', df).diff()
+                    if not content_vals.empty:
+                        rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
+                        vals = get_chronogram_vals(content_vals,
+                                                   lights_on,
+                                                   lights_off,
+                                                   calendar=calendar[rows.values])
+                        to_plot[key].append(vals)
     for i, (label, data) in enumerate(to_plot.items()):
         x = range(0,24)
         y = np.nanmean(data, axis=0)
@@ -1259,7 +1323,7 @@ def drinkcount_chronogram_grouped(sippers, groups, circ_left=True, circ_right=Tr
         off = new_index.index(lights_off)
         ax.axvspan(off,24,color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1307,24 +1371,31 @@ def drinkduration_chronogram(sipper, circ_left=True, circ_right=True,
         df = df[(df.index >= s) &
                 (df.index <= e)].copy()
     to_plot = []
+    calendars = []
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
     labels = []
+    calendar = sipper.get_calendar(lights_on, lights_off, df=df)
     if circ_left:
         to_plot.append(df['LeftDuration'].diff())
+        calendars.append(calendar)
         colors.insert(0, 'red')
         labels.append('Left')
     if circ_right:
         to_plot.append(df['RightDuration'].diff())
+        calendars.append(calendar)
         colors.insert(0, 'blue')
         labels.append('Right')
     if circ_content:
         for c in circ_content:
             vals = sipper.get_content_values(c, 'Duration', df=df).diff()
             if not vals.empty:
+                rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
                 to_plot.append(vals)
+                calendars.append(calendar[rows.values])
                 labels.append(c)
     for i, series in enumerate(to_plot):
-        reindexed = get_chronogram_vals(series, lights_on, lights_off)
+        reindexed = get_chronogram_vals(series, lights_on, lights_off,
+                                        calendar=calendars[i])
         label = labels[i]
         ax.plot(range(0,24), reindexed, color=colors[i], label=label)
     ax.set_xlabel('Hours Into Light Cycle')
@@ -1336,7 +1407,7 @@ def drinkduration_chronogram(sipper, circ_left=True, circ_right=True,
         off = new_index.index(lights_off)
         ax.axvspan(off,24,color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1389,35 +1460,40 @@ def drinkduration_chronogram_grouped(sippers, groups, circ_left=True, circ_right
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if circ_left:
-                    key = group + ' - Left'
-                    vals = get_chronogram_vals(df['LeftDuration'].diff(),
-                                               lights_on,
-                                               lights_off)
-                    to_plot[key].append(vals)
-                if circ_right:
-                    key = group + ' - Right'
-                    vals = get_chronogram_vals(df['RightDuration'].diff(),
-                                               lights_on,
-                                               lights_off)
-                    to_plot[key].append(vals)
-                if circ_content:
-                    for c in circ_content:
-                        key = group + ' - ' + c
-                        content_vals = sipper.get_content_values(c, 'Duration', df)
-                        if not content_vals.empty:
-                            vals = get_chronogram_vals(content_vals,
-                                                       lights_on,
-                                                       lights_off).diff()
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            calendar = sipper.get_calendar(lights_on, lights_off, df=df)
+            if circ_left:
+                key = group + ' - Left'
+                vals = get_chronogram_vals(df['LeftDuration'].diff(),
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                to_plot[key].append(vals)
+            if circ_right:
+                key = group + ' - Right'
+                vals = get_chronogram_vals(df['RightDuration'].diff(),
+                                           lights_on,
+                                           lights_off,
+                                           calendar=calendar)
+                to_plot[key].append(vals)
+            if circ_content:
+                for c in circ_content:
+                    key = group + ' - ' + c
+                    content_vals = sipper.get_content_values(c, 'Duration', df)
+                    if not content_vals.empty:
+                        rows = df[['LeftContents', 'RightContents']].eq(c).any(axis=1)
+                        vals = get_chronogram_vals(content_vals,
+                                                   lights_on,
+                                                   lights_off,
+                                                   calendar=calendar[rows.values]).diff()
+                        to_plot[key].append(vals)
     for i, (label, data) in enumerate(to_plot.items()):
         x = range(0,24)
         y = np.nanmean(data, axis=0)
@@ -1441,7 +1517,7 @@ def drinkduration_chronogram_grouped(sippers, groups, circ_left=True, circ_right
         off = new_index.index(lights_off)
         ax.axvspan(off,24,color='gray',alpha=.2,zorder=0,label='lights off')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
 
     return fig if 'ax' not in kwargs else None
 
@@ -1491,8 +1567,8 @@ def side_preference(sipper, pref_side='Left', pref_metric='Count', pref_bins='1H
     base = df.index[0].hour
     lcol = 'Left' + pref_metric
     rcol = 'Right' + pref_metric
-    l_data = df[lcol].diff().resample(pref_bins, base=base).sum()
-    r_data = df[rcol].diff().resample(pref_bins, base=base).sum()
+    l_data = sipper.get_binned(lcol, pref_bins, base=base, df=df)
+    r_data = sipper.get_binned(rcol, pref_bins, base=base, df=df)
     total = l_data + r_data
     if pref_side == 'Left':
         preference = l_data/total
@@ -1511,7 +1587,7 @@ def side_preference(sipper, pref_side='Left', pref_metric='Count', pref_bins='1H
     if shade_dark:
         shade_darkness(ax, df.index[0], df.index[-1], lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def content_preference(sipper, pref_content, pref_metric='Count', pref_bins='1H',
@@ -1560,16 +1636,11 @@ def content_preference(sipper, pref_content, pref_metric='Count', pref_bins='1H'
     base = df.index[0].hour
     content_max = df.index.min()
     content_min = df.index.max()
+    preferences = sipper.get_content_preference(pref_content, pref_metric,
+                                                pref_bins, base=base, df=df)
     for i, c in enumerate(pref_content):
-        target = sipper.get_content_values(c, out=pref_metric, df=df)
-        if target.empty:
-            continue
-        target = target.diff().resample(pref_bins, base=base).sum()
-        other  = sipper.get_content_values(c, out=pref_metric, df=df,
-                                           opposite=True)
-        other = other.diff().resample(pref_bins, base=base).sum()
-        if not target.empty and not other.empty:
-            preference = target / (target + other) * 100
+        if c in preferences:
+            preference = preferences[c]
             if preference.dropna().index.max() > content_max:
                     content_max = preference.dropna().index.max()
             if preference.dropna().index.min() < content_min:
@@ -1591,7 +1662,7 @@ def content_preference(sipper, pref_content, pref_metric='Count', pref_bins='1H'
     if shade_dark:
         shade_darkness(ax, dformat_min, dformat_max, lights_on, lights_off)
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 #---averaging
@@ -1648,27 +1719,27 @@ def averaged_drinkcount(sippers, groups, averaging='datetime', avg_bins='1H',
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    to_plot[key].append(df['LeftCount'].diff())
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    to_plot[key].append(df['RightCount'].diff())
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Count',
-                                                         df=df).diff()
-                        if not vals.empty:
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                to_plot[key].append(df['LeftCount'].diff())
+            if show_right:
+                key = '{} - Right'.format(group)
+                to_plot[key].append(df['RightCount'].diff())
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Count',
+                                                     df=df).diff()
+                    if not vals.empty:
+                        to_plot[key].append(vals)
     xdata = []
     for i, (label, data) in enumerate(to_plot.items()):
         error_shade = np.nan
@@ -1692,7 +1763,7 @@ def averaged_drinkcount(sippers, groups, averaging='datetime', avg_bins='1H',
     ax.set_title('Average Drink Count')
     ax.set_ylabel('Drinks')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def cumulative_averaged_drinkcount(sippers, groups, avg_bins='1H',
@@ -1743,27 +1814,27 @@ def cumulative_averaged_drinkcount(sippers, groups, avg_bins='1H',
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    to_plot[key].append(df['LeftCount'])
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    to_plot[key].append(df['RightCount'])
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Count',
-                                                         df=df)
-                        if not vals.empty:
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                to_plot[key].append(df['LeftCount'])
+            if show_right:
+                key = '{} - Right'.format(group)
+                to_plot[key].append(df['RightCount'])
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Count',
+                                                     df=df)
+                    if not vals.empty:
+                        to_plot[key].append(vals)
     xdata = []
     for i, (label, data) in enumerate(to_plot.items()):
         error_shade = np.nan
@@ -1787,7 +1858,7 @@ def cumulative_averaged_drinkcount(sippers, groups, avg_bins='1H',
     ax.set_title('Cumulative Average Drink Count')
     ax.set_ylabel('Total Drinks')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def averaged_drinkduration(sippers, groups, averaging='datetime', avg_bins='1H',
@@ -1843,27 +1914,27 @@ def averaged_drinkduration(sippers, groups, averaging='datetime', avg_bins='1H',
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    to_plot[key].append(df['LeftDuration'].diff())
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    to_plot[key].append(df['RightDuration'].diff())
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Duration',
-                                                         df=df).diff()
-                        if not vals.empty:
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                to_plot[key].append(df['LeftDuration'].diff())
+            if show_right:
+                key = '{} - Right'.format(group)
+                to_plot[key].append(df['RightDuration'].diff())
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Duration',
+                                                     df=df).diff()
+                    if not vals.empty:
+                        to_plot[key].append(vals)
     xdata = []
     for i, (label, data) in enumerate(to_plot.items()):
         error_shade = np.nan
@@ -1887,7 +1958,7 @@ def averaged_drinkduration(sippers, groups, averaging='datetime', avg_bins='1H',
     ax.set_title('Average Drink Duration')
     ax.set_ylabel('Drink Duration (s)')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def cumulative_averaged_drinkduration(sippers, groups, avg_bins='1H',
@@ -1938,27 +2009,27 @@ def cumulative_averaged_drinkduration(sippers, groups, avg_bins='1H',
         ax = kwargs['ax']
     to_plot = defaultdict(list)
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                if show_left:
-                    key = '{} - Left'.format(group)
-                    to_plot[key].append(df['LeftDuration'])
-                if show_right:
-                    key = '{} - Right'.format(group)
-                    to_plot[key].append(df['RightDuration'])
-                if show_content:
-                    for c in show_content:
-                        key = '{} - {}'.format(group, c)
-                        vals = sipper.get_content_values(c, out='Duration',
-                                                         df=df)
-                        if not vals.empty:
-                            to_plot[key].append(vals)
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            if show_left:
+                key = '{} - Left'.format(group)
+                to_plot[key].append(df['LeftDuration'])
+            if show_right:
+                key = '{} - Right'.format(group)
+                to_plot[key].append(df['RightDuration'])
+            if show_content:
+                for c in show_content:
+                    key = '{} - {}'.format(group, c)
+                    vals = sipper.get_content_values(c, out='Duration',
+                                                     df=df)
+                    if not vals.empty:
+                        to_plot[key].append(vals)
     xdata = []
     for i, (label, data) in enumerate(to_plot.items()):
         error_shade = np.nan
@@ -1982,7 +2053,7 @@ def cumulative_averaged_drinkduration(sippers, groups, avg_bins='1H',
     ax.set_title('Cumulative Average Drink Count')
     ax.set_ylabel('Total Drink Duration (s)')
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def averaged_side_preference(sippers, groups, averaging='datetime', avg_bins='1H',
@@ -2035,16 +2106,16 @@ def averaged_side_preference(sippers, groups, averaging='datetime', avg_bins='1H
         ax = kwargs['ax']
     to_plot = defaultdict(lambda: defaultdict((list)))
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                to_plot[group]['Left'].append(df['Left' + pref_metric].diff())
-                to_plot[group]['Right'].append(df['Right' + pref_metric].diff())
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            to_plot[group]['Left'].append(df['Left' + pref_metric].diff())
+            to_plot[group]['Right'].append(df['Right' + pref_metric].diff())
     xdata = []
     for i, (label, dic) in enumerate(to_plot.items()):
         l = dic['Left']
@@ -2082,7 +2153,7 @@ def averaged_side_preference(sippers, groups, averaging='datetime', avg_bins='1H
     ax.set_title('Averaged Side Preference')
     ax.set_ylabel('{} Preference (% Drink {})'.format(pref_side, pref_metric))
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
 
 def averaged_content_preference(sippers, groups, pref_content=[],
@@ -2136,22 +2207,23 @@ def averaged_content_preference(sippers, groups, pref_content=[],
         ax = kwargs['ax']
     to_plot = defaultdict(lambda: defaultdict((list)))
     colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    members = get_group_members(sippers, groups)
     for group in groups:
-        for sipper in sippers:
-            if group in sipper.groups:
-                df = sipper.data
-                if 'date_filter' in kwargs:
-                    s, e = kwargs['date_filter']
-                    df = df[(df.index >= s) &
-                            (df.index <= e)].copy()
-                for i, c in enumerate(pref_content):
-                    target = sipper.get_content_values(c, out=pref_metric, df=df)
-                    other  = sipper.get_content_values(c, out=pref_metric, df=df,
-                                                       opposite=True)
-                    if not target.empty and not other.empty:
-                        key = group + ' - ' + c
-                        to_plot[key]['target'].append(target.diff())
-                        to_plot[key]['other'].append(other.diff())
+        for sipper in members[group]:
+            df = sipper.data
+            if 'date_filter' in kwargs:
+                s, e = kwargs['date_filter']
+                df = df[(df.index >= s) &
+                        (df.index <= e)].copy()
+            targets, others = sipper.get_content_matrix(pref_content,
+                                                        pref_metric, df=df)
+            for i, c in enumerate(pref_content):
+                target = targets[c].dropna()
+                other = others[c].dropna()
+                if not target.empty and not other.empty:
+                    key = group + ' - ' + c
+                    to_plot[key]['target'].append(target.diff())
+                    to_plot[key]['other'].append(other.diff())
     xdata = []
     for i, (label, dic) in enumerate(to_plot.items()):
         target = dic['target']
@@ -2185,5 +2257,5 @@ def averaged_content_preference(sippers, groups, pref_content=[],
     ax.set_title('Averaged Content Preference')
     ax.set_ylabel('Content Preference (% Drink {})'.format(pref_metric))
     ax.legend()
-    plt.tight_layout()
+    ax.figure.tight_layout()
     return fig if 'ax' not in kwargs else None
\ No newline at end of file
@@ -1,14 +1,18 @@
 """Code to run SipViz."""
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime as dt
-from collections import OrderedDict
+from collections import defaultdict, OrderedDict
 import inspect
+import itertools
 import os
 import pickle
 from PIL import Image, ImageTk
 import platform
+import queue
 import subprocess
 import sys
+import threading
 import traceback
 import tkinter as tk
 from tkinter import ttk
@@ -16,6 +20,7 @@ import warnings
 import webbrowser
 
 import matplotlib as mpl
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
@@ -25,17 +30,23 @@ from tkcalendar import DateEntry
 from _version import __version__, __date__
 import plotdata
 import sipper
+import sipperalerts
+import sippercatalog
 import sipperinspect
+import sippermonitor
 import sipperplots
 
 class SipperPlot:
-    def __init__(self, name, func, args, data):
+    def __init__(self, name, func, args, data, figure=None):
         self.name = name
         self.func = func
         self.args = args
         self.data = data
+        self.figure = figure
         self.content_dicts = {}
         self.populate_content_dicts()
+        self.code = None
+        self.code_key = None
 
     def populate_content_dicts(self):
         if 'sipper' in self.args:
@@ -47,6 +58,99 @@ class SipperPlot:
                 v = s.get_contents_dict() if s.sipperviz_assigned else {}
                 self.content_dicts[s] = v
 
+    def get_code(self):
+        """Return the code for this plot, only regenerating it when the
+        arguments (or the state of the Sippers used) have changed."""
+        args = {k:v for k, v in self.args.items() if k != 'ax'}
+        key = (repr(args), tuple((s.unduplicated,
+                                  s.__dict__.get('unduplicate_method'))
+                                 for s in self.content_dicts))
+        if getattr(self, 'code', None) is None or key != self.code_key:
+            self.code = sipperinspect.generate_code(self)
+            self.code_key = key
+        return self.code
+
+class PlotJob:
+    """A plot waiting for its data to be computed and its figure drawn.
+    Progressive jobs also pass preview updates from the worker to the Tk
+    thread (updates).  Jobs for an existing plot (plot) only draw its
+    figure."""
+    def __init__(self, func, args, progressive=False, plot=None,
+                 figsize=(7, 4)):
+        self.func = func
+        self.args = args
+        self.progressive = progressive
+        self.plot = plot
+        self.figsize = figsize
+        self.figure = None
+        self.sippers = []
+        self.future = None
+        self.updates = queue.Queue()
+        self.cancelled = threading.Event()
+        self.show_preview = True
+        self.previewing = False
+        self.colors = {}
+        self.artists = {}
+
+class FileJob:
+    """Work on loaded Sippers other than plotting (e.g. writing
+    concatenated files), run on the plot executor.  Like plot jobs, it
+    holds off changes to the Sippers until it is done; its result is then
+    passed to on_done on the Tk thread."""
+    def __init__(self, sippers, on_done):
+        self.sippers = sippers
+        self.on_done = on_done
+        self.future = None
+
+class GroupRegistry:
+    """Index of the group labels of loaded Sippers, kept both ways:
+    group -> member Sippers and Sipper -> groups.  Sipper.groups is still
+    the record of each file's groups (it is saved and used for plotting),
+    so groups should be changed through the registry to keep all three in
+    step."""
+    def __init__(self):
+        self.members = {}
+        self.groups = {}
+
+    def track(self, s):
+        self.groups[s] = set(s.groups)
+        for g in s.groups:
+            self.members.setdefault(g, set()).add(s)
+
+    def untrack(self, s):
+        for g in self.groups.pop(s, ()):
+            self.discard_member(g, s)
+
+    def discard_member(self, group, s):
+        self.members[group].discard(s)
+        if not self.members[group]:
+            del self.members[group]
+
+    def add(self, s, group):
+        if group not in self.groups[s]:
+            s.groups.append(group)
+            self.groups[s].add(group)
+            self.members.setdefault(group, set()).add(s)
+
+    def remove(self, s, group):
+        if group in self.groups[s]:
+            s.groups = [g for g in s.groups if g != group]
+            self.groups[s].discard(group)
+            self.discard_member(group, s)
+
+    def set_groups(self, s, groups):
+        self.untrack(s)
+        s.groups = list(dict.fromkeys(groups))
+        self.track(s)
+
+    def delete_group(self, group):
+        for s in list(self.members.get(group, ())):
+            self.remove(s, group)
+
+    def get_members(self, groups):
+        """Return the set of Sippers in any of the groups."""
+        return set().union(*[self.members.get(g, ()) for g in groups])
+
 class SipperViz(tk.Tk):
     """Class for SipViz"""
     # pylint: disable=too-many-instance-attributes
@@ -56,7 +160,39 @@ class SipperViz(tk.Tk):
     #---constants/conversions
         #flags
         self.loading = False
-        self.plotting = True
+        self.plotting = False
+
+        #plot data and figures are computed off the Tk thread, one plot at
+        #a time; Sippers are only changed when no job is running
+        self.plot_executor = ThreadPoolExecutor(max_workers=1)
+        self.plot_jobs = []
+        self.busy_jobs = []
+        self.deferred_actions = []
+
+        #parts of the interface waiting to be refreshed (see request_refresh)
+        self.refresh_parts = ('contents', 'groups', 'buttons', 'details',
+                              'reasons')
+        self.stale_parts = set()
+        self.refresh_job = None
+
+        #file_view rows are keyed by Sipper rather than list position
+        self.file_iids = {}
+        self.file_rows = {}
+        self.file_iid_count = itertools.count()
+        self.group_registry = GroupRegistry()
+
+        #only the most recently used Sippers keep their data in memory
+        self.residency = sipper.SipperResidency()
+
+        #live monitoring of a folder of recording Sippers
+        self.monitor = None
+        self.monitor_job = None
+        self.monitor_canvases = {}
+        self.monitor_shown = None
+        self.monitor_packed = None
+
+        #catalog of files which can be searched before loading
+        self.catalog = None
 
         #pretty names for Sipper attributes represented in info pane
         self.attr_conversion = {'Groups':'groups', 'Contents': 'contents',
@@ -82,7 +218,8 @@ class SipperViz(tk.Tk):
         self.times_to_int = {time : num for num,time in enumerate(self.times)}
 
         #binsizes
-        self.binsizes = ['5 minutes', '10 minutes', '15 minutes', '30 minutes', '1 hour']
+        self.binsizes = ['1 minute', '2 minutes', '5 minutes', '10 minutes',
+                         '15 minutes', '30 minutes', '1 hour']
         self.binsizes += [str(i) + ' hours' for i in range(2,25)]
         self.bin_convert = {}
         for val in self.binsizes:
@@ -90,7 +227,7 @@ class SipperViz(tk.Tk):
             for char in val:
                 if char.isdigit():
                     out += char
-            if 'minutes' in val:
+            if 'minute' in val:
                 out += 'T'
             elif 'hour' in val:
                 out += 'H'
@@ -408,19 +545,19 @@ class SipperViz(tk.Tk):
         self.drink_showleft_box = ttk.Checkbutton(self.drink_settings,
                                                   variable=self.drink_showleft_val,
                                                   text='Show left sipper',
-                                                  command=self.update_all_buttons)
+                                                  command=self.update_plottable)
         self.drink_showright_val = tk.BooleanVar()
         self.drink_showright_val.set(True)
         self.drink_showright_box = ttk.Checkbutton(self.drink_settings,
                                                    variable=self.drink_showright_val,
                                                    text='Show right sipper',
-                                                   command=self.update_all_buttons)
+                                                   command=self.update_plottable)
         self.drink_showcontent_val = tk.BooleanVar()
         self.drink_showcontent_val.set(True)
         self.drink_showcontent_box = ttk.Checkbutton(self.drink_settings,
                                                      variable=self.drink_showcontent_val,
                                                      text='Show contents (see Content tab)',
-                                                     command=self.update_all_buttons)
+                                                     command=self.update_plottable)
         self.drink_binsize_label = tk.Label(self.drink_settings,
                                             text='Bin size for binned plots')
         self.drink_binsize_menu = ttk.Combobox(self.drink_settings,
@@ -523,19 +660,19 @@ class SipperViz(tk.Tk):
         self.circ_showleft_box = ttk.Checkbutton(self.circ_settings,
                                                  variable=self.circ_showleft_val,
                                                  text='Show left sipper',
-                                                 command=self.update_all_buttons)
+                                                 command=self.update_plottable)
         self.circ_showright_val = tk.BooleanVar()
         self.circ_showright_val.set(True)
         self.circ_showright_box = ttk.Checkbutton(self.circ_settings,
                                                   variable=self.circ_showright_val,
                                                   text='Show right sipper',
-                                                  command=self.update_all_buttons)
+                                                  command=self.update_plottable)
         self.circ_showcontent_val = tk.BooleanVar()
         self.circ_showcontent_val.set(True)
         self.circ_showcontent_box = ttk.Checkbutton(self.circ_settings,
                                                     variable=self.circ_showcontent_val,
                                                     text='Show contents (see Content tab)',
-                                                    command=self.update_all_buttons)
+                                                    command=self.update_plottable)
         self.circ_showindvl_val = tk.BooleanVar()
         self.circ_showindvl_val.set(False)
         self.circ_showindvl_box = ttk.Checkbutton(self.circ_settings,
@@ -601,6 +738,53 @@ class SipperViz(tk.Tk):
                                                  text="Show duplicate index warning when loading",
                                                  var=self.warn_dupindex_val)
 
+        self.lazy_load_val = tk.BooleanVar()
+        self.lazy_load_val.set(False)
+        self.lazy_load_box = ttk.Checkbutton(self.general_settings,
+                                             text="Only read file data when first used (duplicate index warnings are then skipped)",
+                                             var=self.lazy_load_val)
+
+        self.idle_ends_val = tk.BooleanVar()
+        self.idle_ends_val.set(False)
+        self.idle_ends_box = ttk.Checkbutton(self.general_settings,
+                                             text="Keep the last row of idle periods when loading (for battery and timing)",
+                                             var=self.idle_ends_val)
+
+        self.window_load_val = tk.BooleanVar()
+        self.window_load_val.set(False)
+        self.window_load_box = ttk.Checkbutton(self.general_settings,
+                                               text="Only read data within the global date filter when loading (if it is on)",
+                                               var=self.window_load_val)
+
+        self.day_files_val = tk.BooleanVar()
+        self.day_files_val.set(False)
+        self.day_files_box = ttk.Checkbutton(self.general_settings,
+                                             text="Save day files next to CSVs for faster date filtered loading",
+                                             var=self.day_files_val)
+
+        self.resident_label = tk.Label(self.general_settings,
+                                       text='Files to keep in memory')
+        self.resident_menu = ttk.Combobox(self.general_settings, width=10,
+                                          values=['No limit', '10', '25',
+                                                  '50', '100', '250'])
+        self.resident_menu.set('No limit')
+        self.resident_menu.bind('<<ComboboxSelected>>',
+                                self.set_residency_limits)
+        self.memory_label = tk.Label(self.general_settings,
+                                     text='Memory for file data (MB)')
+        self.memory_menu = ttk.Combobox(self.general_settings, width=10,
+                                        values=['No limit', '250', '500',
+                                                '1000', '2000', '4000'])
+        self.memory_menu.set('No limit')
+        self.memory_menu.bind('<<ComboboxSelected>>',
+                              self.set_residency_limits)
+
+        self.progressive_val = tk.BooleanVar()
+        self.progressive_val.set(True)
+        self.progressive_box = ttk.Checkbutton(self.general_settings,
+                                               text="Preview averaged plots while they are computed",
+                                               var=self.progressive_val)
+
         self.save_settings_button  = tk.Button(self.general_settings,
                                                text='Save Settings',
                                                command=self.save_settings_dialog)
@@ -621,8 +805,22 @@ class SipperViz(tk.Tk):
                                 columnspan=2)
         self.warn_dupindex_box.grid(row=5, column=0, sticky='nsew', padx=20, pady=5,
                                     columnspan=2)
-        self.save_settings_button.grid(row=6, column=0, sticky='nsew', padx=20, pady=5)
-        self.load_settings_button.grid(row=6, column=1, sticky='nsew', padx=20, pady=5)
+        self.lazy_load_box.grid(row=6, column=0, sticky='nsew', padx=20, pady=5,
+                                columnspan=2)
+        self.idle_ends_box.grid(row=7, column=0, sticky='nsew', padx=20, pady=5,
+                                columnspan=2)
+        self.window_load_box.grid(row=8, column=0, sticky='nsew', padx=20, pady=5,
+                                  columnspan=2)
+        self.day_files_box.grid(row=9, column=0, sticky='nsew', padx=20, pady=5,
+                                columnspan=2)
+        self.progressive_box.grid(row=10, column=0, sticky='nsew', padx=20, pady=5,
+                                  columnspan=2)
+        self.resident_label.grid(row=11, column=0, sticky='nsw', padx=20, pady=5)
+        self.resident_menu.grid(row=11, column=1, sticky='nsew', padx=20, pady=5)
+        self.memory_label.grid(row=12, column=0, sticky='nsw', padx=20, pady=5)
+        self.memory_menu.grid(row=12, column=1, sticky='nsew', padx=20, pady=5)
+        self.save_settings_button.grid(row=13, column=0, sticky='nsew', padx=20, pady=5)
+        self.load_settings_button.grid(row=13, column=1, sticky='nsew', padx=20, pady=5)
 
     #---create assign contents window
         self.contents_window = tk.Toplevel(self)
@@ -985,6 +1183,169 @@ class SipperViz(tk.Tk):
         self.reasons_view.heading(1, text='Plottable?')
         self.reasons_view.grid(row=0, column=0, sticky='nsew')
 
+    #---create catalog window
+        self.catalog_window = tk.Toplevel(self)
+        self.catalog_window.title('File Catalog')
+        self.catalog_window.withdraw()
+        if not platform.system() == 'Darwin':
+            self.catalog_window.iconbitmap(self.exepath('img/sipperviz.ico'))
+        self.catalog_window.protocol("WM_DELETE_WINDOW",
+                                     self.catalog_window.withdraw)
+
+    #---populate catalog window
+        self.catalog_scan_button = tk.Button(self.catalog_window,
+                                             text='Scan Folder',
+                                             command=self.scan_catalog_folder)
+        self.catalog_status_str = tk.StringVar()
+        self.catalog_status_str.set('Scan folders to add their files')
+        self.catalog_status_label = tk.Label(self.catalog_window,
+                                             textvariable=self.catalog_status_str)
+        self.catalog_device_label = tk.Label(self.catalog_window, text='Device')
+        self.catalog_device_menu = ttk.Combobox(self.catalog_window, width=10,
+                                                values=['Any'])
+        self.catalog_device_menu.set('Any')
+        self.catalog_group_label = tk.Label(self.catalog_window, text='Group')
+        self.catalog_group_menu = ttk.Combobox(self.catalog_window, width=10,
+                                               values=['Any'])
+        self.catalog_group_menu.set('Any')
+        self.catalog_dates_val = tk.BooleanVar()
+        self.catalog_dates_val.set(False)
+        self.catalog_dates_box = ttk.Checkbutton(self.catalog_window,
+                                                 text='Only files with data in the date filter (Plot settings)',
+                                                 var=self.catalog_dates_val)
+        self.catalog_search_button = tk.Button(self.catalog_window, text='Search',
+                                               command=self.search_catalog)
+        self.catalog_load_button = tk.Button(self.catalog_window,
+                                             text='Load (selected or all found)',
+                                             command=self.load_from_catalog)
+        self.catalog_groups_button = tk.Button(self.catalog_window,
+                                               text='Save groups of loaded files',
+                                               command=self.save_catalog_groups)
+        labels = ['File', 'Device', 'Start', 'End', 'Rows']
+        self.catalog_view = ttk.Treeview(self.catalog_window, columns=labels,
+                                         selectmode='extended', height=20)
+        self.catalog_view['show'] = 'headings'
+        for label in labels:
+            self.catalog_view.heading(label, text=label)
+            self.catalog_view.column(label, width=140)
+        self.catalog_view.column('File', width=220)
+        self.catalog_view.column('Device', width=60)
+        self.catalog_view.column('Rows', width=70)
+
+        self.catalog_window.grid_rowconfigure(6, weight=1)
+        self.catalog_window.grid_columnconfigure(1, weight=1)
+        self.catalog_scan_button.grid(row=0, column=0, sticky='nsew', padx=20, pady=5)
+        self.catalog_status_label.grid(row=0, column=1, sticky='nsw', padx=20, pady=5)
+        self.catalog_device_label.grid(row=1, column=0, sticky='nsw', padx=20, pady=5)
+        self.catalog_device_menu.grid(row=1, column=1, sticky='nsw', padx=20, pady=5)
+        self.catalog_group_label.grid(row=2, column=0, sticky='nsw', padx=20, pady=5)
+        self.catalog_group_menu.grid(row=2, column=1, sticky='nsw', padx=20, pady=5)
+        self.catalog_dates_box.grid(row=3, column=0, sticky='nsw', padx=20, pady=5,
+                                    columnspan=2)
+        self.catalog_search_button.grid(row=4, column=0, sticky='nsew', padx=20, pady=5)
+        self.catalog_load_button.grid(row=4, column=1, sticky='nsw', padx=20, pady=5)
+        self.catalog_groups_button.grid(row=5, column=0, sticky='nsew', padx=20, pady=5)
+        self.catalog_view.grid(row=6, column=0, sticky='nsew', columnspan=2)
+
+    #---create monitor window
+        self.monitor_window = tk.Toplevel(self)
+        self.monitor_window.title('Live Monitor')
+        self.monitor_window.withdraw()
+        if not platform.system() == 'Darwin':
+            self.monitor_window.iconbitmap(self.exepath('img/sipperviz.ico'))
+        self.monitor_window.protocol("WM_DELETE_WINDOW",
+                                     self.monitor_window.withdraw)
+
+    #---populate monitor window
+        self.monitor_controls = tk.Frame(self.monitor_window)
+        self.monitor_folder_button = tk.Button(self.monitor_controls,
+                                               text='Choose Folder',
+                                               command=self.choose_monitor_folder)
+        self.monitor_start_button = tk.Button(self.monitor_controls, text='Start',
+                                              command=self.toggle_monitor,
+                                              state='disabled')
+        self.monitor_folder_str = tk.StringVar()
+        self.monitor_folder_str.set('No folder chosen')
+        self.monitor_folder_label = tk.Label(self.monitor_controls,
+                                             textvariable=self.monitor_folder_str)
+        self.monitor_interval_label = tk.Label(self.monitor_controls,
+                                               text='Refresh every (seconds)')
+        self.monitor_interval_menu = ttk.Combobox(self.monitor_controls, width=10,
+                                                  values=['1', '2', '5', '10',
+                                                          '30', '60'])
+        self.monitor_interval_menu.set('5')
+        self.monitor_budget_label = tk.Label(self.monitor_controls,
+                                             text='CPU budget (%)')
+        self.monitor_budget_menu = ttk.Combobox(self.monitor_controls, width=10,
+                                                values=['5', '10', '25', '50',
+                                                        '100'])
+        self.monitor_budget_menu.set('10')
+        self.monitor_binsize_label = tk.Label(self.monitor_controls,
+                                              text='Binning size')
+        self.monitor_binsize_menu = ttk.Combobox(self.monitor_controls, width=10,
+                                                 values=self.binsizes)
+        self.monitor_binsize_menu.set('1 hour')
+        self.nodrinks_label = tk.Label(self.monitor_controls,
+                                       text='Alert after no drinks for (hours)')
+        self.nodrinks_menu = ttk.Combobox(self.monitor_controls, width=10,
+                                          values=['1', '2', '4', '6', '12', '24'])
+        self.nodrinks_menu.set('12')
+        self.battery_label = tk.Label(self.monitor_controls,
+                                      text='Alert below battery voltage')
+        self.battery_menu = ttk.Combobox(self.monitor_controls, width=10,
+                                         values=['3.3', '3.4', '3.5', '3.6', '3.7'])
+        self.battery_menu.set('3.5')
+        for menu in [self.monitor_interval_menu, self.monitor_budget_menu,
+                     self.monitor_binsize_menu, self.nodrinks_menu,
+                     self.battery_menu]:
+            menu.bind('<<ComboboxSelected>>', self.set_monitor_options)
+        self.alert_log_val = tk.BooleanVar()
+        self.alert_log_val.set(False)
+        self.alert_log_box = ttk.Checkbutton(self.monitor_controls,
+                                             text='Log alerts to the monitored folder',
+                                             var=self.alert_log_val)
+        labels = ['File', 'Last Reading', 'Status']
+        self.monitor_view = ttk.Treeview(self.monitor_controls, columns=labels,
+                                         selectmode='browse', height=20)
+        self.monitor_view['show'] = 'headings'
+        for label in labels:
+            self.monitor_view.heading(label, text=label)
+            self.monitor_view.column(label, width=140)
+        self.monitor_view.bind('<<TreeviewSelect>>', self.show_monitor_plot)
+        labels = ['Time', 'File', 'Alert']
+        self.alert_view = ttk.Treeview(self.monitor_controls, columns=labels,
+                                       selectmode='none', height=8)
+        self.alert_view['show'] = 'headings'
+        for label in labels:
+            self.alert_view.heading(label, text=label)
+            self.alert_view.column(label, width=140)
+        self.alert_view.column('Alert', width=280)
+        self.monitor_plot_frame = tk.Frame(self.monitor_window)
+
+        self.monitor_window.grid_rowconfigure(0, weight=1)
+        self.monitor_window.grid_columnconfigure(1, weight=1)
+        self.monitor_controls.grid(row=0, column=0, sticky='nsew')
+        self.monitor_plot_frame.grid(row=0, column=1, sticky='nsew')
+        self.monitor_controls.grid_rowconfigure(8, weight=1)
+        self.monitor_folder_button.grid(row=0, column=0, sticky='nsew', padx=20, pady=5)
+        self.monitor_start_button.grid(row=0, column=1, sticky='nsew', padx=20, pady=5)
+        self.monitor_folder_label.grid(row=1, column=0, sticky='nsw', padx=20, pady=5,
+                                       columnspan=2)
+        self.monitor_interval_label.grid(row=2, column=0, sticky='nsw', padx=20, pady=5)
+        self.monitor_interval_menu.grid(row=2, column=1, sticky='nsew', padx=20, pady=5)
+        self.monitor_budget_label.grid(row=3, column=0, sticky='nsw', padx=20, pady=5)
+        self.monitor_budget_menu.grid(row=3, column=1, sticky='nsew', padx=20, pady=5)
+        self.monitor_binsize_label.grid(row=4, column=0, sticky='nsw', padx=20, pady=5)
+        self.monitor_binsize_menu.grid(row=4, column=1, sticky='nsew', padx=20, pady=5)
+        self.nodrinks_label.grid(row=5, column=0, sticky='nsw', padx=20, pady=5)
+        self.nodrinks_menu.grid(row=5, column=1, sticky='nsew', padx=20, pady=5)
+        self.battery_label.grid(row=6, column=0, sticky='nsw', padx=20, pady=5)
+        self.battery_menu.grid(row=6, column=1, sticky='nsew', padx=20, pady=5)
+        self.alert_log_box.grid(row=7, column=0, sticky='nsw', padx=20, pady=5,
+                                columnspan=2)
+        self.monitor_view.grid(row=8, column=0, sticky='nsew', columnspan=2)
+        self.alert_view.grid(row=9, column=0, sticky='nsew', columnspan=2)
+
     #---create treeview panes (left sash)
         self.left_sash = ttk.PanedWindow(self.main_frame, orient='vertical')
 
@@ -998,6 +1359,10 @@ class SipperViz(tk.Tk):
         self.filemenu.add_command(label='Load files', command=self.load_files)
         self.filemenu.add_command(label='Load folder',
                                   command=lambda : self.load_files(from_folder=True))
+        self.filemenu.add_command(label='Load from catalog',
+                                  command=self.raise_catalog_window)
+        self.filemenu.add_command(label='Monitor folder',
+                                  command=self.monitor_window.deiconify)
         self.filemenu.add_command(label='Save files', command=self.save_files)
         self.filemenu.add_command(label='Delete files', command=self.delete_files)
         self.filemenu.add_separator()
@@ -1015,6 +1380,8 @@ class SipperViz(tk.Tk):
                                     command=self.raise_content_window_for_file)
         self.sippermenu.add_command(label='Clear contents', command=self.clear_contents)
         self.sippermenu.add_command(label='Remove duplicate dates', command=self.remove_dup_dates)
+        self.sippermenu.add_command(label='Rebuild dates from elapsed time',
+                                    command=self.rebuild_dates)
         self.sippermenu.add_separator()
         self.sippermenu.add_command(label='Manage Groups', command=self.raise_group_window)
         self.sippermenu.add_command(label='Create Group and add files',
@@ -1022,6 +1389,8 @@ class SipperViz(tk.Tk):
         self.sippermenu.add_command(label='Group by device number', command=self.group_by_device_no)
         self.sippermenu.add_separator()
         self.sippermenu.add_command(label='Concatenate', command=self.concat_files)
+        self.sippermenu.add_command(label='Concatenate by device', command=self.concat_by_device)
+        self.sippermenu.add_command(label='Combine without saving', command=self.combine_files)
         self.sippermenu.add_separator()
         self.sippermenu.add_command(label='Sort by name',
                                     command = lambda : self.sort_sippers(key='basename'))
@@ -1084,6 +1453,7 @@ class SipperViz(tk.Tk):
         self.managemenu.add_command(label='Delete plots', command=self.delete_plots)
         self.managemenu.add_separator()
         self.managemenu.add_command(label='Show plot code', command=self.show_plot_code)
+        self.managemenu.add_command(label='Save code for all plots', command=self.save_all_code)
         self.managemenu.add_command(label='Save plot data', command=self.save_plot_data)
         self.managemenu.add_separator()
         self.managemenu.add_command(label='Select files from plot',
@@ -1101,7 +1471,7 @@ class SipperViz(tk.Tk):
         self.menubar.add_cascade(menu=self.optionsmenu, label='Options')
         self.helpmenu = tk.Menu(self.menubar, tearoff=0)
         self.helpmenu.add_command(label='Explain plot availability',
-                                  command=self.reasons_window.deiconify)
+                                  command=self.raise_reasons_window)
         self.menubar.add_cascade(menu=self.helpmenu, label='Help')
 
     #---create main buttons
@@ -1257,12 +1627,16 @@ class SipperViz(tk.Tk):
         self.plot_frame = tk.Frame(self.main_frame)
         self.fig = mpl.figure.Figure(figsize=(7, 4), dpi=100)
         self.ax = self.fig.add_subplot()
+        self.empty_fig = self.fig
+        self.preview_fig = mpl.figure.Figure(figsize=(7, 4), dpi=100)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
         self.canvas.draw_idle()
         self.canvas.get_tk_widget().pack(side='bottom', fill='both', expand=1)
         self.nav_toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame)
         self.nav_toolbar.update()
         self.canvas._tkcanvas.pack(side='top', fill='both', expand=1)
+        self.plot_progress = ttk.Progressbar(self.nav_toolbar,
+                                             mode='indeterminate', length=100)
 
     #---create plot list
         self.plot_list_frame = tk.Frame(self.right_sash)
@@ -1367,6 +1741,8 @@ class SipperViz(tk.Tk):
         self.rmenu_fileview_2.add_command(label='Clear contents', command=self.clear_contents)
         self.rmenu_fileview_2.add_separator()
         self.rmenu_fileview_2.add_command(label='Concatenate', command=self.concat_files)
+        self.rmenu_fileview_2.add_command(label='Concatenate by device', command=self.concat_by_device)
+        self.rmenu_fileview_2.add_command(label='Combine without saving', command=self.combine_files)
         self.rmenu_fileview_2.add_separator()
         self.rmenu_fileview_2.add_command(label='Save', command=self.save_files)
         self.rmenu_fileview_2.add_command(label='Delete', command=self.delete_files)
@@ -1405,12 +1781,14 @@ class SipperViz(tk.Tk):
                                           command=self.rerun_plots)
 
     #---file functions
-    def load_files(self, from_folder=False):
+    def load_files(self, from_folder=False, files=None, groups=None):
         loaded_filenames = [s.basename for s in self.loaded_sippers]
         self.failed_to_load = []
         self.duplicate_index_files = []
-        files = None
-        if from_folder:
+        groups = {} if groups is None else groups
+        if files is not None:
+            pass
+        elif from_folder:
             folder = tk.filedialog.askdirectory(title='Load folder of files')
             if folder:
                 files = [os.path.join(folder, f) for f in os.listdir(folder)]
@@ -1419,6 +1797,7 @@ class SipperViz(tk.Tk):
                           ('Excel', '*.xls, *.xslx'),]
             files = tk.filedialog.askopenfilenames(title='Load files',
                                                    filetypes=file_types)
+        window = self.get_load_window()
         if files:
             self.loading = True
             self.loading_window.deiconify()
@@ -1431,9 +1810,16 @@ class SipperViz(tk.Tk):
                     continue
                 if self.loading:
                     try:
-                        s = sipper.Sipper(file)
+                        s = sipper.Sipper(file, lazy=self.lazy_load_val.get(),
+                                          keep_idle_ends=self.idle_ends_val.get(),
+                                          window=window,
+                                          day_sidecar=self.day_files_val.get())
+                        s.groups = list(groups.get(file, []))
+                        for g in s.groups:
+                            if g not in self.loaded_groups:
+                                self.loaded_groups.append(g)
                         self.loaded_sippers.append(s)
-                        if s.duplicate_index:
+                        if not s.lazy and s.duplicate_index:
                             self.duplicate_index_files.append(s.basename)
                     except:
                         self.failed_to_load.append(file)
@@ -1441,8 +1827,8 @@ class SipperViz(tk.Tk):
                         print(tb)
                 self.loading_bar.step(1/len(files)*100)
             self.update_file_view()
-            self.update_avail_contents()
-            self.update_all_buttons()
+            if groups:
+                self.request_refresh('groups', 'buttons', 'details')
             self.loading_window.withdraw()
             self.loading = False
             if self.failed_to_load:
@@ -1450,16 +1836,78 @@ class SipperViz(tk.Tk):
             if self.duplicate_index_files and self.warn_dupindex_val.get():
                 self.raise_dup_index_error()
 
-    def delete_files(self):
-        selected = [int(i) for i in self.file_view.selection()]
-        for index in sorted(selected, reverse=True):
-            del(self.loaded_sippers[index])
+    def get_catalog(self):
+        if self.catalog is None:
+            path = ':memory:'
+            if os.path.isdir(self.exepath('memory')):
+                path = self.exepath('memory/catalog.db')
+            self.catalog = sippercatalog.SipperCatalog(path)
+        return self.catalog
+
+    def raise_catalog_window(self):
+        self.update_catalog_menus()
+        self.catalog_window.deiconify()
+
+    def update_catalog_menus(self):
+        catalog = self.get_catalog()
+        self.catalog_device_menu['values'] = ['Any'] + catalog.devices()
+        self.catalog_group_menu['values'] = ['Any'] + catalog.group_names()
+
+    def scan_catalog_folder(self):
+        folder = tk.filedialog.askdirectory(title='Choose folder to add to the catalog')
+        if folder:
+            def progress(path):
+                self.catalog_status_str.set('Reading ' + os.path.basename(path))
+                self.update()
+            counts = self.get_catalog().scan(folder, progress=progress)
+            self.catalog_status_str.set(', '.join('{} {}'.format(v, k)
+                                                  for k, v in counts.items()))
+            self.update_catalog_menus()
+            self.search_catalog()
+
+    def search_catalog(self):
+        device = self.catalog_device_menu.get()
+        group = self.catalog_group_menu.get()
+        start = end = None
+        if self.catalog_dates_val.get():
+            start, end = self.get_date_filter_dates()
+        found = self.get_catalog().query(device=None if device == 'Any' else int(device),
+                                         group=None if group == 'Any' else group,
+                                         start=start, end=end)
+        self.catalog_view.delete(*self.catalog_view.get_children())
+        for row in found.itertuples():
+            self.catalog_view.insert('', 'end', row.path,
+                                     values=[os.path.basename(row.path),
+                                             row.device_no, row.start_date,
+                                             row.end_date, row.rows])
+
+    def load_from_catalog(self):
+        paths = list(self.catalog_view.selection())
+        if not paths:
+            paths = list(self.catalog_view.get_children())
+        catalog = self.get_catalog()
+        groups = {path : catalog.get_groups(path) for path in paths}
+        self.load_files(files=paths, groups=groups)
+
+    def save_catalog_groups(self):
+        catalog = self.get_catalog()
+        for s in self.loaded_sippers:
+            for g in s.groups:
+                catalog.add_to_group(s.__dict__.get('paths', [s.path]), g)
+        self.update_catalog_menus()
+
+    def delete_files(self, sippers=None):
+        if sippers is None:
+            sippers = self.selected_sippers()
+        if self.when_plots_done(self.delete_files, sippers):
+            return
+        sippers = set(sippers)
+        self.loaded_sippers = [s for s in self.loaded_sippers
+                               if s not in sippers]
         self.update_file_view()
-        self.update_avail_contents()
-        self.display_details()
 
     def save_files(self):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        selected = self.selected_sippers()
         if len(selected) == 1:
             s = selected[0]
             filetypes = [('Comma-Separated Values', '*.csv')]
@@ -1478,15 +1926,18 @@ class SipperViz(tk.Tk):
                     s.data.to_csv(savepath)
 
     def concat_files(self):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        selected = self.selected_sippers()
+        overlaps, gaps = sipper.concat_report(selected)
+        if overlaps:
+            self.raise_concat_error(overlaps, gaps)
+            return
         try:
-            new = sipper.sipper_concat(selected)
             savepath = tk.filedialog.asksaveasfilename(title='Save concatenated file',
                                                        defaultextension='.csv',
                                                        filetypes=[('Comma-Separated Values', '*.csv')])
             if savepath:
-                new.to_csv(savepath)
-                new_file = sipper.Sipper(savepath)
+                new = sipper.sipper_concat(selected, path=savepath)
+                new_file = sipper.Sipper(savepath, data=new)
                 self.loaded_sippers.append(new_file)
                 for s in selected:
                     self.loaded_sippers.remove(s)
@@ -1494,26 +1945,163 @@ class SipperViz(tk.Tk):
         except sipper.SipperError:
             self.raise_concat_error()
 
-    def update_file_view(self, select=[]):
-        self.file_view.delete(*self.file_view.get_children())
-        for i, s in enumerate(self.loaded_sippers):
-            self.file_view.insert("", i, str(i), text=s.filename, tag='file')
-            if s in select:
-                self.file_view.selection_add(str(i))
+    def concat_by_device(self):
+        selected = self.selected_sippers()
+        chains = [c for c in sipper.concat_chains(selected) if len(c) > 1]
+        if not chains:
+            return
+        folder = tk.filedialog.askdirectory(title='Select where to save concatenated files')
+        if folder:
+            savepaths = []
+            for chain in chains:
+                name = chain[0].filename + '_CONCAT'
+                path = self.create_file_name(os.path.join(folder, name + '.csv'))
+                c = 1
+                while path in savepaths:
+                    path = self.create_file_name(os.path.join(folder, name +
+                                                              ' ' + str(c) + '.csv'))
+                    c += 1
+                savepaths.append(path)
+            # the files are written off the Tk thread, and swapped in by
+            # finish_concat once all are done
+            job = FileJob([s for chain in chains for s in chain],
+                          lambda results : self.finish_concat(chains, results))
+            self.submit_file_job(job, self.concat_chains, chains, savepaths)
+
+    def concat_chains(self, chains, savepaths):
+        # runs on the plot executor; a chain which fails gets its error
+        # instead of a Sipper, and its partly written file is removed
+        results = []
+        for chain, savepath in zip(chains, savepaths):
+            try:
+                new = sipper.sipper_concat(chain, path=savepath)
+                results.append(sipper.Sipper(savepath, data=new))
+            except Exception as error:
+                print(traceback.format_exc())
+                if os.path.exists(savepath):
+                    os.remove(savepath)
+                results.append(error)
+        return results
+
+    def finish_concat(self, chains, results):
+        new_files = []
+        failed = []
+        for chain, result in zip(chains, results):
+            if isinstance(result, Exception):
+                failed.append((chain, result))
+                continue
+            new_files.append(result)
+            for s in chain:
+                if s in self.loaded_sippers:
+                    self.loaded_sippers.remove(s)
+        self.loaded_sippers += new_files
+        self.update_file_view(select=new_files)
+        if failed:
+            self.raise_concat_fail_error(failed)
+
+    def combine_files(self):
+        selected = self.selected_sippers()
+        if len(selected) < 2:
+            return
+        overlaps, gaps = sipper.concat_report(selected)
+        if overlaps:
+            self.raise_concat_error(overlaps, gaps)
+            return
+        paths = []
+        for s in selected:
+            # files of combined Sippers are combined again
+            paths += s.__dict__.get('paths', [s.path])
+        try:
+            new = sipper.VirtualSipper(paths, window=self.get_load_window(),
+                                       keep_idle_ends=self.idle_ends_val.get(),
+                                       day_sidecar=self.day_files_val.get())
+        except (sipper.SipperError, pd.errors.EmptyDataError, OSError):
+            self.raise_concat_error()
+            return
+        for s in selected:
+            for g in s.groups:
+                if g not in new.groups:
+                    new.groups.append(g)
+            self.loaded_sippers.remove(s)
+        self.loaded_sippers.append(new)
+        self.update_file_view(select=[new])
+
+    def update_file_view(self, select=None):
+        """Sync file_view with loaded_sippers.  Each Sipper keeps the same
+        row, so only rows for added or removed files are created or
+        deleted, and existing rows are moved (not rebuilt) when the order
+        changes.  The selection is kept unless new Sippers to select are
+        given."""
+        iids = {}
+        for s in self.loaded_sippers:
+            if s not in self.file_iids:
+                self.file_iids[s] = 'file' + str(next(self.file_iid_count))
+            iids[self.file_iids[s]] = s
+        self.file_iids = {s : iid for iid, s in iids.items()}
+        gone = [i for i in self.file_view.get_children() if i not in iids]
+        plotted = {s for plot in self.loaded_plots.values()
+                   for s in plot.content_dicts}
+        for iid in gone:
+            s = self.file_rows[iid]
+            self.group_registry.untrack(s)
+            self.residency.forget(s, restore=s in plotted)
+        self.file_view.delete(*gone)
+        for iid, s in iids.items():
+            if iid not in self.file_rows:
+                self.file_view.insert('', 'end', iid, text=s.filename,
+                                      tag='file')
+                self.group_registry.track(s)
+                self.residency.track(s)
+            elif self.file_view.item(iid, 'text') != s.filename:
+                self.file_view.item(iid, text=s.filename)
+        self.file_rows = iids
+        order = list(iids)
+        if list(self.file_view.get_children()) != order:
+            for i, iid in enumerate(order):
+                self.file_view.move(iid, '', i)
+        if select is not None:
+            self.file_view.selection_set([self.file_iids[s] for s in select
+                                          if s in self.file_iids])
         self.update_all_buttons()
 
+    def selected_sippers(self):
+        """Return the Sippers selected in file_view, in list order."""
+        return [self.file_rows[i] for i in self.file_view.selection()]
+
     def update_all_buttons(self, *event):
-        self.update_main_buttons()
-        self.update_content_buttons()
-        self.update_groupview_buttons()
-        self.update_makeplot_run()
-        self.update_avail_contents()
-        self.update_avail_groups()
-        self.update_group_manager()
-        self.update_all_menus()
-        self.display_details()
-        self.update_reasons_view()
-        self.update()
+        self.request_refresh(*self.refresh_parts)
+
+    def update_plottable(self, *event):
+        self.request_refresh('buttons', 'reasons')
+
+    def request_refresh(self, *parts):
+        """Mark parts of the interface as out of date ('contents', 'groups',
+        'buttons', 'details', 'reasons'), and schedule a single refresh
+        for when the event loop is next idle.  Requests made before then
+        are merged into that refresh."""
+        self.stale_parts.update(parts)
+        if self.refresh_job is None:
+            self.refresh_job = self.after_idle(self.run_refresh)
+
+    def run_refresh(self):
+        parts = self.stale_parts
+        self.stale_parts = set()
+        self.refresh_job = None
+        if 'contents' in parts:
+            self.update_avail_contents()
+        if 'groups' in parts:
+            self.update_avail_groups()
+            self.update_group_manager()
+        if 'buttons' in parts:
+            self.update_main_buttons()
+            self.update_content_buttons()
+            self.update_groupview_buttons()
+            self.update_makeplot_run()
+            self.update_all_menus()
+        if 'details' in parts:
+            self.display_details()
+        if 'reasons' in parts and self.reasons_window.winfo_viewable():
+            self.update_reasons_view()
 
     def update_main_buttons(self, *event):
         #if files are selected
@@ -1575,35 +2163,61 @@ class SipperViz(tk.Tk):
             self.label_ok_button.configure(state='normal')
 
     def label_okay(self):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
-        for s in selected:
-            s.left_name = self.left_label_var.get()
-            s.right_name = self.right_label_var.get()
-        self.update_all_buttons()
-        self.display_details()
+        self.rename_tubes(self.selected_sippers(), self.left_label_var.get(),
+                          self.right_label_var.get())
         self.label_window.destroy()
 
+    def rename_tubes(self, sippers, left, right):
+        if self.when_plots_done(self.rename_tubes, sippers, left, right):
+            return
+        for s in sippers:
+            s.left_name = left
+            s.right_name = right
+        self.request_refresh('details')
+
     def handle_file_select(self, *event):
-        self.display_details()
-        self.update_all_buttons()
+        self.request_refresh('buttons', 'details', 'reasons')
 
     def sort_sippers(self, key='basename'):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
         self.loaded_sippers.sort(key = lambda s : getattr(s, key))
-        self.update_file_view(select=selected)
+        self.update_file_view()
 
     def reverse_sort(self, event):
         where_clicked = self.file_view.identify_region(event.x, event.y)
         if where_clicked == 'heading':
-            selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
-            self.loaded_sippers = self.loaded_sippers[::-1]
-            self.update_file_view(select=selected)
+            self.loaded_sippers.reverse()
+            self.update_file_view()
 
-    def remove_dup_dates(self):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+    def remove_dup_dates(self, selected=None):
+        if selected is None:
+            selected = self.selected_sippers()
+        if self.when_plots_done(self.remove_dup_dates, selected):
+            return
         for s in selected:
             s.unduplicate_index()
-        self.update_all_buttons()
+        self.request_refresh('details')
+
+    def rebuild_dates(self, selected=None):
+        if selected is None:
+            selected = self.selected_sippers()
+        if self.when_plots_done(self.rebuild_dates, selected):
+            return
+        lines = []
+        for s in selected:
+            try:
+                s.unduplicate_index(method='fromelapsed')
+            except sipper.SipperError as error:
+                lines.append('  - {}: {}'.format(s.basename, error))
+                continue
+            report = s.time_repairs
+            lines.append('  - {}: {} of {} rows moved, {} clock jumps, '
+                         '{} segments'.format(s.basename, report['Moved'].sum(),
+                                              report['Rows'].sum(),
+                                              report['Clock Jumps'].sum(),
+                                              len(report)))
+        self.request_refresh('details')
+        if lines:
+            self.raise_time_repair_report(lines)
 
     def exepath(self, relative):
         try:
@@ -1656,15 +2270,17 @@ class SipperViz(tk.Tk):
                                                       multiple=False)
         if session_file:
             unjarred = pickle.load(open(session_file[0],'rb'))
+            self.delete_plots(all=True)
             self.loaded_sippers = unjarred['sippers']
             self.update_file_view()
-            self.delete_plots(all=True)
             self.loaded_plots = unjarred['plots']
-            for plot in self.loaded_plots:
-                self.loaded_plots[plot].args['ax'] = self.ax
-                self.display_plot(self.loaded_plots[plot], insert=True)
+            for plot in self.loaded_plots.values():
+                plot.args.pop('ax', None)
+                plot.figure = None
+                self.display_plot(plot, insert=True)
             self.load_settings_df(from_df=unjarred['settings'])
-            self.update_all_buttons()
+            self.update_avail_contents()
+            self.update_avail_groups()
             self.contentselect.selection_remove(*self.contentselect.selection())
             for c in unjarred['selected_content']:
                 if c in self.contentselect.get_children():
@@ -1678,12 +2294,16 @@ class SipperViz(tk.Tk):
     #---info pane functions
     def display_details(self, *event):
         self.info_view.delete(*self.info_view.get_children())
-        selected = [self.loaded_sippers[int(i)]
-                    for i in self.file_view.selection()]
+        selected = self.selected_sippers()
         if len(selected) == 1:
             s = selected[0]
             for i, name in enumerate(self.file_info_names):
-                attr = str(getattr(s, self.attr_conversion[name]))
+                key = self.attr_conversion[name]
+                if key in sipper.Sipper.data_attrs and key not in s.__dict__:
+                    # don't load a lazy Sipper just to show its details
+                    attr = 'not loaded'
+                else:
+                    attr = str(getattr(s, key))
                 text = ' : '.join([name, attr])
                 self.info_view.insert('', i, text=text)
         elif len(selected) > 1:
@@ -1699,42 +2319,29 @@ class SipperViz(tk.Tk):
 
     #---routes from buttons to plots
     def iter_plot(self, func, sippers=None):
-        self.plotting = True
         self.bad_date_sippers = []
         if sippers is None:
-            sippers = [self.loaded_sippers[int(i)]
-                       for i in self.file_view.selection()]
+            sippers = self.selected_sippers()
         for i, s in enumerate(sippers):
-            if self.plotting:
-                self.ax.clear()
-                all_args = self.get_settings_dict_as_args()
-                func_args = inspect.getfullargspec(func).args
-                args = {k:v for k,v in all_args.items() if k in func_args}
-                if self.date_filter_val.get():
-                    b,e = self.get_date_filter_dates()
-                    if not sipper.date_filter_okay(s.data, b, e):
-                            self.bad_date_sippers.append(s)
-                            continue
-                    else:
-                        args['date_filter'] = b, e
-                args['sipper'] = s
-                args['ax'] = self.ax
-                name = self.create_plot_name(self.plot_default_names[func])
-                data = self.get_data_funcs[func.__name__](**args)
-                plot = SipperPlot(name, func, args, data)
-                self.loaded_plots[name] = plot
-                self.plot_list.insert('', 'end', iid=plot.name, values=[plot.name])
-                self.display_plot(plot)
+            all_args = self.get_settings_dict_as_args()
+            func_args = inspect.getfullargspec(func).args
+            args = {k:v for k,v in all_args.items() if k in func_args}
+            if self.date_filter_val.get():
+                b,e = self.get_date_filter_dates()
+                if not sipper.date_filter_okay(s.data, b, e):
+                        self.bad_date_sippers.append(s)
+                        continue
+                else:
+                    args['date_filter'] = b, e
+            args['sipper'] = s
+            self.submit_plot(func, args)
         if self.bad_date_sippers:
             self.raise_dfilter_error()
-        self.plotting = False
 
     def combo_plot(self, func, sippers=None):
         self.bad_date_sippers = []
         if sippers is None:
-            sippers = [self.loaded_sippers[int(i)]
-                       for i in self.file_view.selection()]
-        self.ax.clear()
+            sippers = self.selected_sippers()
         all_args = self.get_settings_dict_as_args()
         func_args = inspect.getfullargspec(func).args
         args = {k:v for k,v in all_args.items() if k in func_args}
@@ -1749,25 +2356,14 @@ class SipperViz(tk.Tk):
             self.raise_dfilter_error()
             return
         args['sippers'] = sippers
-        args['ax'] = self.ax
-        name = self.create_plot_name(self.plot_default_names[func])
-        data = self.get_data_funcs[func.__name__](**args)
-        plot = SipperPlot(name, func, args, data)
-        self.loaded_plots[name] = plot
-        self.plot_list.insert('', 'end', iid=plot.name, values=[plot.name])
-        self.display_plot(plot)
+        self.submit_plot(func, args)
 
     def group_plot(self, func, sippers=None):
         self.bad_date_sippers = []
         groups = self.groupselect.selection()
         if sippers is None:
-            sippers = []
-            for s in self.loaded_sippers:
-                for g in groups:
-                    if g in s.groups:
-                        sippers.append(s)
-                        break
-        self.ax.clear()
+            members = self.group_registry.get_members(groups)
+            sippers = [s for s in self.loaded_sippers if s in members]
         all_args = self.get_settings_dict_as_args()
         func_args = inspect.getfullargspec(func).args
         args = {k:v for k,v in all_args.items() if k in func_args}
@@ -1792,20 +2388,207 @@ class SipperViz(tk.Tk):
                     return
         args['sippers'] = sippers
         args['groups'] = groups
-        args['ax'] = self.ax
-        name = self.create_plot_name(self.plot_default_names[func])
-        data = self.get_data_funcs[func.__name__](**args)
-        plot = SipperPlot(name, func, args, data)
-        self.loaded_plots[name] = plot
-        self.plot_list.insert('', 'end', iid=plot.name, values=[plot.name])
-        self.display_plot(plot)
+        self.submit_plot(func, args)
 
     #---plotting functions
+    def submit_plot(self, func, args, plot=None):
+        """Compute the data and draw the figure of a new plot on the plot
+        executor, so the window stays responsive.  The plot is created and
+        its figure shown on the Tk thread by poll_plot_jobs once it is
+        ready, in the order the jobs were submitted.  When an existing
+        plot is given (e.g. from a session), only its figure is drawn."""
+        progressive = (plot is None and self.progressive_val.get() and
+                       func.__name__ in plotdata.trace_funcs)
+        figsize = tuple(self.fig.get_size_inches())
+        job = PlotJob(func, args, progressive, plot=plot, figsize=figsize)
+        job.sippers = [s for s in args.get('sippers', [args.get('sipper')])
+                       if isinstance(s, sipper.Sipper)]
+        # pinned first, so touching one Sipper can't spill another of the
+        # job; the worker restores any which were already spilled
+        self.residency.pin(job.sippers)
+        for s in job.sippers:
+            self.residency.touch(s)
+        job.future = self.plot_executor.submit(self.compute_plot, job)
+        self.plot_jobs.append(job)
+        self.busy_jobs.append(job)
+        self.plot_progress.pack(side='right', padx=(0, 10))
+        self.plot_progress.start()
+        if not self.plotting:
+            self.plotting = True
+            self.after(50, self.poll_plot_jobs)
+
+    def submit_file_job(self, job, func, *args):
+        """Run func(*args) for a FileJob on the plot executor, after the
+        plots already submitted.  Actions deferred by when_plots_done
+        wait for it too."""
+        self.residency.pin(job.sippers)
+        for s in job.sippers:
+            self.residency.touch(s)
+        job.future = self.plot_executor.submit(func, *args)
+        self.busy_jobs.append(job)
+        if not self.plotting:
+            self.plotting = True
+            self.after(50, self.poll_plot_jobs)
+
+    def when_plots_done(self, action, *args):
+        """Defer an action which changes Sippers while plot jobs (which
+        read them on the plot executor) are running.  Returns True if the
+        action was deferred, in which case it is called with args once no
+        job is running."""
+        if not self.busy_jobs:
+            return False
+        self.deferred_actions.append((action, args))
+        return True
+
+    def compute_plot(self, job):
+        # runs on the plot executor, so must not touch any widgets
+        if job.plot is not None:
+            job.figure = self.draw_figure(job.func, job.args, job.figsize)
+            return job.plot.data
+        name = job.func.__name__
+        if job.progressive:
+            var = job.args.get('avg_var', job.args.get('circ_var', 'SEM'))
+            running = defaultdict(plotdata.RunningStats)
+            to_plot = defaultdict(list)
+            for label, trace, items in plotdata.trace_funcs[name](**job.args):
+                if job.cancelled.is_set():
+                    return None
+                running[label].add(trace)
+                for key, item in items:
+                    to_plot[key].append(item)
+                job.updates.put((label, trace, running[label].get_mean(),
+                                 running[label].get_var(var)))
+            # the devices were read once, for both the preview and the data
+            data = plotdata.output_funcs[name](to_plot, **job.args)
+        else:
+            data = self.get_data_funcs[name](**job.args)
+        if job.cancelled.is_set():
+            return None
+        job.figure = self.draw_figure(job.func, job.args, job.figsize)
+        return data
+
+    def draw_figure(self, func, args, figsize):
+        # runs on the plot executor: the figure gets its own Agg canvas,
+        # and is only put in the window by show_figure on the Tk thread
+        fig = mpl.figure.Figure(figsize=figsize, dpi=100)
+        FigureCanvasAgg(fig)
+        func(ax=fig.add_subplot(), **args)
+        return fig
+
+    def show_figure(self, fig):
+        """Put a figure in the plot frame, sized to fit it."""
+        self.fig = fig
+        self.ax = fig.axes[0] if fig.axes else fig.add_subplot()
+        self.canvas.figure = fig
+        fig.set_canvas(self.canvas)
+        widget = self.canvas.get_tk_widget()
+        width, height = widget.winfo_width(), widget.winfo_height()
+        if width > 1 and height > 1:
+            fig.set_size_inches(width / fig.dpi, height / fig.dpi,
+                                forward=False)
+        self.nav_toolbar.update()
+        self.canvas.draw_idle()
+
+    def poll_plot_jobs(self):
+        if self.plot_jobs and self.plot_jobs[0].progressive:
+            self.draw_preview(self.plot_jobs[0])
+        while self.plot_jobs and self.plot_jobs[0].future.done():
+            job = self.plot_jobs.pop(0)
+            func, args = job.func, job.args
+            try:
+                data = job.future.result()
+            except Exception:
+                tb = traceback.format_exc()
+                print(tb)
+                continue
+            if job.plot is not None:
+                job.plot.figure = job.figure
+                if self.plot_list.selection() == (job.plot.name,):
+                    self.display_plot(job.plot, select=False)
+                continue
+            name = self.create_plot_name(self.plot_default_names[func])
+            plot = SipperPlot(name, func, args, data, figure=job.figure)
+            self.loaded_plots[name] = plot
+            self.plot_list.insert('', 'end', iid=plot.name, values=[plot.name])
+            self.display_plot(plot)
+        for job in [job for job in self.busy_jobs if job.future.done()]:
+            self.busy_jobs.remove(job)
+            self.residency.unpin(job.sippers)
+            if isinstance(job, FileJob):
+                try:
+                    result = job.future.result()
+                except Exception:
+                    print(traceback.format_exc())
+                    continue
+                job.on_done(result)
+        if not self.plot_jobs:
+            self.plot_progress.stop()
+            self.plot_progress.pack_forget()
+        if not self.busy_jobs:
+            while self.deferred_actions and not self.busy_jobs:
+                action, args = self.deferred_actions.pop(0)
+                action(*args)
+        if self.plot_jobs or self.busy_jobs:
+            self.after(50, self.poll_plot_jobs)
+        else:
+            self.plotting = False
+
+    def cancel_plot_jobs(self):
+        # waiting jobs never start; a running one stops at its next
+        # device if it is progressive, otherwise it finishes in the
+        # background, and either way its result is dropped
+        for job in self.plot_jobs:
+            job.cancelled.set()
+            job.future.cancel()
+        self.plot_jobs = []
+
+    def draw_preview(self, job):
+        """Draw the device traces and running averages (mean with SEM/STD
+        band) sent so far by a progressive job.  The finished plot
+        replaces the preview."""
+        updates = []
+        while not job.updates.empty():
+            updates.append(job.updates.get())
+        if not updates or not job.show_preview:
+            return
+        if not job.previewing:
+            job.previewing = True
+            self.preview_fig.clear()
+            self.preview_fig.add_subplot()
+            self.show_figure(self.preview_fig)
+            title = self.plot_default_names[job.func] + ' (computing...)'
+            self.ax.set_title(title)
+        colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        for label, trace, mean, var in updates:
+            if label not in job.colors:
+                job.colors[label] = colors[len(job.colors) % len(colors)]
+            color = job.colors[label]
+            self.ax.plot(trace.index, trace.values, color=color, alpha=.3,
+                         linewidth=.5)
+            for artist in job.artists.get(label, []):
+                artist.remove()
+            line, = self.ax.plot(mean.index, mean.values, color=color,
+                                 label=label)
+            band = self.ax.fill_between(mean.index, (mean - var).values,
+                                        (mean + var).values, color=color,
+                                        alpha=.2)
+            job.artists[label] = [line, band]
+        self.ax.legend()
+        self.canvas.draw_idle()
+
     def display_plot(self, plot, insert=False, select=True):
+        for job in self.plot_jobs:
+            if job.previewing:
+                job.show_preview = False
         self.suspend_plot_raising = True
-        self.ax.clear()
         self.display_plot_details(plot)
-        plot.func(**plot.args)
+        figure = getattr(plot, 'figure', None)
+        if figure is not None:
+            self.show_figure(figure)
+        else:
+            self.show_figure(self.empty_fig)
+            if not any(job.plot is plot for job in self.plot_jobs):
+                self.submit_plot(plot.func, plot.args, plot=plot)
         if insert:
             self.plot_list.insert('', 'end', iid=plot.name, values=[plot.name])
         if select:
@@ -1814,7 +2597,7 @@ class SipperViz(tk.Tk):
         self.canvas.draw_idle()
         self.update()
         self.suspend_plot_raising = False
-        self.update_all_buttons()
+        self.request_refresh('buttons')
 
     def raise_plot_from_click(self, event):
         if not self.suspend_plot_raising:
@@ -2032,6 +2815,11 @@ class SipperViz(tk.Tk):
             values = [name, self.plottable_reasons(name)]
             self.reasons_view.insert('', 'end', values=values)
 
+    def raise_reasons_window(self):
+        # the view is only kept up to date while the window is shown
+        self.update_reasons_view()
+        self.reasons_window.deiconify()
+
     def raise_makeplot_window(self):
         self.makeplot_window.deiconify()
         self.update_makeplot_run()
@@ -2089,7 +2877,7 @@ class SipperViz(tk.Tk):
         self.plot_list.delete(self.old_name)
         self.plot_list.insert('', new_position, iid=new_name, values=[new_name])
         self.rename_window.destroy()
-        self.update_all_buttons()
+        self.request_refresh('buttons')
 
     def select_files_from_plot(self):
         plotname = self.plot_list.selection()[0]
@@ -2132,10 +2920,8 @@ class SipperViz(tk.Tk):
             lastname = self.plot_list.get_children()[-1]
             self.display_plot(self.loaded_plots[lastname])
         else:
-            self.ax.clear()
-            self.canvas.draw_idle()
-            self.update()
-            self.update_all_buttons()
+            self.show_figure(self.empty_fig)
+            self.request_refresh('buttons')
             self.plot_info.delete(*self.plot_info.get_children())
 
     def save_plots(self):
@@ -2189,7 +2975,7 @@ class SipperViz(tk.Tk):
                 new_window.iconbitmap(self.exepath('img/python.ico'))
             new_window.title('Code for "' + name +'"')
             textview = tk.Text(new_window, width=150)
-            code = sipperinspect.generate_code(plot)
+            code = plot.get_code()
             textview.insert(tk.END, code)
             textview.configure(state=tk.DISABLED)
             scrollbar = tk.Scrollbar(new_window, command=textview.yview)
@@ -2214,6 +3000,29 @@ class SipperViz(tk.Tk):
                 file.write(text)
                 file.close()
 
+    def save_all_code(self):
+        if not self.loaded_plots:
+            return
+        folder = tk.filedialog.askdirectory(title='Select where to save code')
+        if folder:
+            jobs = []
+            used = set()
+            for name, plot in self.loaded_plots.items():
+                path = self.create_file_name(os.path.join(folder, name + '.py'))
+                c = 1
+                while path in used:
+                    path = self.create_file_name(os.path.join(folder, name +
+                                                              ' ' + str(c) + '.py'))
+                    c += 1
+                used.add(path)
+                jobs.append((path, plot.get_code()))
+            with ThreadPoolExecutor() as executor:
+                list(executor.map(lambda job: self.write_text(*job), jobs))
+
+    def write_text(self, path, text):
+        with open(path, 'w') as file:
+            file.write(text)
+
     def save_plot_data(self):
         selected = self.plot_list.selection()
         if len(selected) == 1:
@@ -2301,16 +3110,14 @@ class SipperViz(tk.Tk):
 
     def create_okay(self, addto):
         group_name = self.create_name.get()
-        if addto:
-            selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
-            for s in selected:
-                if group_name not in s.groups:
-                    s.groups.append(group_name)
+        selected = self.selected_sippers()
         if group_name not in self.loaded_groups:
             self.loaded_groups.append(group_name)
             self.groupview.insert('', 'end', iid=group_name, text=group_name)
             self.groupview.selection_set(group_name)
-        self.update_all_buttons()
+        if addto:
+            self.add_to_groups([group_name], selected)
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
         self.create_window.destroy()
 
     def create_group_check(self, addto=False, *args):
@@ -2330,47 +3137,51 @@ class SipperViz(tk.Tk):
                 self.ok_button_create.configure(state=tk.NORMAL)
 
     def group_add(self):
-        groups = self.groupview.selection()
-        files = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        self.add_to_groups(self.groupview.selection(), self.selected_sippers())
+
+    def add_to_groups(self, groups, files):
+        # (the group_add etc. methods are shadowed by their buttons, so
+        # the work deferred while plotting is done by these)
+        if self.when_plots_done(self.add_to_groups, groups, files):
+            return
         for s in files:
+            if s not in self.loaded_sippers:
+                continue # removed while waiting
             for g in groups:
-                if g not in s.groups:
-                    s.groups.append(g)
-        self.update_all_buttons()
-        self.display_details()
-        self.update_makeplot_run()
+                self.group_registry.add(s, g)
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
 
     def group_remove(self):
-        groups = self.groupview.selection()
-        files = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        self.remove_from_groups(self.groupview.selection(),
+                                self.selected_sippers())
+
+    def remove_from_groups(self, groups, files):
+        if self.when_plots_done(self.remove_from_groups, groups, files):
+            return
         for s in files:
+            if s not in self.loaded_sippers:
+                continue
             for g in groups:
-                if g in s.groups:
-                    s.groups.remove(g)
-        self.update_all_buttons()
-        self.display_details()
-        self.update_makeplot_run()
+                self.group_registry.remove(s, g)
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
 
     def group_select(self):
         groups = self.groupview.selection()
-        self.file_view.selection_remove(*self.file_view.get_children())
-        for i, s in enumerate(self.loaded_sippers):
-            for g in groups:
-                if g in s.groups:
-                    self.file_view.selection_add(i)
-                    break
+        members = self.group_registry.get_members(groups)
+        self.file_view.selection_set([self.file_iids[s] for s in members])
 
     def group_delete(self):
-        groups = self.groupview.selection()
+        self.delete_groups(self.groupview.selection())
+
+    def delete_groups(self, groups):
+        if self.when_plots_done(self.delete_groups, groups):
+            return
+        groups = [g for g in groups if g in self.loaded_groups]
         for g in groups:
-            for s in self.loaded_sippers:
-                if g in s.groups:
-                    s.groups.remove(g)
+            self.group_registry.delete_group(g)
             self.loaded_groups.remove(g)
         self.groupview.delete(*groups)
-        self.update_all_buttons()
-        self.display_details()
-        self.update_makeplot_run()
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
 
     def group_save(self):
         group_dict = {s.path : s.groups for s in self.loaded_sippers
@@ -2402,42 +3213,45 @@ class SipperViz(tk.Tk):
             else:
                 attr = 'basename'
                 df.columns = [os.path.basename(col) for col in df.columns]
+            labels = {}
             for s in self.loaded_sippers:
                 lookfor = getattr(s, attr)
                 if lookfor in df.columns:
-                    s.groups = []
-                    for grp in df[lookfor]:
-                        if not pd.isna(grp):
-                            s.groups.append(str(grp))
-                            if grp not in self.loaded_groups:
-                                self.loaded_groups.append(grp)
-        self.update_group_manager()
-        self.update_avail_groups()
-        self.display_details()
-        for g in self.avail_groups:
-            if g not in self.groupview.get_children():
-                self.groupview.insert('', 'end', iid=g, text=g)
-        self.update_all_buttons()
+                    labels[s] = [str(grp) for grp in df[lookfor]
+                                 if not pd.isna(grp)]
+            self.set_group_labels(labels)
+
+    def set_group_labels(self, labels):
+        if self.when_plots_done(self.set_group_labels, labels):
+            return
+        for s, groups in labels.items():
+            if s not in self.loaded_sippers:
+                continue
+            self.group_registry.set_groups(s, groups)
+            for grp in groups:
+                if grp not in self.loaded_groups:
+                    self.loaded_groups.append(grp)
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
 
     def group_by_device_no(self):
+        if self.when_plots_done(self.group_by_device_no):
+            return
         for s in self.loaded_sippers:
             g = str(s.device_no)
-            s.groups.append(g)
+            self.group_registry.add(s, g)
             if g not in self.loaded_groups:
                 self.loaded_groups.append(g)
-        self.display_details()
-        self.update_group_manager()
-        self.update_avail_groups()
-        self.update_all_buttons()
+        self.request_refresh('groups', 'buttons', 'details', 'reasons')
 
     def update_group_manager(self):
+        if list(self.groupview.get_children()) == self.loaded_groups:
+            return
         selected = self.groupview.selection()
         self.groupview.delete(*self.groupview.get_children())
         for g in self.loaded_groups:
             self.groupview.insert('', 'end', iid=g, text=g)
             if g in selected:
                 self.groupview.selection_add(g)
-        self.update()
 
     def update_groupview_buttons(self, *event):
         groups_selected = self.groupview.selection()
@@ -2456,30 +3270,41 @@ class SipperViz(tk.Tk):
             self.group_delete.configure(state='disabled')
 
     def update_avail_groups(self):
-        self.avail_groups = []
-        for s in self.loaded_sippers:
-            for g in s.groups:
-                if g not in self.avail_groups:
-                    self.avail_groups.append(g)
-                if g not in self.loaded_groups:
-                    self.loaded_groups.append(g)
-        self.avail_groups.sort()
-        self.update_groupselect()
+        avail = sorted(self.group_registry.members)
+        known = set(self.loaded_groups)
+        self.loaded_groups += [g for g in avail if g not in known]
+        if avail != self.avail_groups:
+            self.avail_groups = avail
+            self.update_groupselect()
 
     def update_groupselect(self):
-        current = self.groupselect.selection()
-        total = self.groupselect.get_children()
-        self.groupselect.delete(*self.groupselect.get_children())
-        for i, c in enumerate(self.avail_groups):
-            self.groupselect.insert('', 'end', iid=c, values=[c])
-            if c in current:
-                self.groupselect.selection_add(c)
-            elif c in total and c not in current:
-                pass
-            else:
-                self.groupselect.selection_add(c)
+        self.update_select_view(self.groupselect, self.avail_groups)
+
+    def update_select_view(self, view, items):
+        """Make a selection Treeview (contents or groups) show the sorted
+        items, only adding and removing rows which changed.  Existing rows
+        keep their selection state; new rows start selected."""
+        total = set(view.get_children())
+        keep = set(items)
+        view.delete(*[i for i in total if i not in keep])
+        for i, c in enumerate(items):
+            if c not in total:
+                view.insert('', i, iid=c, values=[c])
+                view.selection_add(c)
 
     #---settings functions
+    def set_residency_limits(self, *event):
+        limits = []
+        for menu in [self.resident_menu, self.memory_menu]:
+            try:
+                limits.append(float(menu.get()))
+            except ValueError:
+                limits.append(None)
+        files, mb = limits
+        self.residency.max_sippers = int(files) if files else None
+        self.residency.max_mb = mb
+        self.residency.enforce()
+
     def get_settings_dict(self):
         settings_dict = dict(lights_on       =self.lightson_menu.get(),
                              lights_off      =self.lightsoff_menu.get(),
@@ -2487,6 +3312,19 @@ class SipperViz(tk.Tk):
                              groupload_abs   =self.groupload_abs_val.get(),
                              load_dups       =self.load_dups_val.get(),
                              warn_dupindex   =self.warn_dupindex_val.get(),
+                             lazy_load       =self.lazy_load_val.get(),
+                             idle_ends       =self.idle_ends_val.get(),
+                             window_load     =self.window_load_val.get(),
+                             day_files       =self.day_files_val.get(),
+                             progressive     =self.progressive_val.get(),
+                             resident_files  =self.resident_menu.get(),
+                             resident_mb     =self.memory_menu.get(),
+                             monitor_interval=self.monitor_interval_menu.get(),
+                             monitor_budget  =self.monitor_budget_menu.get(),
+                             monitor_binsize =self.monitor_binsize_menu.get(),
+                             alert_nodrinks  =self.nodrinks_menu.get(),
+                             alert_battery   =self.battery_menu.get(),
+                             alert_log       =self.alert_log_val.get(),
                              dfilter_val     =self.date_filter_val.get(),
                              dfilter_sdate   =self.dfilter_s_date.get_date(),
                              dfilter_edate   =self.dfilter_e_date.get_date(),
@@ -2596,6 +3434,28 @@ class SipperViz(tk.Tk):
         self.groupload_abs_val.set(df.loc['groupload_abs', v])
         self.load_dups_val.set(df.loc['load_dups', v])
         self.warn_dupindex_val.set(df.loc['warn_dupindex', v])
+        if 'lazy_load' in df.index:
+            self.lazy_load_val.set(df.loc['lazy_load', v])
+        if 'idle_ends' in df.index:
+            self.idle_ends_val.set(df.loc['idle_ends', v])
+        if 'window_load' in df.index:
+            self.window_load_val.set(df.loc['window_load', v])
+            self.day_files_val.set(df.loc['day_files', v])
+        if 'progressive' in df.index:
+            self.progressive_val.set(df.loc['progressive', v])
+        if 'resident_files' in df.index:
+            self.resident_menu.set(df.loc['resident_files', v])
+            self.memory_menu.set(df.loc['resident_mb', v])
+            self.set_residency_limits()
+        if 'monitor_interval' in df.index:
+            self.monitor_interval_menu.set(df.loc['monitor_interval', v])
+            self.monitor_budget_menu.set(df.loc['monitor_budget', v])
+            self.monitor_binsize_menu.set(df.loc['monitor_binsize', v])
+        if 'alert_nodrinks' in df.index:
+            self.nodrinks_menu.set(df.loc['alert_nodrinks', v])
+            self.battery_menu.set(df.loc['alert_battery', v])
+            self.alert_log_val.set(df.loc['alert_log', v])
+        self.set_monitor_options()
         self.drink_showleft_val.set(df.loc['show_left', v])
         self.drink_showright_val.set(df.loc['show_right', v])
         self.drink_showcontent_val.set(df.loc['show_content_val', v])
@@ -2672,6 +3532,124 @@ class SipperViz(tk.Tk):
             self.dfilter_s_hour.configure(state='disabled')
             self.dfilter_e_hour.configure(state='disabled')
 
+    #---live monitor functions
+    def get_monitor_options(self):
+        return dict(interval=float(self.monitor_interval_menu.get()),
+                    budget=float(self.monitor_budget_menu.get()),
+                    binsize=self.bin_convert[self.monitor_binsize_menu.get()])
+
+    def set_monitor_options(self, *event):
+        if self.monitor is not None:
+            options = self.get_monitor_options()
+            self.monitor.interval = options['interval']
+            self.monitor.budget = options['budget']
+            self.monitor.set_binsize(options['binsize'])
+            self.set_alert_thresholds(self.monitor.alerts.rules)
+            self.draw_monitor_plot()
+
+    def set_alert_thresholds(self, rules):
+        for rule in rules:
+            if isinstance(rule, sipperalerts.NoDrinksRule):
+                rule.hours = float(self.nodrinks_menu.get())
+            elif isinstance(rule, sipperalerts.BatteryRule):
+                rule.min_voltage = float(self.battery_menu.get())
+
+    def get_alert_engine(self, folder):
+        rules = sipperalerts.default_rules()
+        self.set_alert_thresholds(rules)
+        log_path = None
+        if self.alert_log_val.get():
+            log_path = os.path.join(folder, 'sipperviz_alerts.log')
+        engine = sipperalerts.AlertEngine(rules, log_path=log_path)
+        engine.add_listener(self.show_alert)
+        return engine
+
+    def show_alert(self, alert):
+        values = [alert.time, alert.filename, alert.rule + ': ' + alert.message]
+        self.alert_view.insert('', 0, values=values)
+
+    def choose_monitor_folder(self):
+        folder = tk.filedialog.askdirectory(title='Choose folder to monitor')
+        if folder:
+            self.stop_monitor()
+            for canvas in self.monitor_canvases.values():
+                canvas.get_tk_widget().destroy()
+            self.monitor_canvases = {}
+            self.monitor_shown = None
+            self.monitor_packed = None
+            self.monitor_view.delete(*self.monitor_view.get_children())
+            self.alert_view.delete(*self.alert_view.get_children())
+            self.monitor = sippermonitor.SipperMonitor(folder,
+                                                       alerts=self.get_alert_engine(folder),
+                                                       **self.get_monitor_options())
+            self.monitor_folder_str.set(folder)
+            self.monitor_start_button.configure(state='normal')
+            self.toggle_monitor()
+
+    def toggle_monitor(self):
+        if self.monitor_job is not None:
+            self.after_cancel(self.monitor_job)
+            self.monitor_job = None
+            self.monitor_start_button.configure(text='Start')
+        elif self.monitor is not None:
+            self.monitor_start_button.configure(text='Stop')
+            self.run_monitor()
+
+    def stop_monitor(self):
+        if self.monitor_job is not None:
+            self.toggle_monitor()
+        if self.monitor is not None:
+            self.monitor.close()
+
+    def run_monitor(self):
+        self.monitor.poll()
+        self.update_monitor_view()
+        self.draw_monitor_plot()
+        self.monitor_job = self.after(int(self.monitor.interval * 1000),
+                                      self.run_monitor)
+
+    def update_monitor_view(self):
+        for path, status in self.monitor.status.items():
+            s = self.monitor.sippers.get(path)
+            last = s.last_reading if s is not None else ''
+            values = [os.path.basename(path), last, status]
+            if self.monitor_view.exists(path):
+                self.monitor_view.item(path, values=values)
+            else:
+                self.monitor_view.insert('', 'end', iid=path, values=values)
+
+    def show_monitor_plot(self, *event):
+        selected = self.monitor_view.selection()
+        if selected:
+            self.monitor_shown = selected[0]
+            self.draw_monitor_plot()
+
+    def draw_monitor_plot(self):
+        # only the shown plot is drawn; the others keep their lines up to
+        # date and are drawn when selected
+        path = self.monitor_shown
+        plot = self.monitor.plots.get(path) if self.monitor else None
+        if plot is None:
+            return
+        canvas = self.monitor_canvases.get(path)
+        if canvas is not None and canvas.figure is not plot.figure:
+            # the file was reloaded with a new plot
+            canvas.get_tk_widget().destroy()
+            canvas = None
+        if canvas is None:
+            canvas = FigureCanvasTkAgg(plot.figure, master=self.monitor_plot_frame)
+            self.monitor_canvases[path] = canvas
+            plot.stale = True
+        if self.monitor_packed is not canvas:
+            for other in self.monitor_canvases.values():
+                other.get_tk_widget().pack_forget()
+            canvas.get_tk_widget().pack(side='top', fill='both', expand=1)
+            self.monitor_packed = canvas
+            plot.stale = True
+        if plot.stale:
+            canvas.draw_idle()
+            plot.stale = False
+
     #---naming functions
 
     def create_file_name(self, savepath, overwrite=False):
@@ -2695,7 +3673,7 @@ class SipperViz(tk.Tk):
     #---content window functions
     def raise_content_window(self):
         self.assign_content_view.delete(*self.assign_content_view.get_children())
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        selected = self.selected_sippers()
         mindate = dt.datetime(2999, 12, 13)
         maxdate = dt.datetime(1970, 1, 1)
         for s in selected:
@@ -2715,7 +3693,7 @@ class SipperViz(tk.Tk):
         self.update_content_buttons()
 
     def raise_content_window_for_file(self):
-        selected = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+        selected = self.selected_sippers()
         file = selected[0]
         self.raise_content_window()
         contents = file.get_contents_dict()
@@ -2733,6 +3711,11 @@ class SipperViz(tk.Tk):
         end = dt.datetime.combine(edate, dt.time(hour=ehour))
         return start, end
 
+    def get_load_window(self):
+        if self.date_filter_val.get() and self.window_load_val.get():
+            return self.get_date_filter_dates()
+        return None
+
     def get_date_filter_dates(self):
         sdate = self.dfilter_s_date.get_date()
         shour = self.times_to_int[self.dfilter_s_hour.get()]
@@ -2782,9 +3765,12 @@ class SipperViz(tk.Tk):
         self.rcontent_val.set(r)
         self.update_content_buttons()
 
-    def assign_content(self):
-        d = self.get_content_dict()
-        files = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+    def assign_content(self, files=None, d=None):
+        if files is None:
+            files = self.selected_sippers()
+            d = self.get_content_dict()
+        if self.when_plots_done(self.assign_content, files, d):
+            return
         if files:
             for f in files:
                 try:
@@ -2794,16 +3780,17 @@ class SipperViz(tk.Tk):
                     self.raise_cant_assign(f)
                     return
         self.close_content_window()
-        self.display_details()
-        self.update_all_buttons()
+        self.request_refresh('contents', 'buttons', 'details', 'reasons')
 
-    def clear_contents(self):
-        files = [self.loaded_sippers[int(i)] for i in self.file_view.selection()]
+    def clear_contents(self, files=None):
+        if files is None:
+            files = self.selected_sippers()
+        if self.when_plots_done(self.clear_contents, files):
+            return
         if files:
             for f in files:
                 f.clear_contents()
-        self.display_details()
-        self.update_avail_contents()
+        self.request_refresh('contents', 'buttons', 'details', 'reasons')
 
     def update_content_buttons(self, *event):
         entries = self.assign_content_view.get_children()
@@ -2847,26 +3834,16 @@ class SipperViz(tk.Tk):
         self.ehour_entry.set(shour)
 
     def update_avail_contents(self):
-        self.avail_contents = []
+        avail = set()
         for s in self.loaded_sippers:
-            for c in s.contents:
-                if c not in self.avail_contents:
-                    self.avail_contents.append(c)
-        self.avail_contents.sort()
-        self.update_contentselect()
+            avail.update(s.contents)
+        avail = sorted(avail)
+        if avail != self.avail_contents:
+            self.avail_contents = avail
+            self.update_contentselect()
 
     def update_contentselect(self):
-        current = self.contentselect.selection()
-        total = self.contentselect.get_children()
-        self.contentselect.delete(*self.contentselect.get_children())
-        for i, c in enumerate(self.avail_contents):
-            self.contentselect.insert('','end',iid=c,values=[c])
-            if c in current:
-                self.contentselect.selection_add(c)
-            elif c in total and c not in current:
-                pass
-            else:
-                self.contentselect.selection_add(c)
+        self.update_select_view(self.contentselect, self.avail_contents)
 
     #---menu bar
     def get_menu_index(self, menu, name, limit=25):
@@ -2894,15 +3871,21 @@ class SipperViz(tk.Tk):
             m.entryconfig(self.get_menu_index(m, 'Show/edit file contents'), state='normal')
             m.entryconfig(self.get_menu_index(m, 'Clear contents'), state='normal')
             m.entryconfig(self.get_menu_index(m, 'Remove duplicate dates'), state='normal')
+            m.entryconfig(self.get_menu_index(m, 'Rebuild dates from elapsed time'), state='normal')
             m.entryconfig(self.get_menu_index(m, 'Concatenate'), state='normal')
+            m.entryconfig(self.get_menu_index(m, 'Concatenate by device'), state='normal')
+            m.entryconfig(self.get_menu_index(m, 'Combine without saving'), state='normal')
             m.entryconfig(self.get_menu_index(m, 'Create Group and add files'), state='normal')
         else:
             m.entryconfig(self.get_menu_index(m, 'Rename tubes'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Assign contents'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Show/edit file contents'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Remove duplicate dates'), state='disabled')
+            m.entryconfig(self.get_menu_index(m, 'Rebuild dates from elapsed time'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Clear contents'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Concatenate'), state='disabled')
+            m.entryconfig(self.get_menu_index(m, 'Concatenate by device'), state='disabled')
+            m.entryconfig(self.get_menu_index(m, 'Combine without saving'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Create Group and add files'), state='disabled')
         if self.loaded_sippers:
             m.entryconfig(self.get_menu_index(m, 'Group by device number'), state='normal')
@@ -2939,6 +3922,10 @@ class SipperViz(tk.Tk):
             m.entryconfig(self.get_menu_index(m, 'Select files from plot'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Load settings from plot'), state='disabled')
             m.entryconfig(self.get_menu_index(m, 'Replot with current settings'), state='disabled')
+        if self.loaded_plots:
+            m.entryconfig(self.get_menu_index(m, 'Save code for all plots'), state='normal')
+        else:
+            m.entryconfig(self.get_menu_index(m, 'Save code for all plots'), state='disabled')
 
     def update_all_menus(self):
         self.update_file_menu()
@@ -2961,6 +3948,21 @@ class SipperViz(tk.Tk):
         warning = tk.Label(warn_window, text=text, justify=tk.LEFT)
         warning.pack(padx=(20,20),pady=(20,20))
 
+    def raise_time_repair_report(self, lines):
+        report_window = tk.Toplevel(self)
+        if not platform.system() == 'Darwin':
+            report_window.iconbitmap(self.exepath('img/exclam.ico'))
+        report_window.grab_set()
+        report_window.title('Rebuilt Dates')
+        text = ('Dates were rebuilt from the Elapsed Time column.  Each '
+                'file is split where the elapsed time restarts, and rows '
+                'are moved when the clock jumped or drifted by more than '
+                'a minute against the elapsed time.\n')
+        text += '\n'.join(lines)
+        report = tk.Label(report_window, text=text, justify=tk.LEFT,
+                          wraplength=400)
+        report.pack(padx=(20,20),pady=(20,20))
+
     def raise_dup_index_error(self):
         warn_window = tk.Toplevel(self)
         if not platform.system() == 'Darwin':
@@ -3002,16 +4004,45 @@ class SipperViz(tk.Tk):
         warning = tk.Label(warn_window, text=text, justify=tk.LEFT)
         warning.pack(padx=(20,20),pady=(20,20))
 
-    def raise_concat_error(self):
+    def raise_concat_error(self, overlaps=[], gaps=[]):
         warn_window = tk.Toplevel(self)
         if not platform.system() == 'Darwin':
             warn_window.iconbitmap(self.exepath('img/exclam.ico'))
         warn_window.grab_set()
         warn_window.title('Concatenation Error')
         text = ("The selected files have overlapping dates and could not be concatenated.")
+        if overlaps:
+            text += '\n\nOverlapping files:'
+            for a, b in overlaps[:20]:
+                text += '\n  - {} & {}'.format(a.basename, b.basename)
+            if len(overlaps) > 20:
+                text += '\n  ...and {} more'.format(len(overlaps) - 20)
+        if gaps:
+            text += '\n\nGaps between files:'
+            for a, b, length in gaps[:20]:
+                text += '\n  - {} to {} ({})'.format(a.basename, b.basename, length)
+            if len(gaps) > 20:
+                text += '\n  ...and {} more'.format(len(gaps) - 20)
+        text += ('\n\nSippers > Concatenate by device can split the files '
+                 'into non-overlapping sets and concatenate each.')
         warning = tk.Label(warn_window, text=text, justify=tk.LEFT)
         warning.pack(padx=(20,20),pady=(20,20))
 
+    def raise_concat_fail_error(self, failed):
+        warn_window = tk.Toplevel(self)
+        if not platform.system() == 'Darwin':
+            warn_window.iconbitmap(self.exepath('img/exclam.ico'))
+        warn_window.grab_set()
+        warn_window.title('Concatenation Error')
+        text = ("The following sets of files could not be concatenated, "
+                "and were left loaded.  No file was saved for them.\n")
+        for chain, error in failed:
+            text += '\n  - {} ({})'.format(', '.join(s.basename for s in chain),
+                                           error)
+        warning = tk.Label(warn_window, text=text, justify=tk.LEFT,
+                           wraplength=400)
+        warning.pack(padx=(20,20),pady=(20,20))
+
     def datetime_averageable(self, sippers, date_filter=None):
         earliest_end = pd.Timestamp(year=2200, month=1, day=1, hour=0,
                                         minute=0, second=0)
@@ -3071,6 +4102,12 @@ class SipperViz(tk.Tk):
         sessions_dir = self.exepath('memory/sessions')
         if os.path.isdir(sessions_dir):
             self.save_session(dialog=False)
+        self.cancel_plot_jobs()
+        self.plot_executor.shutdown(wait=False)
+        self.residency.close()
+        self.stop_monitor()
+        if self.catalog is not None:
+            self.catalog.close()
         self.destroy()
         self.quit()
 
@@ -3082,7 +4119,7 @@ class SipperViz(tk.Tk):
         if self.loading:
             self.loading = False
         if self.plotting:
-            self.plotting = False
+            self.cancel_plot_jobs()
         self.update_all_buttons()
 
     def select_all(self, *event):
@@ -3114,8 +4151,7 @@ class SipperViz(tk.Tk):
             menu.grab_release()
 
     def r_open_location(self,):
-        selected = self.file_view.selection()
-        s = self.loaded_sippers[int(selected[0])]
+        s = self.selected_sippers()[0]
         dirname = os.path.dirname(s.path)
         try:
             os.startfile(dirname)
@@ -3124,8 +4160,7 @@ class SipperViz(tk.Tk):
             subprocess.call([opener, dirname])
 
     def r_open_externally(self):
-        selected = self.file_view.selection()
-        s = self.loaded_sippers[int(selected[0])]
+        s = self.selected_sippers()[0]
         try:
             os.startfile(s.path)
         except: